@@ -0,0 +1,149 @@
+"""
+Server-side cache for per-user read endpoints.
+
+Responses of /mood-entries/{user_id}/{year}/{month}, /stats/{user_id} and
+/analytics/{user_id} are cached under (user_id, endpoint, params), where the
+params include the user's stats version. Every write of the user's entries
+bumps that version, whether it comes from the API, another worker or a
+maintenance tool, so a changed diary simply misses the cache: nothing is
+invalidated, and superseded entries age out through the TTL and the LRU.
+
+Settings (environment):
+    CACHE_URL          memory:// (default, per-process LRU) or redis://host:port/db
+                       (needs the `redis` extra); none:// disables caching
+    CACHE_TTL          seconds an entry may be served (default 300)
+    CACHE_MAX_ENTRIES  size of the in-process LRU (default 4096)
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional, Protocol
+
+from starlette.concurrency import run_in_threadpool
+
+
+class CacheBackend(Protocol):
+    def get(self, key: str) -> Optional[Any]: ...
+
+    def set(self, key: str, value: Any, ttl: float) -> None: ...
+
+    def clear(self) -> None: ...
+
+
+class MemoryBackend:
+    """LRU with per-entry expiry, bounded to ``max_entries``"""
+
+    def __init__(self, max_entries: int = 4096) -> None:
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RedisBackend:
+    """Shares the cache between API processes; values are stored as JSON"""
+
+    def __init__(self, client: Any, prefix: str = "mood-diary:") -> None:
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str) -> 'RedisBackend':
+        import redis  # type: ignore[import-not-found]  # optional: poetry install -E redis
+        return cls(redis.Redis.from_url(url))
+
+    def get(self, key: str) -> Optional[Any]:
+        raw = self.client.get(self.prefix + key)
+        return None if raw is None else json.loads(raw)
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        self.client.set(self.prefix + key, json.dumps(value), px=int(ttl * 1000))
+
+    def clear(self) -> None:
+        for key in self.client.scan_iter(match=self.prefix + "*"):
+            self.client.delete(key)
+
+
+class ResponseCache:
+    def __init__(self, backend: Optional[CacheBackend], ttl: float = 300) -> None:
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # Only the in-process backend is cheap enough to call on the event loop
+        self._blocking = backend is not None and not isinstance(backend, MemoryBackend)
+
+    @classmethod
+    def from_env(cls) -> 'ResponseCache':
+        url = os.getenv("CACHE_URL", "memory://")
+        ttl = float(os.getenv("CACHE_TTL", "300"))
+        backend: Optional[CacheBackend]
+        if url.startswith("none") or ttl <= 0:
+            backend = None
+        elif url.startswith("redis"):
+            backend = RedisBackend.from_url(url)
+        else:
+            backend = MemoryBackend(int(os.getenv("CACHE_MAX_ENTRIES", "4096")))
+        return cls(backend, ttl)
+
+    @staticmethod
+    def key(user_id: int, endpoint: str, **params: Any) -> str:
+        query = "&".join(f"{name}={params[name]}" for name in sorted(params))
+        return f"{user_id}:{endpoint}:{query}"
+
+    async def _call(self, fn: Callable[..., Any], *args: Any) -> Any:
+        if self._blocking:
+            return await run_in_threadpool(fn, *args)
+        return fn(*args)
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        if self.backend is None:
+            return await loader()
+        value = await self._call(self.backend.get, key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+        # The loader runs after the version in the key was read, so what it
+        # stores is never older than that version
+        value = await loader()
+        await self._call(self.backend.set, key, value, self.ttl)
+        return value
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "backend": type(self.backend).__name__ if self.backend else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": getattr(self.backend, "evictions", 0),
+            "size": len(self.backend) if isinstance(self.backend, MemoryBackend) else None,
+        }
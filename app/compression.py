@@ -0,0 +1,171 @@
+"""
+Response compression for the API.
+
+:class:`CompressionMiddleware` compresses response bodies with the best
+coding the client lists in ``Accept-Encoding``, in the server's order of
+preference COMPRESSION_ENCODINGS (``br`` and ``gzip``; ``br`` only when
+the optional brotli package is installed, poetry install -E brotli).
+
+Only textual bodies (JSON, NDJSON, CSV, plain text) are compressed, and a
+complete body only when it is at least COMPRESSION_MIN_SIZE bytes: smaller
+ones fit in a packet or two anyway. Streaming responses are compressed
+chunk by chunk, each chunk flushed so it reaches the client as soon as it
+is produced. Routes can opt out with :func:`no_compression`.
+
+Compressed responses get ``Vary: Accept-Encoding``, and a strong ETag is
+made weak, since the bytes differ from the identity representation.
+"""
+import os
+import zlib
+from typing import Any, Callable, Optional, Sequence, TypeVar
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli  # type: ignore[import-untyped, import-not-found]
+except ImportError:
+    brotli = None
+
+ENCODINGS = tuple(name.strip() for name in os.getenv("COMPRESSION_ENCODINGS", "br,gzip").split(",") if name.strip())
+MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1400"))
+GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+# Qualities above 5 cost far more CPU for a few percent on dynamic bodies
+BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/x-ndjson")
+
+F = TypeVar("F", bound=Callable[..., Any])
+# (chunk, final) -> compressed bytes; the stream is finished when final is True
+Encoder = Callable[[bytes, bool], bytes]
+
+
+def no_compression(endpoint: F) -> F:
+    """Mark a route endpoint whose responses are always sent uncompressed"""
+    setattr(endpoint, "no_compression", True)
+    return endpoint
+
+
+def brotli_available() -> bool:
+    return brotli is not None
+
+
+def gzip_encoder(level: int = GZIP_LEVEL) -> Encoder:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def encode(data: bytes, final: bool) -> bytes:
+        return compressor.compress(data) + compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+    return encode
+
+
+def brotli_encoder(quality: int = BROTLI_QUALITY) -> Encoder:
+    compressor = brotli.Compressor(quality=quality)
+
+    def encode(data: bytes, final: bool) -> bytes:
+        return compressor.process(data) + (compressor.finish() if final else compressor.flush())
+
+    return encode
+
+
+def negotiate(accept_encoding: str, encodings: Sequence[str]) -> Optional[str]:
+    """The coding of ``encodings`` the client prefers by q-value, ties going to the earlier one"""
+    weights: dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        coding, *params = item.split(";")
+        weight = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        if coding.strip():
+            weights[coding.strip().lower()] = weight
+    best, best_weight = None, 0.0
+    for coding in encodings:
+        weight = weights.get(coding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing textual response bodies; see the module docstring"""
+
+    def __init__(self, app: Any, encodings: Sequence[str] = ENCODINGS, min_size: int = MIN_SIZE,
+                 gzip_level: int = GZIP_LEVEL, brotli_quality: int = BROTLI_QUALITY) -> None:
+        unknown = set(encodings) - {"br", "gzip"}
+        if unknown:
+            raise ValueError(f"Unsupported COMPRESSION_ENCODINGS: {', '.join(sorted(unknown))}")
+        self.app = app
+        self.encodings = [coding for coding in encodings if coding != "br" or brotli_available()]
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def _encoder(self, coding: str) -> Encoder:
+        return brotli_encoder(self.brotli_quality) if coding == "br" else gzip_encoder(self.gzip_level)
+
+    @staticmethod
+    def _compressible(scope: dict, message: dict) -> bool:
+        headers = Headers(raw=message.get("headers", []))
+        return (200 <= message["status"] and message["status"] not in (204, 304)
+                and "content-encoding" not in headers
+                and headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+                and not getattr(scope.get("endpoint"), "no_compression", False))
+
+    async def __call__(self, scope: dict, receive: Any, send: Any) -> None:
+        if scope["type"] != "http" or scope["method"] == "HEAD" or not self.encodings:
+            await self.app(scope, receive, send)
+            return
+        coding = negotiate(Headers(scope=scope).get("accept-encoding", ""), self.encodings)
+        start: Optional[dict] = None
+        encode: Optional[Encoder] = None
+        passthrough = False
+
+        async def send_compressed(message: dict) -> None:
+            nonlocal start, encode, passthrough
+            if passthrough:
+                await send(message)
+            elif message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                if not self._compressible(scope, message):
+                    passthrough = True
+                    await send(message)
+                    return
+                MutableHeaders(scope=message).add_vary_header("Accept-Encoding")
+                if coding is None:
+                    passthrough = True
+                    await send(message)
+                    return
+                # Held until the first body chunk shows whether the body is worth compressing
+                start = message
+            elif message["type"] != "http.response.body":
+                await send(message)
+            elif encode is None:
+                assert start is not None and coding is not None
+                body, more_body = message.get("body", b""), message.get("more_body", False)
+                if not more_body and len(body) < self.min_size:
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                encode = self._encoder(coding)
+                headers = MutableHeaders(scope=start)
+                headers["Content-Encoding"] = coding
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    headers["ETag"] = f"W/{etag}"
+                body = encode(body, not more_body)
+                if more_body:
+                    del headers["Content-Length"]
+                else:
+                    headers["Content-Length"] = str(len(body))
+                await send(start)
+                await send({"type": "http.response.body", "body": body, "more_body": more_body})
+            else:
+                more_body = message.get("more_body", False)
+                await send({"type": "http.response.body", "body": encode(message.get("body", b""), not more_body),
+                            "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,376 @@
+"""
+Synchronous query functions behind the API routes.
+
+Each function takes a sync ``Session`` as its first argument and is executed
+through ``app.database.run_db``, so the same code serves the sync and async
+data paths. Results are returned as plain values or validated schemas, never
+as ORM objects that could lazy-load once the session has moved on.
+"""
+import base64
+import binascii
+import re
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence
+
+from fastapi import HTTPException
+from sqlalchemy import Date, Select, Text, and_, func, insert, literal_column, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.expression import FunctionElement
+
+from .analytics import lttb
+from .fastapi_schemas import (MoodEntryCreate, MoodEntryOut, MoodEntrySearchHit, MoodEntrySlim, MoodSeriesPoint,
+                              UserCreate)
+from .models.activity import Activity, link_activities
+from .models.mood_entry import UNIQUE_DAILY_ENTRY_INDEX, MoodEntry
+from .models.rollup import DailyMoodRollup, RollupState, WeeklyMoodRollup
+from .models.search import (FTS_TABLE, TS_CONFIG, TS_VECTOR_SQL, fts5_query, has_search_index, mood_entries_fts,
+                             search_terms)
+from .models.user import User
+from .models.user_stats import UserStats, create_missing_stats
+
+# Projections of the entry list endpoints, in MoodEntryOut's field order
+ENTRY_FIELDS = tuple(MoodEntryOut.model_fields)
+SLIM_FIELDS = tuple(name for name in ENTRY_FIELDS if name in MoodEntrySlim.model_fields)
+
+
+def create_user(db: Session, user: UserCreate, password_hash: str) -> int:
+    if db.query(User).filter(User.username == user.username).first():
+        raise HTTPException(status_code=400, detail="Username already in use.")
+    if db.query(User).filter(User.email == user.email).first():
+        raise HTTPException(status_code=400, detail="Email already registered.")
+    db_user = User(username=user.username, email=user.email)
+    db_user.password_hash = password_hash
+    db.add(db_user)
+    db.commit()
+    db.refresh(db_user)
+    return db_user.id
+
+
+def get_credentials(db: Session, username: str) -> Optional[tuple[int, str]]:
+    """Return (user_id, password_hash) for a username"""
+    row = db.query(User.id, User.password_hash).filter(User.username == username).first()
+    # End the read transaction so the connection goes back to the pool while
+    # the caller verifies the password
+    db.commit()
+    return (row.id, row.password_hash) if row else None
+
+
+def record_login(db: Session, user_id: int) -> None:
+    db_user = db.get(User, user_id)
+    if db_user is not None:
+        db_user.last_login = None
+        db.commit()
+
+
+def save_mood_entry(db: Session, user_id: int, entry: MoodEntryCreate, upsert: bool = False) -> MoodEntryOut:
+    db_entry = MoodEntry.get_entry_by_date(db, user_id, entry.date) if upsert else None
+    if db_entry is None:
+        db_entry = MoodEntry(
+            user_id=user_id,
+            date=entry.date,
+            mood_score=entry.mood_score,
+            emoji=entry.emoji,
+            notes=entry.notes,
+            activities=entry.activities
+        )
+        db.add(db_entry)
+    else:
+        # Upsert replaces that day's entry wholesale
+        db_entry.mood_score = entry.mood_score
+        db_entry.emoji = entry.emoji
+        db_entry.notes = entry.notes
+        db_entry.activities = entry.activities
+    try:
+        db.commit()
+    except IntegrityError as exc:
+        db.rollback()
+        if not _is_daily_conflict(exc):
+            raise
+        raise HTTPException(status_code=409,
+                            detail="An entry for this date already exists. Use upsert=true to replace it.")
+    # Names the deferred notes column, so it comes back in the same SELECT
+    db.refresh(db_entry, list(ENTRY_FIELDS))
+    return MoodEntryOut.model_validate(db_entry)
+
+
+def _is_daily_conflict(exc: IntegrityError) -> bool:
+    """True if ``exc`` comes from the unique (user_id, date) index, not some other constraint"""
+    message = str(exc.orig)
+    # PostgreSQL names the index, SQLite its columns
+    return UNIQUE_DAILY_ENTRY_INDEX in message or "mood_entries.user_id, mood_entries.date" in message
+
+
+def insert_mood_entries(db: Session, user_id: int, entries: Sequence[MoodEntryCreate]) -> Optional[List[int]]:
+    """Insert a chunk of entries in one transaction and return their ids in input order.
+
+    Returns None if the chunk hit the unique (user_id, date) index and was
+    rolled back.
+    """
+    try:
+        ids = bulk_insert_mood_entries(db, [(user_id, entry) for entry in entries])
+    except IntegrityError as exc:
+        db.rollback()
+        if not _is_daily_conflict(exc):
+            raise
+        return None
+    db.commit()
+    return ids
+
+
+def bulk_insert_mood_entries(db: Session, entries: Sequence[tuple[int, MoodEntryCreate]]) -> List[int]:
+    """Insert (user_id, entry) pairs without committing and return their ids in input order.
+
+    Uses a single multi-row INSERT ... RETURNING instead of a flush per entry,
+    so the flush-time listeners do not run: activity links and the stats
+    aggregates are maintained here. The stats rows of all users involved are
+    locked up front, in user id order, so concurrent writers cannot deadlock.
+    """
+    user_ids = sorted({user_id for user_id, _ in entries})
+    created = create_missing_stats(db, user_ids)
+    stats = {row.user_id: row for row in db.scalars(
+        select(UserStats).where(UserStats.user_id.in_(user_ids)).order_by(UserStats.user_id).with_for_update())}
+    for user_id in created:
+        # Seeded under the lock from the rows already in the database
+        stats[user_id].copy_from(UserStats.compute(db, user_id))
+    rows = [{**entry.model_dump(), "user_id": user_id} for user_id, entry in entries]
+    ids = db.execute(insert(MoodEntry).returning(MoodEntry.id, sort_by_parameter_order=True), rows).scalars().all()
+    link_activities(db, [(entry_id, user_id, entry.activities) for entry_id, (user_id, entry) in zip(ids, entries)])
+    for user_id, entry in entries:
+        stats[user_id].apply(entry.mood_score, entry.emoji, entry.activities)
+    for user_id in user_ids:
+        stats[user_id].touch()
+    return list(ids)
+
+
+def encode_cursor(entry_date: date, entry_id: int) -> str:
+    """Opaque keyset cursor pointing just past the entry (date, id)"""
+    return base64.urlsafe_b64encode(f"{entry_date.isoformat()},{entry_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[date, int]:
+    try:
+        entry_date, entry_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(",")
+        return date.fromisoformat(entry_date), int(entry_id)
+    except (binascii.Error, UnicodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+
+def entry_fields(fields: Optional[str]) -> tuple[str, ...]:
+    """Parse a ``fields=`` projection: comma-separated MoodEntryOut field names, or ``slim``.
+
+    Returns the names in schema order. id and date are always included, since
+    the keyset cursor is built from them.
+    """
+    if not fields:
+        return ENTRY_FIELDS
+    if fields == "slim":
+        return SLIM_FIELDS
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested.difference(ENTRY_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}.")
+    return tuple(name for name in ENTRY_FIELDS if name in requested | {"id", "date"})
+
+
+def _entry_criteria(user_id: int, activity: Optional[str] = None, after: Optional[str] = None) -> list[Any]:
+    criteria: list[Any] = [MoodEntry.user_id == user_id]
+    if activity:
+        criteria.append(MoodEntry.linked_activities.any(
+            (Activity.user_id == user_id) & (Activity.name == activity.strip())))
+    if after:
+        # Keyset on (date, id): seeks through ix_mood_entries_user_id_date
+        # instead of counting past skipped rows like OFFSET would
+        after_date, after_id = decode_cursor(after)
+        criteria.append(or_(MoodEntry.date > after_date,
+                            and_(MoodEntry.date == after_date, MoodEntry.id > after_id)))
+    return criteria
+
+
+def list_mood_entries(db: Session, user_id: int, activity: Optional[str] = None, limit: Optional[int] = 100,
+                      after: Optional[str] = None,
+                      fields: Sequence[str] = ENTRY_FIELDS) -> tuple[List[Dict[str, Any]], Optional[str]]:
+    """Return one page of entries in (date, id) order and the cursor of the next page, if any.
+
+    Entries are plain dicts of the MoodEntryOut ``fields`` (see entry_fields),
+    read as row tuples: no ORM instances are built and nothing is validated
+    again on the way out. ``limit=None`` returns every remaining entry.
+    """
+    statement = mood_entries_statement(user_id, activity, after=after, fields=fields)
+    if limit is None:
+        return [row._asdict() for row in db.execute(statement)], None
+    rows = db.execute(statement.limit(limit + 1)).all()
+    page = [row._asdict() for row in rows[:limit]]
+    next_cursor = encode_cursor(page[-1]["date"], page[-1]["id"]) if len(rows) > limit else None
+    return page, next_cursor
+
+
+def _date_range(column: Any, start: Optional[date], end: Optional[date]) -> list[Any]:
+    criteria = []
+    if start is not None:
+        criteria.append(column >= start)
+    if end is not None:
+        criteria.append(column <= end)
+    return criteria
+
+
+def mood_entries_statement(user_id: int, activity: Optional[str] = None, start: Optional[date] = None,
+                           end: Optional[date] = None, after: Optional[str] = None,
+                           fields: Sequence[str] = ENTRY_FIELDS) -> Select:
+    """Column-only select of a user's entries, without ORM identity overhead"""
+    columns = [getattr(MoodEntry, name) for name in fields]
+    return (select(*columns)
+            .where(*_entry_criteria(user_id, activity, after), *_date_range(MoodEntry.date, start, end))
+            .order_by(MoodEntry.date.asc(), MoodEntry.id.asc()))
+
+
+def _like_snippet(notes: Optional[str], terms: list[str], width: int = 40) -> Optional[str]:
+    """Text around the first matched term, for databases without a full-text index"""
+    if not notes:
+        return None
+    match = re.search("|".join(re.escape(term) for term in terms), notes, re.IGNORECASE)
+    if match is None:
+        return notes[:2 * width]
+    start, end = max(match.start() - width, 0), match.end() + width
+    return ("…" if start else "") + notes[start:match.start()] + f"[{match.group()}]" + notes[match.end():end] + \
+        ("…" if end < len(notes) else "")
+
+
+def search_mood_entries(db: Session, user_id: int, query: str, limit: int = 20,
+                        offset: int = 0) -> List[MoodEntrySearchHit]:
+    """Rank the user's entries whose notes contain every word of ``query``, best match first"""
+    terms = search_terms(query)
+    if not terms:
+        return []
+    columns: List[Any] = [MoodEntry.id, MoodEntry.date, MoodEntry.mood_score, MoodEntry.emoji]
+    statement: Select
+    connection = db.connection()
+    dialect = connection.dialect.name
+    if dialect == "sqlite" and has_search_index(connection):
+        fts = literal_column(FTS_TABLE, Text)
+        # bm25() is lower for better matches; the user_id column gets no weight.
+        # Not labelled "rank", which is a hidden FTS5 column.
+        relevance = (-func.bm25(fts, 1.0, 0.0)).label("relevance")
+        statement = (select(*columns, func.snippet(fts, 0, "[", "]", "…", 12).label("snippet"), relevance)
+                     .select_from(mood_entries_fts)
+                     .join(MoodEntry, MoodEntry.id == mood_entries_fts.c.rowid)
+                     .where(fts.op("MATCH")(fts5_query(user_id, terms))))
+    elif dialect == "postgresql":
+        config = literal_column(f"'{TS_CONFIG}'", Text)
+        ts_query = func.to_tsquery(config, " & ".join(terms[:-1] + [f"{terms[-1]}:*"]))
+        vector = literal_column(TS_VECTOR_SQL, Text)
+        relevance = func.ts_rank(vector, ts_query).label("relevance")
+        snippet = func.ts_headline(config, MoodEntry.notes, ts_query,
+                                   "StartSel=[, StopSel=], MinWords=5, MaxWords=15, MaxFragments=1")
+        statement = (select(*columns, snippet.label("snippet"), relevance)
+                     .where(vector.op("@@")(ts_query), MoodEntry.user_id == user_id))
+    else:
+        rows = db.execute(
+            select(*columns, MoodEntry.notes)
+            .where(MoodEntry.user_id == user_id,
+                   *(func.lower(MoodEntry.notes).contains(term.lower(), autoescape=True) for term in terms))
+            .order_by(MoodEntry.date.desc(), MoodEntry.id.desc())
+            .limit(limit).offset(offset)
+        ).all()
+        return [MoodEntrySearchHit(id=row.id, date=row.date, mood_score=row.mood_score, emoji=row.emoji,
+                                   snippet=_like_snippet(row.notes, terms), rank=0.0) for row in rows]
+    rows = db.execute(statement.order_by(relevance.desc(), MoodEntry.id.desc()).limit(limit).offset(offset)).all()
+    return [MoodEntrySearchHit(id=row.id, date=row.date, mood_score=row.mood_score, emoji=row.emoji,
+                               snippet=row.snippet, rank=round(float(row.relevance), 6)) for row in rows]
+
+
+def list_monthly_entries(db: Session, user_id: int, year: int, month: int,
+                         fields: Sequence[str] = ENTRY_FIELDS) -> List[Dict[str, Any]]:
+    """A month of entries as plain dicts, like list_mood_entries"""
+    first = date(year, month, 1)
+    last = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+    statement = mood_entries_statement(user_id, start=first, end=last, fields=fields)
+    return [row._asdict() for row in db.execute(statement)]
+
+
+def get_validators(db: Session, user_id: int) -> tuple[int, Optional[datetime]]:
+    """Return the (version, updated_at) of a user's entries; (0, None) before the first write"""
+    row = db.execute(select(UserStats.version, UserStats.updated_at).where(UserStats.user_id == user_id)).first()
+    return (row.version, row.updated_at) if row else (0, None)
+
+
+def get_stats(db: Session, user_id: int) -> Dict[str, Any]:
+    # The aggregate row is maintained on every MoodEntry flush; users whose
+    # history predates it fall back to a one-off computation.
+    stats = db.get(UserStats, user_id) or UserStats.compute(db, user_id)
+    return stats.to_dict()
+
+
+SERIES_BUCKETS = ("day", "week", "month")
+
+
+class date_bucket(FunctionElement):
+    """First day of the day/week/month containing a date; weeks start on Monday"""
+    type = Date()
+    inherit_cache = True
+    name = "date_bucket"
+
+    def __init__(self, unit: str, column: Any) -> None:
+        if unit not in SERIES_BUCKETS:
+            raise ValueError(f"Unknown bucket {unit!r}")
+        # A literal rather than a bound parameter, so the SELECT and GROUP BY
+        # expressions are identical and the unit is part of the cache key
+        super().__init__(literal_column(f"'{unit}'"), column)
+
+
+@compiles(date_bucket)
+def _date_bucket_default(element, compiler, **kw):
+    unit, column = element.clauses
+    return f"CAST(date_trunc({compiler.process(unit, **kw)}, {compiler.process(column, **kw)}) AS DATE)"
+
+
+@compiles(date_bucket, "sqlite")
+def _date_bucket_sqlite(element, compiler, **kw):
+    unit, column = element.clauses
+    modifiers = {"'day'": "", "'week'": ", 'weekday 0', '-6 days'", "'month'": ", 'start of month'"}
+    return f"date({compiler.process(column, **kw)}{modifiers[unit.name]})"
+
+
+def get_mood_series(db: Session, user_id: int, start: Optional[date] = None, end: Optional[date] = None,
+                    bucket: str = "day", points: Optional[int] = None) -> List[MoodSeriesPoint]:
+    """Per-bucket mood aggregates between ``start`` and ``end`` (inclusive), grouped in SQL.
+
+    With ``points``, the series is reduced to at most that many buckets by
+    LTTB, which keeps the visual peaks and troughs of a long range.
+    """
+    period = date_bucket(bucket, MoodEntry.date).label("period")
+    rows = db.execute(
+        select(period,
+               func.avg(MoodEntry.mood_score).label("avg_score"),
+               func.min(MoodEntry.mood_score).label("min_score"),
+               func.max(MoodEntry.mood_score).label("max_score"),
+               func.count(MoodEntry.id).label("entry_count"))
+        .where(MoodEntry.user_id == user_id, *_date_range(MoodEntry.date, start, end))
+        .group_by(period)
+        .order_by(period)
+    ).all()
+    if points is not None and len(rows) > points:
+        keep = lttb([row.period.toordinal() for row in rows], [float(row.avg_score) for row in rows], points)
+        rows = [rows[i] for i in keep]
+    return [MoodSeriesPoint(period=row.period, avg_score=round(float(row.avg_score), 3), min_score=row.min_score,
+                            max_score=row.max_score, count=row.entry_count) for row in rows]
+
+
+def list_daily_rollups(db: Session, start: Optional[date] = None, end: Optional[date] = None) -> List[Dict[str, Any]]:
+    rows = db.scalars(select(DailyMoodRollup)
+                      .where(*_date_range(DailyMoodRollup.day, start, end))
+                      .order_by(DailyMoodRollup.day))
+    return [row.to_dict() for row in rows]
+
+
+def list_weekly_rollups(db: Session, start: Optional[date] = None, end: Optional[date] = None) -> List[Dict[str, Any]]:
+    rows = db.scalars(select(WeeklyMoodRollup)
+                      .where(*_date_range(WeeklyMoodRollup.week_start, start, end))
+                      .order_by(WeeklyMoodRollup.week_start))
+    return [row.to_dict() for row in rows]
+
+
+def get_rollup_state(db: Session, name: str = "mood_entries") -> Optional[Dict[str, Any]]:
+    state = db.get(RollupState, name)
+    return state.to_dict() if state else None
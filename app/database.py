@@ -0,0 +1,174 @@
+"""
+Database engine/session factory shared by the API and the command-line tools.
+
+The data path is sync or async depending on configuration:
+
+- DATABASE_URL with an async driver (``sqlite+aiosqlite://``,
+  ``postgresql+asyncpg://``) or DATABASE_ASYNC=1 gives an AsyncEngine and
+  ``async_sessionmaker``;
+- otherwise a regular Engine and ``sessionmaker`` are used.
+
+Query code is written once against a sync ``Session`` and executed through
+:func:`run_db`, which uses ``AsyncSession.run_sync`` on the async path and the
+threadpool on the sync one.
+
+Pooling is configured per backend and can be overridden with DB_POOL_SIZE,
+DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_PRE_PING and DB_POOL_RECYCLE. SQLite
+connections are switched to WAL with synchronous=NORMAL, so readers no longer
+block behind a writer, and wait SQLITE_BUSY_TIMEOUT_MS for the write lock
+instead of failing with "database is locked".
+"""
+import os
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Optional, Sequence, TypeVar, Union
+
+from sqlalchemy import Executable, Row, create_engine, event
+from sqlalchemy.engine import URL, Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+from starlette.concurrency import run_in_threadpool
+
+from .profiling import in_profiled_route
+
+DEFAULT_DATABASE_URL = "sqlite:///./mood_diary.db"
+
+# Async DBAPI used for each backend when DATABASE_ASYNC=1 is set on a plain URL
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+DbSession = Union[Session, AsyncSession]
+T = TypeVar("T")
+
+
+def _env_flag(name: str, default: bool = False) -> bool:
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value and value.strip() else default
+
+
+def _is_sqlite_memory(url: URL) -> bool:
+    return url.database in (None, "", ":memory:") or url.query.get("mode") == "memory"
+
+
+def resolve_database_url(database_url: Optional[str] = None, use_async: Optional[bool] = None) -> URL:
+    """Return the configured URL with its driver switched to match the requested mode"""
+    url = make_url(database_url or os.getenv("DATABASE_URL") or DEFAULT_DATABASE_URL)
+    is_async = url.get_dialect().is_async
+    if use_async is None:
+        use_async = is_async or _env_flag("DATABASE_ASYNC")
+    backend = url.get_backend_name()
+    if use_async and not is_async:
+        if backend not in ASYNC_DRIVERS:
+            raise ValueError(f"No async driver configured for {backend!r} databases")
+        url = url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+    elif not use_async and is_async:
+        url = url.set(drivername=backend)
+    return url
+
+
+def engine_options(url: URL) -> dict[str, Any]:
+    """Keyword arguments for ``create_engine`` suited to the backend in ``url``"""
+    if url.get_backend_name() != "sqlite":
+        # Network databases: verify connections on checkout and replace them
+        # before server-side idle timeouts close them
+        return {
+            "pool_size": _env_int("DB_POOL_SIZE", 10),
+            "max_overflow": _env_int("DB_MAX_OVERFLOW", 20),
+            "pool_timeout": _env_int("DB_POOL_TIMEOUT", 30),
+            "pool_pre_ping": _env_flag("DB_POOL_PRE_PING", True),
+            "pool_recycle": _env_int("DB_POOL_RECYCLE", 1800),
+        }
+    options: dict[str, Any] = {
+        "connect_args": {"check_same_thread": False},
+        "pool_pre_ping": _env_flag("DB_POOL_PRE_PING"),
+        "pool_recycle": _env_int("DB_POOL_RECYCLE", -1),
+    }
+    # In-memory databases live in a single connection, so SQLAlchemy picks a
+    # static/singleton-thread pool that takes no sizing arguments
+    if not _is_sqlite_memory(url):
+        options.update(
+            pool_size=_env_int("DB_POOL_SIZE", 5),
+            max_overflow=_env_int("DB_MAX_OVERFLOW", 10),
+            pool_timeout=_env_int("DB_POOL_TIMEOUT", 30),
+        )
+    return options
+
+
+def _set_sqlite_pragmas(dbapi_connection: Any, connection_record: Any, wal: bool = True) -> None:
+    cursor = dbapi_connection.cursor()
+    if wal:
+        # Persistent per database file; a no-op after the first connection
+        cursor.execute("PRAGMA journal_mode=WAL")
+    # With WAL, NORMAL only syncs at checkpoints and stays corruption-safe
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={_env_int('SQLITE_BUSY_TIMEOUT_MS', 5000)}")
+    # Negative values are KiB rather than pages
+    cursor.execute(f"PRAGMA cache_size=-{_env_int('SQLITE_CACHE_SIZE_KB', 64000)}")
+    cursor.close()
+
+
+def get_engine_and_session(database_url=None, use_async=None):
+    """Create the engine and session factory.
+
+    ``use_async`` defaults to the configuration (driver in the URL or
+    DATABASE_ASYNC); command-line tools pass ``use_async=False``.
+    """
+    url = resolve_database_url(database_url, use_async)
+    options = engine_options(url)
+    if url.get_dialect().is_async:
+        engine = create_async_engine(url, **options)
+        sync_engine = engine.sync_engine
+    else:
+        engine = sync_engine = create_engine(url, **options)
+    if url.get_backend_name() == "sqlite":
+        event.listen(sync_engine, "connect", partial(_set_sqlite_pragmas, wal=not _is_sqlite_memory(url)))
+    if isinstance(engine, AsyncEngine):
+        return engine, async_sessionmaker(bind=engine, autoflush=False)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    return engine, SessionLocal
+
+
+async def run_db(db: DbSession, fn: Callable[..., T], *args: Any) -> T:
+    """Run ``fn(session, *args)`` without blocking the event loop"""
+    fn = in_profiled_route(fn)
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args)
+    return await run_in_threadpool(fn, db, *args)
+
+
+async def stream_row_batches(session_factory: Callable[[], DbSession], statement: Executable,
+                             batch_size: int = 500) -> AsyncIterator[Sequence[Row]]:
+    """Yield the rows of ``statement`` in batches from a server-side cursor.
+
+    Uses a session of its own, since a streaming response outlives the
+    request's ``get_db`` session.
+    """
+    db = session_factory()
+    statement = statement.execution_options(yield_per=batch_size)
+    try:
+        if isinstance(db, AsyncSession):
+            stream = await db.stream(statement)
+            async for partition in stream.partitions():
+                yield partition
+        else:
+            result = await run_in_threadpool(db.execute, statement)
+            while partition := await run_in_threadpool(result.fetchmany, batch_size):
+                yield partition
+    finally:
+        if isinstance(db, AsyncSession):
+            await db.close()
+        else:
+            await run_in_threadpool(db.close)
+
+
+async def create_tables(engine: Union[Engine, AsyncEngine], metadata: Any) -> None:
+    if isinstance(engine, AsyncEngine):
+        async with engine.begin() as conn:
+            await conn.run_sync(metadata.create_all)
+    else:
+        metadata.create_all(bind=engine)
@@ -0,0 +1,111 @@
+"""
+Writers for GET /export/{user_id}: turn batches of entry rows from a
+server-side cursor into chunks of CSV, NDJSON or Parquet as they arrive.
+
+No writer holds more than one batch. Parquet is written one row group per
+batch through a sink that hands back the bytes produced so far, so the
+whole file is never built in memory. Parquet needs the optional pyarrow
+package (poetry install -E parquet).
+"""
+import csv
+import io
+from datetime import date, datetime
+from typing import Any, AsyncIterator, Callable, Sequence, Union
+
+from sqlalchemy import Row
+from starlette.concurrency import run_in_threadpool
+
+from .fastapi_schemas import MoodEntryOut
+
+FIELDS = list(MoodEntryOut.model_fields)
+# Rows per server-side cursor fetch; for Parquet also rows per row group
+BATCH_SIZE = {"csv": 1000, "ndjson": 1000, "parquet": 10_000}
+MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson", "parquet": "application/vnd.apache.parquet"}
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow  # type: ignore[import-untyped, import-not-found]  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _text(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
+
+async def csv_chunks(batches: AsyncIterator[Sequence[Row]]) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(FIELDS)
+    async for rows in batches:
+        writer.writerows([_text(value) for value in row] for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        # Header of an empty export
+        yield buffer.getvalue()
+
+
+async def ndjson_chunks(batches: AsyncIterator[Sequence[Row]]) -> AsyncIterator[str]:
+    async for rows in batches:
+        yield "".join(MoodEntryOut.model_validate(row._asdict()).model_dump_json() + "\n" for row in rows)
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that keeps what was written until it is drained"""
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: Any) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+
+def _parquet_schema() -> Any:
+    import pyarrow as pa  # type: ignore[import-untyped, import-not-found]
+    return pa.schema([
+        ("id", pa.int64()),
+        ("date", pa.date32()),
+        ("mood_score", pa.int16()),
+        ("emoji", pa.string()),
+        ("notes", pa.string()),
+        ("activities", pa.string()),
+        ("user_id", pa.int64()),
+        ("created_at", pa.timestamp("us")),
+    ])
+
+
+async def parquet_chunks(batches: AsyncIterator[Sequence[Row]]) -> AsyncIterator[bytes]:
+    import pyarrow as pa  # type: ignore[import-untyped, import-not-found]
+    import pyarrow.parquet as pq  # type: ignore[import-untyped, import-not-found]
+
+    schema = _parquet_schema()
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        async for rows in batches:
+            columns = list(zip(*rows))
+            table = pa.Table.from_arrays([pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+                                         schema=schema)
+            # Encoding and compression are CPU-bound; keep them off the event loop
+            await run_in_threadpool(writer.write_table, table)
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+WRITERS: dict[str, Callable[[AsyncIterator[Sequence[Row]]], AsyncIterator[Union[str, bytes]]]] = {
+    "csv": csv_chunks, "ndjson": ndjson_chunks, "parquet": parquet_chunks,
+}
@@ -1,136 +1,433 @@
-from dotenv import load_dotenv
-from fastapi import FastAPI, Depends, HTTPException
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, Session
+import asyncio
+import logging
 import os
-from .models.user import User
-from .models.mood_entry import MoodEntry
+import secrets
+import orjson
+from dotenv import load_dotenv
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import analytics, crud, export
+from .cache import ResponseCache
+from .compression import CompressionMiddleware, no_compression
+from .database import DbSession, create_tables, get_engine_and_session, run_db, stream_row_batches
+from .hashing import PasswordHasher, PoolSaturated
+from .instrumentation import InstrumentationMiddleware, Metrics
+from .profiling import ProfiledRoute, Profiler
 from .models import Base
-from .fastapi_schemas import UserCreate, UserLogin, MoodEntryCreate, MoodEntryOut
-from typing import List, Dict, Any
-from datetime import datetime
-from collections import Counter
+from .tools.rollup import DEFAULT_LAG, run_rollups
+from .fastapi_schemas import (UserCreate, UserLogin, MoodEntryCreate, MoodEntryOut, MoodEntrySearchHit, MoodEntrySlim,
+                              MoodSeriesPoint)
+from typing import List, Dict, Any, AsyncIterator, Literal, Optional, Sequence, Union
+from pydantic import ValidationError
 from contextlib import asynccontextmanager
+from datetime import date, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
 
-def get_engine_and_session(database_url=None):
-    url = database_url or os.getenv("DATABASE_URL", "sqlite:///./mood_diary.db")
-    engine = create_engine(url, connect_args={"check_same_thread": False})
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-    return engine, SessionLocal
-
+# Entries per INSERT/transaction and per request in POST /mood-entries/batch
+BATCH_CHUNK_SIZE = 500
+MAX_BATCH_ITEMS = 10_000
+# Page size of GET /mood-entries/{user_id} when a cursor is given without a limit
+DEFAULT_PAGE_SIZE = 100
+# Upper bound of the LTTB target in GET /mood-series
+MAX_SERIES_POINTS = 5_000
+# Projections of the monthly listing kept in the response cache; others are always read
+CACHED_FIELDS = (crud.ENTRY_FIELDS, crud.SLIM_FIELDS)
+FIELDS_DESCRIPTION = ("Comma-separated MoodEntryOut fields to return, or `slim` for MoodEntrySlim. "
+                      "id and date are always included.")
 
 engine, SessionLocal = get_engine_and_session()
+password_hasher = PasswordHasher.from_env()
+response_cache = ResponseCache.from_env()
+profiler = Profiler.from_env()
+
+# Shared secret for the /admin routes (X-Admin-Token); unset disables them
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+# Seconds between background rollup runs; 0 leaves it to the CLI (app/tools/rollup.py)
+ROLLUP_INTERVAL = float(os.getenv("ROLLUP_INTERVAL", "0"))
+ROLLUP_LAG = timedelta(seconds=float(os.getenv("ROLLUP_LAG", str(DEFAULT_LAG.total_seconds()))))
 
 
-def get_db():
+async def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
+        if isinstance(db, AsyncSession):
+            await db.close()
+        else:
+            db.close()
+
+
+def _is_admin(token: Optional[str]) -> bool:
+    if not ADMIN_TOKEN or token is None:
+        return False
+    return secrets.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+
+async def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin API is disabled.")
+    if not _is_admin(x_admin_token):
+        raise HTTPException(status_code=401, detail="Invalid admin token.")
+
+
+async def _rollup_loop(interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        db = SessionLocal()
+        try:
+            processed = await run_db(db, run_rollups, 1000, ROLLUP_LAG)
+            if processed:
+                logger.info("Rolled up %d mood entries", processed)
+        except Exception:
+            logger.exception("Rollup run failed")
+        finally:
+            if isinstance(db, AsyncSession):
+                await db.close()
+            else:
+                db.close()
+
+
+async def _batch_items(request: Request) -> AsyncIterator[tuple[int, Union[bytes, Any]]]:
+    """Yield the raw items of a batch body: an NDJSON stream, or a JSON array"""
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonl" in content_type:
+        # Lines are handed out as they arrive instead of buffering the body
+        index, buffer = 0, b""
+        async for chunk in request.stream():
+            *lines, buffer = (buffer + chunk).split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield index, line
+                    index += 1
+        if buffer.strip():
+            yield index, buffer
+        return
+    try:
+        items = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON.")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON.")
+    for index, item in enumerate(items):
+        yield index, item
+
+
+def _stats_key(user_id: int, version: int) -> str:
+    return ResponseCache.key(user_id, "stats", version=version)
+
+
+def _analytics_key(user_id: int, version: int) -> str:
+    return ResponseCache.key(user_id, "analytics", version=version)
+
+
+def _monthly_key(user_id: int, version: int, year: int, month: int,
+                 fields: Sequence[str] = crud.ENTRY_FIELDS) -> str:
+    # Holds the encoded JSON body
+    return ResponseCache.key(user_id, "monthly-body", version=version, year=year, month=month,
+                             fields=",".join(fields))
+
+
+async def _insert_one(db: DbSession, user_id: int, entry: MoodEntryCreate) -> Optional[int]:
+    """Insert a single batch item; None if it conflicts with an existing entry"""
+    ids = await run_db(db, crud.insert_mood_entries, user_id, [entry])
+    return ids[0] if ids else None
+
+
+def _not_modified(request: Request, etag: str, last_modified) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # Weak comparison, as RFC 9110 requires for If-None-Match
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            return last_modified.replace(microsecond=0) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _encode_json(content: Any) -> bytes:
+    # orjson writes dates and datetimes like pydantic's JSON mode once UTC is spelled Z
+    return orjson.dumps(content, option=orjson.OPT_UTC_Z)
+
+
+def _json_body(response: Response, body: Union[str, bytes]) -> Response:
+    """Send an already encoded JSON body, skipping the response_model round trip.
+
+    Used for entry lists, whose rows come straight from the database in
+    MoodEntryOut's shape or a ``fields=`` projection of it. Headers set on the injected ``response`` are copied,
+    since FastAPI drops them when a Response is returned.
+    """
+    encoded = Response(content=body, media_type="application/json")
+    encoded.headers.raw.extend(response.headers.raw)
+    return encoded
+
+
+async def _conditional_get(request: Request, response: Response, db: DbSession,
+                           user_id: int) -> tuple[int, Optional[Response]]:
+    """Return the user's stats version and a 304 response if the client's validators are current.
+
+    Otherwise the validators are attached to ``response``. They come from the
+    stats version, so a revalidation costs one primary-key read and never runs
+    the entries query. Cached bodies are keyed by the same version: whoever
+    wrote the entries, a body is never served under a newer ETag than its data.
+    """
+    version, updated_at = await run_db(db, crud.get_validators, user_id)
+    headers = {"ETag": f'"{user_id}-{version}"', "Cache-Control": "no-cache"}
+    if updated_at is not None:
+        # SQLite hands back naive datetimes; they are stored in UTC
+        updated_at = updated_at if updated_at.tzinfo else updated_at.replace(tzinfo=timezone.utc)
+        headers["Last-Modified"] = format_datetime(updated_at, usegmt=True)
+    if _not_modified(request, headers["ETag"], updated_at):
+        return version, Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return version, None
+
+
+def _process_samples() -> List[tuple[str, str, str, float]]:
+    """Cache and password-hashing pool figures for /metrics"""
+    cache, hashing = response_cache.stats(), password_hasher.stats()
+    samples = [
+        ("mood_diary_cache_hits_total", "counter", "Response cache hits.", cache["hits"]),
+        ("mood_diary_cache_misses_total", "counter", "Response cache misses.", cache["misses"]),
+        ("mood_diary_cache_evictions_total", "counter", "Entries evicted from the response cache.",
+         cache["evictions"]),
+        ("mood_diary_password_hash_workers", "gauge", "Password hashing processes.", hashing["workers"]),
+        ("mood_diary_password_hash_in_flight", "gauge", "Password hashing jobs running or queued.",
+         hashing["in_flight"]),
+        ("mood_diary_password_hash_queue_depth", "gauge", "Password hashing jobs waiting for a worker.",
+         hashing["queue_depth"]),
+        ("mood_diary_password_hash_rejected_total", "counter", "Password hashing jobs rejected with 503.",
+         hashing["rejected"]),
+        ("mood_diary_password_hash_pool_restarts_total", "counter", "Password hashing pools replaced after a crash.",
+         hashing["restarts"]),
+    ]
+    if cache["size"] is not None:
+        samples.append(("mood_diary_cache_entries", "gauge", "Entries in the response cache.", cache["size"]))
+    return samples
 
 
 def register_routes(app):
+    # Lets PROFILE_ROUTES or an admin's X-Profile header sample any of these handlers
+    app.router.route_class = ProfiledRoute
+
     @app.get("/health")
-    def health():
-        return {"status": "ok"}
+    async def health():
+        return {"status": "ok", "password_hashing": password_hasher.stats(), "cache": response_cache.stats()}
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    # Scraped every few seconds from inside the network; compressing would only cost CPU
+    @no_compression
+    async def metrics(request: Request):
+        return PlainTextResponse(request.app.state.metrics.render(_process_samples()),
+                                 media_type="text/plain; version=0.0.4")
 
     @app.post("/register", status_code=201)
-    def register(user: UserCreate, db: Session = Depends(get_db)):
-        if db.query(User).filter(User.username == user.username).first():
-            raise HTTPException(status_code=400, detail="Username already in use.")
-        if db.query(User).filter(User.email == user.email).first():
-            raise HTTPException(status_code=400, detail="Email already registered.")
-        db_user = User(username=user.username, email=user.email)
-        db_user.set_password(user.password)
-        db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
-        return {"msg": "Registration successful!", "user_id": db_user.id}
+    async def register(user: UserCreate, db: DbSession = Depends(get_db)):
+        # Hash before touching the database so no connection is held while
+        # bcrypt runs on the hashing pool
+        password_hash = await password_hasher.hash(user.password)
+        user_id = await run_db(db, crud.create_user, user, password_hash)
+        return {"msg": "Registration successful!", "user_id": user_id}
 
     @app.post("/login")
-    def login(user: UserLogin, db: Session = Depends(get_db)):
-        db_user = db.query(User).filter(User.username == user.username).first()
-        if not db_user or not db_user.check_password(user.password):
+    async def login(user: UserLogin, db: DbSession = Depends(get_db)):
+        credentials = await run_db(db, crud.get_credentials, user.username)
+        if not credentials or not await password_hasher.verify(user.password, credentials[1]):
             raise HTTPException(status_code=401, detail="Invalid username or password.")
-        db_user.last_login = None
-        db.commit()
-        return {"msg": "Login successful!", "user_id": db_user.id}
+        user_id = credentials[0]
+        await run_db(db, crud.record_login, user_id)
+        return {"msg": "Login successful!", "user_id": user_id}
 
     @app.post("/mood-entry", response_model=MoodEntryOut)
-    def create_mood_entry(entry: MoodEntryCreate, user_id: int, db: Session = Depends(get_db)):
-        db_entry = MoodEntry(
-            user_id=user_id,
-            date=entry.date,
-            mood_score=entry.mood_score,
-            emoji=entry.emoji,
-            notes=entry.notes,
-            activities=entry.activities
-        )
-        db.add(db_entry)
-        db.commit()
-        db.refresh(db_entry)
-        return db_entry
-
-    @app.get("/mood-entries/{user_id}", response_model=List[MoodEntryOut])
-    def get_mood_entries(user_id: int, db: Session = Depends(get_db)):
-        entries = db.query(MoodEntry).filter(MoodEntry.user_id == user_id).order_by(MoodEntry.date.asc()).all()
-        return entries
-
-    @app.get("/mood-entries/{user_id}/{year}/{month}", response_model=List[MoodEntryOut])
-    def get_monthly_entries(user_id: int, year: int, month: int, db: Session = Depends(get_db)):
-        start_date = datetime(year, month, 1).date()
-        if month == 12:
-            end_date = datetime(year + 1, 1, 1).date()
-        else:
-            end_date = datetime(year, month + 1, 1).date()
-        entries = db.query(MoodEntry).filter(
-            MoodEntry.user_id == user_id,
-            MoodEntry.date >= start_date,
-            MoodEntry.date < end_date
-        ).order_by(MoodEntry.date.asc()).all()
-        return entries
-
-    @app.get("/stats/{user_id}")
-    def get_stats(user_id: int, db: Session = Depends(get_db)) -> Dict[str, Any]:
-        entries = db.query(MoodEntry).filter(MoodEntry.user_id == user_id).all()
-        if not entries:
-            return {"total_entries": 0, "avg_score": 0, "max_score": 0, "min_score": 0, "emoji_counts": {},
-                    "top_activities": []}
-        total_entries = len(entries)
-        scores: List[int] = [int(e.mood_score) for e in entries]
-        avg_score = sum(scores) / total_entries
-        max_score = max(scores)
-        min_score = min(scores)
-        emoji_counts = Counter(e.emoji for e in entries if e.emoji)
-        activity_counts: Counter[str] = Counter()
-        for e in entries:
-            if e.activities:
-                for act in e.activities.split(","):
-                    act = act.strip()
-                    if act:
-                        activity_counts[act] += 1
-        top_activities = activity_counts.most_common(5)
-        return {
-            "total_entries": total_entries,
-            "avg_score": avg_score,
-            "max_score": max_score,
-            "min_score": min_score,
-            "emoji_counts": emoji_counts,
-            "top_activities": top_activities
-        }
+    async def create_mood_entry(entry: MoodEntryCreate, user_id: int, upsert: bool = False,
+                                db: DbSession = Depends(get_db)):
+        return await run_db(db, crud.save_mood_entry, user_id, entry, upsert)
+
+    @app.post("/mood-entries/batch")
+    async def create_mood_entries_batch(user_id: int, request: Request, db: DbSession = Depends(get_db)):
+        results: List[Dict[str, Any]] = []
+        entries: List[tuple[int, MoodEntryCreate]] = []
+
+        # Everything is read and validated before the first insert, so an
+        # oversized batch is rejected without leaving earlier chunks behind
+        async for index, item in _batch_items(request):
+            if index >= MAX_BATCH_ITEMS:
+                raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_ITEMS} entries per batch.")
+            try:
+                if isinstance(item, bytes):
+                    entry = MoodEntryCreate.model_validate_json(item)
+                else:
+                    entry = MoodEntryCreate.model_validate(item)
+            except ValidationError as exc:
+                errors = [{"loc": list(e["loc"]), "msg": e["msg"]} for e in exc.errors()]
+                results.append({"index": index, "status": "invalid", "errors": errors})
+                continue
+            entries.append((index, entry))
+
+        for start in range(0, len(entries), BATCH_CHUNK_SIZE):
+            chunk = entries[start:start + BATCH_CHUNK_SIZE]
+            ids: Optional[Sequence[Optional[int]]] = await run_db(db, crud.insert_mood_entries, user_id,
+                                                                  [entry for _, entry in chunk])
+            if ids is None:
+                # The chunk was rolled back; retry its items one by one so only
+                # the conflicting ones are reported
+                ids = [await _insert_one(db, user_id, entry) for _, entry in chunk]
+            for (index, _), entry_id in zip(chunk, ids):
+                if entry_id is None:
+                    results.append({"index": index, "status": "conflict",
+                                    "detail": "An entry for this date already exists."})
+                else:
+                    results.append({"index": index, "status": "created", "id": entry_id})
+
+        results.sort(key=lambda result: result["index"])
+        created = sum(result["status"] == "created" for result in results)
+        return {"created": created, "failed": len(results) - created, "results": results}
+
+    @app.get("/mood-entries/{user_id}", response_model=List[Union[MoodEntryOut, MoodEntrySlim]])
+    async def get_mood_entries(user_id: int, request: Request, response: Response, activity: Optional[str] = None,
+                               limit: Optional[int] = Query(None, ge=1, le=1000), after: Optional[str] = None,
+                               fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+                               db: DbSession = Depends(get_db)):
+        columns = crud.entry_fields(fields)
+        _, not_modified = await _conditional_get(request, response, db, user_id)
+        if not_modified:
+            return not_modified
+        if limit is None and after is not None:
+            limit = DEFAULT_PAGE_SIZE
+        # Without limit or after the whole history is returned, as before pagination existed
+        entries, next_cursor = await run_db(db, crud.list_mood_entries, user_id, activity, limit, after, columns)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+            response.headers["Link"] = f'<{request.url.include_query_params(after=next_cursor)}>; rel="next"'
+        return _json_body(response, _encode_json(entries))
+
+    @app.get("/mood-entries/{user_id}/stream")
+    async def stream_mood_entries(user_id: int, activity: Optional[str] = None):
+        statement = crud.mood_entries_statement(user_id, activity)
+        return StreamingResponse(export.ndjson_chunks(stream_row_batches(SessionLocal, statement)),
+                                 media_type="application/x-ndjson")
+
+    @app.get("/export/{user_id}")
+    async def export_mood_entries(user_id: int, fmt: Literal["csv", "ndjson", "parquet"] = Query("csv", alias="format"),
+                                  start: Optional[date] = Query(None, alias="from"),
+                                  end: Optional[date] = Query(None, alias="to")):
+        if start and end and start > end:
+            raise HTTPException(status_code=400, detail="'from' must not be after 'to'.")
+        if fmt == "parquet" and not export.parquet_available():
+            raise HTTPException(status_code=501, detail="Parquet export is not available on this server.")
+        statement = crud.mood_entries_statement(user_id, start=start, end=end)
+        batches = stream_row_batches(SessionLocal, statement, export.BATCH_SIZE[fmt])
+        return StreamingResponse(export.WRITERS[fmt](batches), media_type=export.MEDIA_TYPES[fmt],
+                                 headers={"Content-Disposition": f'attachment; filename="mood-diary-{user_id}.{fmt}"'})
+
+    @app.get("/mood-entries/{user_id}/search", response_model=List[MoodEntrySearchHit])
+    async def search_mood_entries(user_id: int, request: Request, response: Response,
+                                  q: str = Query(..., min_length=1, max_length=200),
+                                  limit: int = Query(20, ge=1, le=100), offset: int = Query(0, ge=0),
+                                  db: DbSession = Depends(get_db)):
+        _, not_modified = await _conditional_get(request, response, db, user_id)
+        if not_modified:
+            return not_modified
+        return await run_db(db, crud.search_mood_entries, user_id, q, limit, offset)
+
+    @app.get("/mood-entries/{user_id}/{year}/{month}", response_model=List[Union[MoodEntryOut, MoodEntrySlim]])
+    async def get_monthly_entries(user_id: int, year: int, month: int, request: Request, response: Response,
+                                  fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+                                  db: DbSession = Depends(get_db)):
+        columns = crud.entry_fields(fields)
+        version, not_modified = await _conditional_get(request, response, db, user_id)
+        if not_modified:
+            return not_modified
+
+        async def load():
+            entries = await run_db(db, crud.list_monthly_entries, user_id, year, month, columns)
+            return _encode_json(entries).decode()
+
+        if columns not in CACHED_FIELDS:
+            return _json_body(response, await load())
+        return _json_body(response,
+                          await response_cache.get_or_load(_monthly_key(user_id, version, year, month, columns), load))
+
+    @app.get("/mood-series/{user_id}", response_model=List[MoodSeriesPoint])
+    async def get_mood_series(user_id: int, request: Request, response: Response,
+                              start: Optional[date] = Query(None, alias="from"),
+                              end: Optional[date] = Query(None, alias="to"),
+                              bucket: Literal["day", "week", "month"] = "day",
+                              points: Optional[int] = Query(None, ge=3, le=MAX_SERIES_POINTS),
+                              db: DbSession = Depends(get_db)):
+        if start and end and start > end:
+            raise HTTPException(status_code=400, detail="'from' must not be after 'to'.")
+        _, not_modified = await _conditional_get(request, response, db, user_id)
+        if not_modified:
+            return not_modified
+        return await run_db(db, crud.get_mood_series, user_id, start, end, bucket, points)
+
+    @app.get("/stats/{user_id}", response_model=Dict[str, Any])
+    async def get_stats(user_id: int, request: Request, response: Response, db: DbSession = Depends(get_db)):
+        version, not_modified = await _conditional_get(request, response, db, user_id)
+        if not_modified:
+            return not_modified
+        return await response_cache.get_or_load(_stats_key(user_id, version),
+                                                lambda: run_db(db, crud.get_stats, user_id))
+
+    @app.get("/analytics/{user_id}", response_model=Dict[str, Any])
+    async def get_analytics(user_id: int, request: Request, response: Response, db: DbSession = Depends(get_db)):
+        version, not_modified = await _conditional_get(request, response, db, user_id)
+        if not_modified:
+            return not_modified
+        return await response_cache.get_or_load(_analytics_key(user_id, version),
+                                                lambda: run_db(db, analytics.get_analytics, user_id))
+
+    @app.get("/admin/rollups/daily", dependencies=[Depends(require_admin)])
+    async def get_daily_rollups(start: Optional[date] = Query(None, alias="from"),
+                                end: Optional[date] = Query(None, alias="to"), db: DbSession = Depends(get_db)):
+        return await run_db(db, crud.list_daily_rollups, start, end)
+
+    @app.get("/admin/rollups/weekly", dependencies=[Depends(require_admin)])
+    async def get_weekly_rollups(start: Optional[date] = Query(None, alias="from"),
+                                 end: Optional[date] = Query(None, alias="to"), db: DbSession = Depends(get_db)):
+        return await run_db(db, crud.list_weekly_rollups, start, end)
+
+    @app.post("/admin/rollups/run", dependencies=[Depends(require_admin)])
+    async def run_rollup_job(lag: float = Query(DEFAULT_LAG.total_seconds(), ge=0), db: DbSession = Depends(get_db)):
+        processed = await run_db(db, run_rollups, 1000, timedelta(seconds=lag))
+        return {"processed": processed, "state": await run_db(db, crud.get_rollup_state)}
 
 
 def create_app():
     @asynccontextmanager
     async def lifespan(app: FastAPI):
-        Base.metadata.create_all(bind=engine)
+        await create_tables(engine, Base.metadata)
+        password_hasher.start()
+        rollups = asyncio.create_task(_rollup_loop(ROLLUP_INTERVAL)) if ROLLUP_INTERVAL > 0 else None
         yield
+        if rollups:
+            rollups.cancel()
+        password_hasher.shutdown()
+        profiler.flush()
 
     app = FastAPI(title="Mood Diary API", lifespan=lifespan)
+    app.state.metrics = Metrics()
+    app.state.profiler = profiler
+    profiler.authorize = _is_admin
+    # Added first, so it runs inside the instrumentation and its time counts towards the latency
+    app.add_middleware(CompressionMiddleware)
+    app.add_middleware(InstrumentationMiddleware, metrics=app.state.metrics)
+
+    @app.exception_handler(PoolSaturated)
+    async def hashing_pool_saturated(request: Request, exc: PoolSaturated):
+        return JSONResponse(status_code=503, content={"detail": "Server busy, please retry shortly."},
+                            headers={"Retry-After": "1"})
+
     register_routes(app)
     return app
 
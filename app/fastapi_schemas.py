@@ -34,3 +34,29 @@ class MoodEntryOut(BaseModel):
     created_at: datetime  # Include creation timestamp in API output
 
     model_config = ConfigDict(from_attributes=True)
+
+
+class MoodEntrySlim(BaseModel):
+    """Entry list item of ``fields=slim``: what the calendar and charts show"""
+    id: int
+    date: date
+    mood_score: int
+    emoji: Optional[str]
+    created_at: datetime
+
+
+class MoodSeriesPoint(BaseModel):
+    period: date  # First day of the bucket
+    avg_score: float
+    min_score: int
+    max_score: int
+    count: int
+
+
+class MoodEntrySearchHit(BaseModel):
+    id: int
+    date: date
+    mood_score: int
+    emoji: Optional[str]
+    snippet: Optional[str]  # Matched terms wrapped in [ ]
+    rank: float  # Higher is more relevant
@@ -0,0 +1,141 @@
+"""
+Password hashing, run on a bounded process pool.
+
+A bcrypt hash or verify costs 100-300 ms of CPU, so /register and /login hand
+it to a dedicated, size-limited pool instead of the request threadpool. When
+more than PASSWORD_HASH_QUEUE jobs are in flight, new ones are rejected with
+PoolSaturated, which the API turns into a 503 with Retry-After. A pool broken
+by a dying worker is replaced, and the job retried once on the new pool.
+
+Settings (environment):
+    BCRYPT_ROUNDS          bcrypt work factor (default 12; 4 for load tests)
+    PASSWORD_HASH_WORKERS  worker processes (default min(4, CPU count));
+                           0 hashes on the threadpool instead
+    PASSWORD_HASH_QUEUE    max jobs in flight before rejecting (default 32 per worker)
+"""
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from typing import Any, Callable, Optional
+
+from passlib.context import CryptContext
+from starlette.concurrency import run_in_threadpool
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+
+@lru_cache(maxsize=None)
+def _context(rounds: int) -> CryptContext:
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+
+
+pwd_context = _context(BCRYPT_ROUNDS)
+
+
+def hash_password(password: str, rounds: int = BCRYPT_ROUNDS) -> str:
+    return _context(rounds).hash(password)
+
+
+def verify_password(password: str, password_hash: str) -> bool:
+    # The work factor is read from the hash itself
+    return pwd_context.verify(password, password_hash)
+
+
+def _warm_up() -> None:
+    """Runs once per worker so processes are spawned before the first request"""
+    pwd_context.hash("", rounds=4)
+
+
+class PoolSaturated(Exception):
+    """Raised when the hashing pool already has its maximum number of jobs in flight"""
+
+
+class PasswordHasher:
+    def __init__(self, workers: int, max_pending: int, rounds: int = BCRYPT_ROUNDS) -> None:
+        self.workers = workers
+        self.max_pending = max_pending
+        self.rounds = rounds
+        self.in_flight = 0
+        self.rejected = 0
+        self.restarts = 0
+        self._executor: Optional[Executor] = None
+
+    @classmethod
+    def from_env(cls) -> 'PasswordHasher':
+        workers = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+        max_pending = int(os.getenv("PASSWORD_HASH_QUEUE", str(max(workers, 1) * 32)))
+        return cls(workers, max_pending, int(os.getenv("BCRYPT_ROUNDS", str(BCRYPT_ROUNDS))))
+
+    @property
+    def queue_depth(self) -> int:
+        """Jobs waiting for a free worker"""
+        if self.workers <= 0:
+            # Hashing shares the request threadpool; nothing queues in a pool of its own
+            return 0
+        return max(0, self.in_flight - self.workers)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "max_pending": self.max_pending,
+            "rejected": self.rejected,
+            "restarts": self.restarts,
+        }
+
+    def start(self) -> None:
+        if self._executor is None and self.workers > 0:
+            # spawn, not fork: the API process runs threads (uvicorn, anyio)
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+            for _ in range(self.workers):
+                self._executor.submit(_warm_up)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    async def _submit(self, fn: Callable[..., Any], *args: Any) -> Any:
+        self.start()
+        executor = self._executor
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM-killed) and took the pool with it. Jobs
+            # in flight fail together; the first to get here drops the pool,
+            # and the next start() replaces it.
+            if executor is not None and self._executor is executor:
+                self._executor = None
+                self.restarts += 1
+                executor.shutdown(wait=False, cancel_futures=True)
+            raise
+
+    async def _run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        if self.in_flight >= self.max_pending:
+            self.rejected += 1
+            raise PoolSaturated()
+        self.in_flight += 1
+        try:
+            if self.workers <= 0:
+                return await run_in_threadpool(fn, *args)
+            try:
+                return await self._submit(fn, *args)
+            except BrokenProcessPool:
+                try:
+                    return await self._submit(fn, *args)
+                except BrokenProcessPool as exc:
+                    # The new pool broke too; answer 503 and let the client retry
+                    raise PoolSaturated() from exc
+        finally:
+            self.in_flight -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password, self.rounds)
+
+    async def verify(self, password: str, password_hash: str) -> bool:
+        return await self._run(verify_password, password, password_hash)
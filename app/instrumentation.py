@@ -0,0 +1,194 @@
+"""
+Per-request timing and SQL instrumentation.
+
+:class:`InstrumentationMiddleware` wraps the app built by ``create_app``.
+For every request it records:
+
+- latency, as a histogram per (method, route template);
+- the SQL statements run while serving it, with their time. They are
+  counted through engine events on every Engine, so sync, async and
+  streaming sessions are all covered: the per-request counters live in a
+  context variable, which the threadpool and ``AsyncSession.run_sync`` carry
+  over;
+- likely N+1 patterns: the same SELECT run N_PLUS_ONE_THRESHOLD times or
+  more in one request. These are logged and counted.
+
+The totals are served in the Prometheus text format by GET /metrics. Each
+response also gets a ``Server-Timing`` header (``db``, ``app`` and
+``total``, in ms), so the split shows up in the browser's dev tools.
+"""
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from typing import Any, Iterable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "10"))
+# Label of requests that matched no route, so unknown paths cannot grow the label set
+UNMATCHED = "unmatched"
+
+
+class RequestMetrics:
+    """SQL activity of one request; shared by reference with the threads serving it"""
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.statements: Counter[str] = Counter()
+        self._lock = threading.Lock()
+
+    def add_query(self, statement: str, seconds: float) -> None:
+        with self._lock:
+            self.queries += 1
+            self.db_seconds += seconds
+            if statement.lstrip()[:6].upper() == "SELECT":
+                self.statements[statement] += 1
+
+    def repeated_statements(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> list[tuple[str, int]]:
+        return [(statement, n) for statement, n in self.statements.most_common() if n >= threshold]
+
+    def server_timing(self) -> str:
+        total = (time.perf_counter() - self.started) * 1000
+        db = self.db_seconds * 1000
+        return (f'db;dur={db:.1f};desc="{self.queries} queries", app;dur={max(total - db, 0.0):.1f}, '
+                f"total;dur={total:.1f}")
+
+
+current_request: ContextVar[Optional[RequestMetrics]] = ContextVar("current_request", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_request.get() is not None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    metrics = current_request.get()
+    started = conn.info.get("query_started")
+    if metrics is not None and started:
+        metrics.add_query(statement, time.perf_counter() - started.pop())
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Iterable[str], values: Iterable[Any]) -> str:
+    return ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+
+
+class Metrics:
+    """Process-wide request metrics, rendered in the Prometheus text format"""
+
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        # (method, route) -> [bucket counts..., +Inf count], sum of seconds
+        self._latency: dict[tuple[str, str], tuple[list[int], list[float]]] = {}
+        self._requests: Counter[tuple[str, str, int]] = Counter()
+        self._queries: Counter[tuple[str, str]] = Counter()
+        self._query_seconds: defaultdict[tuple[str, str], float] = defaultdict(float)
+        self._n_plus_one: Counter[tuple[str, str]] = Counter()
+
+    def observe(self, method: str, route: str, status: int, seconds: float, request: RequestMetrics) -> None:
+        key = (method, route)
+        repeated = request.repeated_statements()
+        with self._lock:
+            counts, total = self._latency.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[bisect_left(self.buckets, seconds)] += 1
+            total[0] += seconds
+            self._requests[(method, route, status)] += 1
+            self._queries[key] += request.queries
+            self._query_seconds[key] += request.db_seconds
+            if repeated:
+                self._n_plus_one[key] += 1
+        for statement, n in repeated:
+            logger.warning("Possible N+1 in %s %s: statement ran %d times: %s", method, route, n,
+                           " ".join(statement.split())[:200])
+
+    def render(self, samples: Iterable[tuple[str, str, str, float]] = ()) -> str:
+        """The metrics in the Prometheus text format, then unlabelled ``(name, type, help, value)`` samples"""
+        lines: list[str] = []
+        key_labels = ("method", "route")
+        with self._lock:
+            lines += ["# HELP mood_diary_http_request_duration_seconds Request latency.",
+                      "# TYPE mood_diary_http_request_duration_seconds histogram"]
+            for key, (counts, total) in sorted(self._latency.items()):
+                labels = _labels(key_labels, key)
+                cumulative = 0
+                for bound, count in zip((*self.buckets, "+Inf"), counts):
+                    cumulative += count
+                    lines.append(f'mood_diary_http_request_duration_seconds_bucket{{{labels},le="{bound}"}} '
+                                 f"{cumulative}")
+                lines.append(f"mood_diary_http_request_duration_seconds_sum{{{labels}}} {total[0]}")
+                lines.append(f"mood_diary_http_request_duration_seconds_count{{{labels}}} {cumulative}")
+            lines += ["# HELP mood_diary_http_requests_total Requests by status code.",
+                      "# TYPE mood_diary_http_requests_total counter"]
+            lines += [f"mood_diary_http_requests_total{{{_labels((*key_labels, 'status'), key)}}} {n}"
+                      for key, n in sorted(self._requests.items())]
+            counters: tuple[tuple[str, str, dict[tuple[str, str], Any]], ...] = (
+                ("mood_diary_db_queries_total", "SQL statements run while serving requests.", self._queries),
+                ("mood_diary_db_query_duration_seconds_total", "Time spent in SQL statements.", self._query_seconds),
+                ("mood_diary_n_plus_one_total",
+                 f"Requests that repeated one SELECT at least {N_PLUS_ONE_THRESHOLD} times.", self._n_plus_one),
+            )
+            for name, help_text, counter in counters:
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+                lines += [f"{name}{{{_labels(key_labels, key)}}} {value}" for key, value in sorted(counter.items())]
+        for name, kind, help_text, value in samples:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+class InstrumentationMiddleware:
+    """ASGI middleware feeding :class:`Metrics` and adding the Server-Timing header"""
+
+    def __init__(self, app: Any, metrics: Metrics) -> None:
+        self.app = app
+        self.metrics = metrics
+        self._routes: dict[Any, str] = {}
+
+    def _route(self, scope: dict) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return UNMATCHED
+        if endpoint not in self._routes:
+            paths = {route.endpoint: route.path for route in scope["app"].routes if hasattr(route, "endpoint")}
+            self._routes[endpoint] = paths.get(endpoint, UNMATCHED)
+        return self._routes[endpoint]
+
+    async def __call__(self, scope: dict, receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request = RequestMetrics()
+        token = current_request.set(request)
+        status = 500
+
+        async def send_with_timing(message: dict) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = [*message.get("headers", []), (b"server-timing", request.server_timing().encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_request.reset(token)
+            # The router fills in the endpoint on the shared scope
+            self.metrics.observe(scope["method"], self._route(scope), status, time.perf_counter() - request.started,
+                                 request)
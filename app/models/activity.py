@@ -0,0 +1,84 @@
+"""
+Activity model: normalized per-user activity names linked to mood entries
+"""
+from typing import Any, Iterable, Optional
+
+from sqlalchemy import Column, ForeignKey, Index, String, Table, UniqueConstraint, event, insert, select
+from sqlalchemy.orm import Mapped, Session, mapped_column
+from sqlalchemy.orm.attributes import instance_state
+
+from . import Base
+from .mood_entry import MoodEntry, parse_activities
+
+ActivityCache = dict[tuple[int, str], 'Activity']
+
+mood_entry_activities = Table(
+    'mood_entry_activities',
+    Base.metadata,
+    Column('mood_entry_id', ForeignKey('mood_entries.id', ondelete='CASCADE'), primary_key=True),
+    Column('activity_id', ForeignKey('activities.id', ondelete='CASCADE'), primary_key=True),
+    Index('ix_mood_entry_activities_activity_id', 'activity_id'),
+)
+
+
+class Activity(Base):
+    __tablename__ = 'activities'
+    # The unique constraint doubles as the (user_id, name) lookup index
+    __table_args__ = (UniqueConstraint('user_id', 'name', name='uq_activities_user_id_name'),)
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey('users.id'), nullable=False)
+    name: Mapped[str] = mapped_column(String(255), nullable=False)
+
+    @classmethod
+    def resolve(cls, db: Session, user_id: int, names: Iterable[str],
+                cache: Optional[ActivityCache] = None) -> list['Activity']:
+        """Return the user's Activity rows for names, adding any that do not exist yet"""
+        cache = {} if cache is None else cache
+        names = list(dict.fromkeys(names))
+        missing = [name for name in names if (user_id, name) not in cache]
+        if missing:
+            existing = db.scalars(select(cls).where(cls.user_id == user_id, cls.name.in_(missing)))
+            for activity in existing:
+                cache[(user_id, activity.name)] = activity
+            for name in missing:
+                if (user_id, name) not in cache:
+                    activity = cls(user_id=user_id, name=name)
+                    db.add(activity)
+                    cache[(user_id, name)] = activity
+        return [cache[(user_id, name)] for name in names]
+
+    def __repr__(self) -> str:
+        return f'<Activity {self.name}>'
+
+
+def link_activities(db: Session, entries: Iterable[tuple[int, int, Optional[str]]],
+                    cache: Optional[ActivityCache] = None) -> int:
+    """Bulk-create association rows for already persisted (entry_id, user_id, activities) tuples.
+
+    Used by paths that insert mood entries without the ORM unit of work, where
+    the before_flush listener below does not run. Returns the number of links.
+    """
+    cache = {} if cache is None else cache
+    pending = [(entry_id, Activity.resolve(db, user_id, parse_activities(activities), cache))
+               for entry_id, user_id, activities in entries]
+    db.flush()
+    links = [{"mood_entry_id": entry_id, "activity_id": activity.id}
+             for entry_id, activities in pending for activity in activities]
+    if links:
+        db.execute(insert(mood_entry_activities), links)
+    return len(links)
+
+
+@event.listens_for(Session, 'before_flush')
+def _sync_linked_activities(session: Session, flush_context: Any, instances: Any) -> None:
+    """Keep MoodEntry.linked_activities in step with the activities string"""
+    cache: ActivityCache = {}
+    changed = [obj for obj in session.new if isinstance(obj, MoodEntry)]
+    changed += [obj for obj in session.dirty
+                if isinstance(obj, MoodEntry) and (instance_state(obj).attrs.activities.history.has_changes()
+                                                   or instance_state(obj).attrs.user_id.history.has_changes())]
+    for obj in changed:
+        if obj.user_id is None:
+            continue
+        obj.linked_activities = Activity.resolve(session, obj.user_id, parse_activities(obj.activities), cache)
@@ -0,0 +1,25 @@
+"""
+ImportedBatch model: batches written by app/tools/import_diary.py, recorded in
+the same transaction as their rows
+"""
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from . import Base
+
+
+class ImportedBatch(Base):
+    __tablename__ = 'imported_batches'
+
+    # Identifies one import run (see Checkpoint.import_id); --restart starts a new one
+    import_id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    batch: Mapped[int] = mapped_column(primary_key=True)
+    imported: Mapped[int] = mapped_column(default=0, nullable=False)
+    invalid: Mapped[int] = mapped_column(default=0, nullable=False)
+    created_at: Mapped[Optional[datetime]] = mapped_column(default=lambda: datetime.now(timezone.utc))
+
+    def __repr__(self) -> str:
+        return f'<ImportedBatch {self.import_id}:{self.batch}>'
@@ -1,26 +1,47 @@
 """
 MoodEntry model for storing user's daily mood and notes
 """
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Date
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Date, Index
+from sqlalchemy.orm import relationship, column_property, deferred
 from datetime import datetime, timezone
 from . import Base
 
+# One entry per user and day. Databases created before it existed get it from
+# `app.tools.migrate dedupe_daily_entries`, once duplicate days are merged.
+UNIQUE_DAILY_ENTRY_INDEX = "uq_mood_entries_user_id_date"
+
+
+def parse_activities(activities):
+    """Split a comma-separated activities string into unique, stripped, non-empty names"""
+    if not activities:
+        return []
+    return list(dict.fromkeys(act.strip() for act in activities.split(",") if act.strip()))
+
 
 class MoodEntry(Base):
     __tablename__ = 'mood_entries'
+    # Serves the per-user date range scans and ORDER BY date of the list endpoints,
+    # and the (user_id, date) point lookups of upserts
+    # The second lets the rollup job (app/tools/rollup.py) seek straight to new rows
+    __table_args__ = (Index(UNIQUE_DAILY_ENTRY_INDEX, 'user_id', 'date', unique=True),
+                      Index('ix_mood_entries_created_at_id', 'created_at', 'id'))
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    # Columns feeding the per-user stats aggregate keep their previous value on
+    # assignment so the aggregate can subtract it (see user_stats.py).
+    user_id = column_property(Column(Integer, ForeignKey('users.id'), nullable=False), active_history=True)
     date = Column(Date, default=lambda: datetime.now(timezone.utc).date(), nullable=False)
-    mood_score = Column(Integer, nullable=False)  # 1-10 scale
-    emoji = Column(String(10), nullable=True)  # Emoji representation
-    notes = Column(Text, nullable=True)
-    activities = Column(String(255), nullable=True)  # Comma-separated activities
+    mood_score = column_property(Column(Integer, nullable=False), active_history=True)  # 1-10 scale
+    emoji = column_property(Column(String(10), nullable=True), active_history=True)  # Emoji representation
+    # Unbounded free text that most reads never show; loaded on first access
+    notes = deferred(Column(Text, nullable=True))
+    activities = column_property(Column(String(255), nullable=True), active_history=True)  # Comma-separated activities
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
     updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc),
                         onupdate=lambda: datetime.now(timezone.utc))
 
     user = relationship('User', back_populates='mood_entries')
+    # Normalized copy of `activities`, synced on flush (see activity.py)
+    linked_activities = relationship('Activity', secondary='mood_entry_activities')
 
     def __init__(self, user_id, date, mood_score, emoji=None, notes=None, activities=None):
         """Initialize a new mood entry"""
@@ -44,7 +65,7 @@ class MoodEntry(Base):
         self.updated_at = datetime.now(timezone.utc)
 
     @classmethod
-    def get_monthly_entries(cls, user_id, year, month):
+    def get_monthly_entries(cls, db, user_id, year, month):
         """Get all entries for a specific month"""
         start_date = datetime(year, month, 1, tzinfo=timezone.utc).date()
         if month == 12:
@@ -52,16 +73,16 @@ class MoodEntry(Base):
         else:
             end_date = datetime(year, month + 1, 1, tzinfo=timezone.utc).date()
 
-        return cls.query.filter(
+        return db.query(cls).filter(
             cls.user_id == user_id,
             cls.date >= start_date,
             cls.date < end_date
         ).order_by(cls.date.asc()).all()
 
     @classmethod
-    def get_entry_by_date(cls, user_id, date):
-        """Get a mood entry for a specific date"""
-        return cls.query.filter_by(user_id=user_id, date=date).first()
+    def get_entry_by_date(cls, db, user_id, date):
+        """Get the mood entry for a specific date (the latest one if a legacy day has several)"""
+        return db.query(cls).filter_by(user_id=user_id, date=date).order_by(cls.id.desc()).first()
 
     def __repr__(self):
         """String representation of MoodEntry"""
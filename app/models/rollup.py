@@ -0,0 +1,87 @@
+"""
+Population-level rollups of mood entries across all users, maintained
+incrementally by app/tools/rollup.py
+"""
+from collections import Counter
+from datetime import date, datetime
+from typing import Any, Optional
+
+from sqlalchemy import JSON, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from . import Base
+
+TOP_ACTIVITIES = 10
+
+
+def _merge(counts: Optional[dict[str, int]], delta: Counter[str]) -> dict[str, int]:
+    """Return a copy of a histogram with delta added"""
+    merged = Counter(counts or {})
+    merged.update(delta)
+    return dict(merged)
+
+
+class DailyMoodRollup(Base):
+    __tablename__ = 'daily_mood_rollups'
+
+    day: Mapped[date] = mapped_column(primary_key=True)
+    # Sums rather than averages, so new rows are added without rereading old ones
+    entry_count: Mapped[int] = mapped_column(default=0, nullable=False)
+    score_sum: Mapped[int] = mapped_column(default=0, nullable=False)
+
+    def add(self, entry_count: int, score_sum: int) -> None:
+        self.entry_count = (self.entry_count or 0) + entry_count
+        self.score_sum = (self.score_sum or 0) + score_sum
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "day": self.day.isoformat(),
+            "entry_count": self.entry_count,
+            "avg_score": round(self.score_sum / self.entry_count, 3) if self.entry_count else None,
+        }
+
+
+class WeeklyMoodRollup(Base):
+    __tablename__ = 'weekly_mood_rollups'
+
+    week_start: Mapped[date] = mapped_column(primary_key=True)  # Monday
+    entry_count: Mapped[int] = mapped_column(default=0, nullable=False)
+    score_sum: Mapped[int] = mapped_column(default=0, nullable=False)
+    emoji_counts: Mapped[dict[str, int]] = mapped_column(JSON, default=dict, nullable=False)
+    activity_counts: Mapped[dict[str, int]] = mapped_column(JSON, default=dict, nullable=False)
+
+    def add(self, entry_count: int, score_sum: int, emoji_counts: Counter[str],
+            activity_counts: Counter[str]) -> None:
+        self.entry_count = (self.entry_count or 0) + entry_count
+        self.score_sum = (self.score_sum or 0) + score_sum
+        self.emoji_counts = _merge(self.emoji_counts, emoji_counts)
+        self.activity_counts = _merge(self.activity_counts, activity_counts)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "week_start": self.week_start.isoformat(),
+            "entry_count": self.entry_count,
+            "avg_score": round(self.score_sum / self.entry_count, 3) if self.entry_count else None,
+            "emoji_counts": dict(Counter(self.emoji_counts).most_common()),
+            "top_activities": Counter(self.activity_counts).most_common(TOP_ACTIVITIES),
+        }
+
+
+class RollupState(Base):
+    """High-water mark of the mood entries already folded into the rollups"""
+    __tablename__ = 'rollup_state'
+
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)
+    # (created_at, id) of the last processed entry; the id breaks created_at ties
+    last_created_at: Mapped[Optional[datetime]]
+    last_id: Mapped[int] = mapped_column(default=0, nullable=False)
+    rows_processed: Mapped[int] = mapped_column(default=0, nullable=False)
+    updated_at: Mapped[Optional[datetime]]
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "last_created_at": self.last_created_at.isoformat() if self.last_created_at else None,
+            "last_id": self.last_id,
+            "rows_processed": self.rows_processed,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+        }
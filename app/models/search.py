@@ -0,0 +1,104 @@
+"""
+Full-text index over MoodEntry.notes, maintained by the database itself
+
+SQLite: an FTS5 table using mood_entries as external content, kept in sync by
+triggers, so ORM writes, MoodEntry.update and bulk Core inserts are all
+covered. user_id is indexed next to the notes, so a query only walks one
+user's matches instead of filtering every user's matches afterwards.
+
+PostgreSQL: a GIN expression index on to_tsvector(notes).
+
+Other databases, and SQLite builds without FTS5, get no index and search
+falls back to LIKE.
+"""
+import re
+from typing import Any
+
+from sqlalchemy import Column, Integer, MetaData, Table, Text, event
+from sqlalchemy.engine import Connection
+
+from .mood_entry import MoodEntry
+
+FTS_TABLE = 'mood_entries_fts'
+TS_CONFIG = 'english'
+# Must match the indexed expression exactly for PostgreSQL to use the index
+TS_VECTOR_SQL = f"to_tsvector('{TS_CONFIG}', coalesce(notes, ''))"
+
+# Not part of Base.metadata: created by the DDL below, never by create_all
+mood_entries_fts = Table(FTS_TABLE, MetaData(), Column('rowid', Integer), Column('notes', Text),
+                         Column('user_id', Integer))
+
+_SQLITE_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(notes, user_id, content='mood_entries', "
+    "content_rowid='id')",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON mood_entries BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, notes, user_id) VALUES (new.id, new.notes, new.user_id);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON mood_entries BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, notes, user_id) VALUES ('delete', old.id, old.notes, old.user_id);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF notes, user_id ON mood_entries BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, notes, user_id) VALUES ('delete', old.id, old.notes, old.user_id);
+        INSERT INTO {FTS_TABLE}(rowid, notes, user_id) VALUES (new.id, new.notes, new.user_id);
+    END""",
+]
+_POSTGRES_DDL = [
+    f"CREATE INDEX IF NOT EXISTS ix_mood_entries_notes_fts ON mood_entries USING GIN ({TS_VECTOR_SQL})",
+]
+
+
+def _fts5_available(connection: Connection) -> bool:
+    options = connection.exec_driver_sql("PRAGMA compile_options").scalars().all()
+    return "ENABLE_FTS5" in options
+
+
+def install_search_index(connection: Connection, rebuild: bool = False) -> bool:
+    """Create the index for the connection's dialect if missing; False if the database has none.
+
+    ``rebuild`` re-reads every note into the SQLite index, for databases whose
+    entries predate it.
+    """
+    dialect = connection.dialect.name
+    if dialect == "sqlite" and _fts5_available(connection):
+        for statement in _SQLITE_DDL:
+            connection.exec_driver_sql(statement)
+        if rebuild:
+            connection.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        return True
+    if dialect == "postgresql":
+        for statement in _POSTGRES_DDL:
+            connection.exec_driver_sql(statement)
+        return True
+    return False
+
+
+def has_search_index(connection: Connection) -> bool:
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        return connection.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (FTS_TABLE,)
+        ).first() is not None
+    return dialect == "postgresql"
+
+
+def search_terms(query: str) -> list[str]:
+    """Words of a user query; punctuation never reaches the FTS query syntax"""
+    return re.findall(r"\w+", query)
+
+
+def fts5_query(user_id: int, terms: list[str]) -> str:
+    """The user's notes containing all terms; the last one also as a prefix, for search-as-you-type"""
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return f'user_id : "{int(user_id)}" AND notes : ({" ".join(quoted)})'
+
+
+@event.listens_for(MoodEntry.__table__, "after_create")
+def _create_search_index(target: Any, connection: Connection, **kw: Any) -> None:
+    install_search_index(connection)
+
+
+@event.listens_for(MoodEntry.__table__, "before_drop")
+def _drop_search_index(target: Any, connection: Connection, **kw: Any) -> None:
+    if connection.dialect.name == "sqlite":
+        connection.exec_driver_sql(f"DROP TABLE IF EXISTS {FTS_TABLE}")
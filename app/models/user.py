@@ -4,14 +4,14 @@ User model for authentication and user management
 from datetime import datetime
 from typing import Optional
 
-from passlib.context import CryptContext
 from sqlalchemy import String, DateTime
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
+from ..hashing import hash_password, verify_password
 from . import Base
+from .activity import Activity
 from .mood_entry import MoodEntry
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from .user_stats import UserStats
 
 
 class User(Base):
@@ -25,12 +25,14 @@ class User(Base):
     last_login: Mapped[Optional[datetime]] = mapped_column(DateTime)
 
     mood_entries: Mapped[list["MoodEntry"]] = relationship(back_populates='user', cascade='all, delete-orphan')
+    stats: Mapped[Optional["UserStats"]] = relationship(cascade='all, delete-orphan')
+    activities: Mapped[list["Activity"]] = relationship(cascade='all, delete-orphan')
 
     def set_password(self, password: str) -> None:
-        self.password_hash = pwd_context.hash(password)
+        self.password_hash = hash_password(password)
 
     def check_password(self, password: str) -> bool:
-        return pwd_context.verify(password, self.password_hash)
+        return verify_password(password, self.password_hash)
 
     def __repr__(self) -> str:
         return f'<User {self.username}>'
@@ -0,0 +1,222 @@
+"""
+UserStats model: per-user mood aggregate kept up to date on every MoodEntry write
+"""
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Optional, Sequence
+
+from sqlalchemy import JSON, ForeignKey, event, func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Mapped, Session, mapped_column
+from sqlalchemy.orm.attributes import History, instance_state
+
+from . import Base
+from .activity import Activity, mood_entry_activities
+from .mood_entry import MoodEntry, parse_activities
+
+TOP_ACTIVITIES = 5
+
+# MoodEntry columns that contribute to the aggregate
+_TRACKED = ('user_id', 'mood_score', 'emoji', 'activities')
+_AGGREGATE_FIELDS = ('entry_count', 'score_sum', 'min_score', 'max_score',
+                     'score_counts', 'emoji_counts', 'activity_counts')
+
+
+def _bump(counts: Optional[dict[str, int]], keys: list[str], sign: int) -> dict[str, int]:
+    """Return a copy of a histogram with each key moved by sign, dropping zero buckets"""
+    counts = dict(counts or {})
+    for key in keys:
+        value = counts.get(key, 0) + sign
+        if value > 0:
+            counts[key] = value
+        else:
+            counts.pop(key, None)
+    return counts
+
+
+class UserStats(Base):
+    __tablename__ = 'user_stats'
+
+    user_id: Mapped[int] = mapped_column(ForeignKey('users.id'), primary_key=True)
+    entry_count: Mapped[int] = mapped_column(default=0, nullable=False)
+    score_sum: Mapped[int] = mapped_column(default=0, nullable=False)
+    min_score: Mapped[Optional[int]]
+    max_score: Mapped[Optional[int]]
+    # Histograms are stored as JSON objects; score keys are stringified 1-10 so
+    # min/max stay correct when an entry's score is edited or removed.
+    score_counts: Mapped[dict[str, int]] = mapped_column(JSON, default=dict, nullable=False)
+    emoji_counts: Mapped[dict[str, int]] = mapped_column(JSON, default=dict, nullable=False)
+    activity_counts: Mapped[dict[str, int]] = mapped_column(JSON, default=dict, nullable=False)
+    # Bumped whenever the user's entries change; the API derives ETag and
+    # Last-Modified from these without touching mood_entries.
+    version: Mapped[int] = mapped_column(default=0, server_default='0', nullable=False)
+    updated_at: Mapped[Optional[datetime]]
+
+    def __init__(self, user_id: int) -> None:
+        self.user_id = user_id
+        self.entry_count = 0
+        self.score_sum = 0
+        self.min_score = None
+        self.max_score = None
+        self.score_counts = {}
+        self.emoji_counts = {}
+        self.activity_counts = {}
+        self.version = 0
+        self.updated_at = None
+
+    def touch(self) -> None:
+        """Record that the user's entries changed"""
+        self.version = (self.version or 0) + 1
+        self.updated_at = datetime.now(timezone.utc)
+
+    def apply(self, mood_score: int, emoji: Optional[str], activities: Optional[str], sign: int = 1) -> None:
+        """Add (sign=1) or remove (sign=-1) a single entry's contribution"""
+        self.entry_count += sign
+        self.score_sum += sign * int(mood_score)
+        self.score_counts = _bump(self.score_counts, [str(int(mood_score))], sign)
+        if emoji:
+            self.emoji_counts = _bump(self.emoji_counts, [emoji], sign)
+        acts = parse_activities(activities)
+        if acts:
+            self.activity_counts = _bump(self.activity_counts, acts, sign)
+        self._refresh_bounds()
+
+    def _refresh_bounds(self) -> None:
+        scores = [int(score) for score in self.score_counts]
+        self.min_score = min(scores) if scores else None
+        self.max_score = max(scores) if scores else None
+
+    def matches(self, other: 'UserStats') -> bool:
+        """Compare aggregate values (histogram ordering is ignored)"""
+        return all(getattr(self, field) == getattr(other, field) for field in _AGGREGATE_FIELDS)
+
+    def copy_from(self, other: 'UserStats') -> None:
+        for field in _AGGREGATE_FIELDS:
+            setattr(self, field, getattr(other, field))
+
+    def to_dict(self) -> dict[str, Any]:
+        """Render in the /stats/{user_id} response shape"""
+        if not self.entry_count:
+            return {"total_entries": 0, "avg_score": 0, "max_score": 0, "min_score": 0, "emoji_counts": {},
+                    "top_activities": []}
+        return {
+            "total_entries": self.entry_count,
+            "avg_score": self.score_sum / self.entry_count,
+            "max_score": self.max_score,
+            "min_score": self.min_score,
+            "emoji_counts": dict(self.emoji_counts),
+            "top_activities": Counter(self.activity_counts).most_common(TOP_ACTIVITIES)
+        }
+
+    @classmethod
+    def compute(cls, db: Session, user_id: int) -> 'UserStats':
+        """Build a transient aggregate from the user's persisted mood entries.
+
+        Aggregation happens in SQL with two GROUP BY queries (score x emoji and
+        the normalized activity links), so neither MoodEntry objects nor the
+        notes column are loaded. Groups are ordered by their first entry id,
+        which keeps histogram ordering identical to a row-by-row pass.
+        """
+        first_seen = func.min(MoodEntry.id)
+        score_emoji_rows = db.execute(
+            select(MoodEntry.mood_score, MoodEntry.emoji, func.count())
+            .where(MoodEntry.user_id == user_id)
+            .group_by(MoodEntry.mood_score, MoodEntry.emoji)
+            .order_by(first_seen)
+        )
+        score_counts: Counter[str] = Counter()
+        emoji_counts: Counter[str] = Counter()
+        stats = cls(user_id)
+        for mood_score, emoji, count in score_emoji_rows:
+            stats.entry_count += count
+            stats.score_sum += int(mood_score) * count
+            score_counts[str(int(mood_score))] += count
+            if emoji:
+                emoji_counts[emoji] += count
+
+        links = mood_entry_activities.c
+        activity_rows = db.execute(
+            select(Activity.name, func.count())
+            .join(mood_entry_activities, links.activity_id == Activity.id)
+            .where(Activity.user_id == user_id)
+            .group_by(Activity.id, Activity.name)
+            .order_by(func.min(links.mood_entry_id), Activity.id)
+        )
+        activity_counts = {name: count for name, count in activity_rows}
+
+        stats.score_counts = dict(score_counts)
+        stats.emoji_counts = dict(emoji_counts)
+        stats.activity_counts = activity_counts
+        stats._refresh_bounds()
+        return stats
+
+    def __repr__(self) -> str:
+        return f'<UserStats {self.user_id} entries:{self.entry_count}>'
+
+
+def create_missing_stats(db: Session, user_ids: Sequence[int]) -> set[int]:
+    """Add empty user_stats rows for users without one and return those users.
+
+    INSERT ... ON CONFLICT DO NOTHING, so concurrent writers creating the
+    same row wait for each other instead of failing on the primary key. The
+    rows are written with Core inserts, so this also works inside a flush.
+    """
+    dialect = db.get_bind().dialect.name
+    if not user_ids:
+        return set()
+    if dialect not in ("postgresql", "sqlite"):
+        # Other databases fall back to a check that concurrent writers can race
+        existing = set(db.scalars(select(UserStats.user_id).where(UserStats.user_id.in_(user_ids))))
+        user_ids = [user_id for user_id in user_ids if user_id not in existing]
+    rows = [{"user_id": user_id, "entry_count": 0, "score_sum": 0, "score_counts": {}, "emoji_counts": {},
+             "activity_counts": {}, "version": 0} for user_id in user_ids]
+    if dialect not in ("postgresql", "sqlite"):
+        if rows:
+            db.execute(insert(UserStats), rows)
+        return set(user_ids)
+    statement = postgresql.insert(UserStats) if dialect == "postgresql" else sqlite.insert(UserStats)
+    statement = statement.values(rows).on_conflict_do_nothing(index_elements=[UserStats.user_id])
+    return set(db.scalars(statement.returning(UserStats.user_id)))
+
+
+def _previous(entry: MoodEntry, key: str) -> Any:
+    history: History = instance_state(entry).attrs[key].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(entry, key)
+
+
+@event.listens_for(Session, 'before_flush')
+def _maintain_user_stats(session: Session, flush_context: Any, instances: Any) -> None:
+    """Fold pending MoodEntry inserts, updates and deletes into UserStats rows"""
+    changes: dict[int, list[tuple[int, Any, Any, Any]]] = {}
+
+    def record(sign: int, values: tuple[Any, ...]) -> None:
+        user_id, mood_score, emoji, activities = values
+        if user_id is not None and mood_score is not None:
+            changes.setdefault(user_id, []).append((sign, mood_score, emoji, activities))
+
+    for obj in session.new:
+        if isinstance(obj, MoodEntry):
+            record(1, tuple(getattr(obj, key) for key in _TRACKED))
+    for obj in session.dirty:
+        if isinstance(obj, MoodEntry) and session.is_modified(obj):
+            old = tuple(_previous(obj, key) for key in _TRACKED)
+            new = tuple(getattr(obj, key) for key in _TRACKED)
+            if old != new:
+                record(-1, old)
+                record(1, new)
+    for obj in session.deleted:
+        if isinstance(obj, MoodEntry):
+            record(-1, tuple(_previous(obj, key) for key in _TRACKED))
+
+    created = create_missing_stats(session, sorted(changes))
+    for user_id in sorted(changes):
+        stats = session.get_one(UserStats, user_id, with_for_update=True)
+        if user_id in created:
+            # First write since the aggregate was introduced: seed it from the
+            # rows already in the database, which exclude this flush's changes.
+            stats.copy_from(UserStats.compute(session, user_id))
+        for sign, mood_score, emoji, activities in changes[user_id]:
+            stats.apply(mood_score, emoji, activities, sign)
+        stats.touch()
@@ -0,0 +1,223 @@
+"""
+Opt-in sampling profiler for the API routes.
+
+Routes registered by ``register_routes`` use :class:`ProfiledRoute`. A
+request is profiled when its route is listed in PROFILE_ROUTES (path
+templates such as ``/stats/{user_id}``, optionally prefixed with the method,
+or ``*`` for all), for a PROFILE_REQUEST_RATE fraction of those requests. An
+admin can also profile a single request by sending ``X-Profile: 1`` with a
+valid ``X-Admin-Token``.
+
+While profiled requests are in flight, a daemon thread takes a snapshot of
+every thread's stack each PROFILE_INTERVAL_MS. Samples are attributed by code
+identity, not by thread. Each route runs its profiled requests through its
+own copy of a small wrapper function, and ``run_db`` runs database work
+through it too. A stack that contains a route's wrapper therefore belongs to
+that route, on the event loop or in the threadpool alike. Unprofiled
+requests never pass through a wrapper and are not sampled.
+
+Stacks are aggregated per route and rewritten to PROFILE_DIR every
+PROFILE_FLUSH_SECONDS and at shutdown, as collapsed stacks
+(``<route>.collapsed``, for flamegraph.pl or speedscope) or, with
+PROFILE_FORMAT=speedscope, as speedscope JSON.
+"""
+import contextvars
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import types
+from collections import Counter
+from typing import Any, Callable, Optional, TypeVar
+
+from fastapi import Request
+from fastapi.routing import APIRoute
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("collapsed", "speedscope")
+T = TypeVar("T")
+
+# Wrapper of the route whose profiled request is being served, for run_db
+_current_wrapper: contextvars.ContextVar[Optional[Callable[..., Any]]] = contextvars.ContextVar(
+    "profiled_route_wrapper", default=None)
+
+
+def _call(fn: Callable[..., T], *args: Any) -> T:
+    # Copied once per route under a distinct name; see Profiler.wrapper_for
+    return fn(*args)
+
+
+async def _await(fn: Callable[..., Any], *args: Any) -> Any:
+    return await fn(*args)
+
+
+def _renamed(fn: Any, name: str) -> Any:
+    """A copy of ``fn`` whose code object is unique to ``name``"""
+    code = fn.__code__.replace(co_name=name, co_qualname=name)
+    return types.FunctionType(code, fn.__globals__, name, fn.__defaults__, fn.__closure__)
+
+
+def in_profiled_route(fn: Callable[..., T]) -> Callable[..., T]:
+    """``fn`` wrapped so the profiler attributes its samples to the request being profiled, if any"""
+    wrapper = _current_wrapper.get()
+    if wrapper is None:
+        return fn
+    return lambda *args: wrapper(fn, *args)
+
+
+class Profiler:
+    def __init__(self, routes: str = "", request_rate: float = 1.0, interval: float = 0.01,
+                 directory: str = "profiles", fmt: str = "collapsed", flush_seconds: float = 60) -> None:
+        if fmt not in FORMATS:
+            raise ValueError(f"PROFILE_FORMAT must be one of {', '.join(FORMATS)}")
+        self.routes = {route.strip() for route in routes.split(",") if route.strip()}
+        self.request_rate = request_rate
+        self.interval = interval
+        self.directory = directory
+        self.format = fmt
+        self.flush_seconds = flush_seconds
+        # Returns True for a valid admin token; set by the app
+        self.authorize: Callable[[Optional[str]], bool] = lambda token: False
+        self.samples: dict[str, Counter[tuple[types.CodeType, ...]]] = {}
+        self._codes: dict[types.CodeType, str] = {}
+        self._wrappers: dict[str, tuple[Callable[..., Any], Callable[..., Any]]] = {}
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._flushed = time.monotonic()
+
+    @classmethod
+    def from_env(cls) -> 'Profiler':
+        return cls(os.getenv("PROFILE_ROUTES", ""), float(os.getenv("PROFILE_REQUEST_RATE", "1.0")),
+                   float(os.getenv("PROFILE_INTERVAL_MS", "10")) / 1000, os.getenv("PROFILE_DIR", "profiles"),
+                   os.getenv("PROFILE_FORMAT", "collapsed"), float(os.getenv("PROFILE_FLUSH_SECONDS", "60")))
+
+    def wrappers_for(self, route: str) -> tuple[Callable[..., Any], Callable[..., Any]]:
+        """(async, sync) wrappers with code objects unique to ``route``"""
+        if route not in self._wrappers:
+            name = f"[{route}]"
+            wrappers = (_renamed(_await, name), _renamed(_call, name))
+            for wrapper in wrappers:
+                self._codes[wrapper.__code__] = route
+            self._wrappers[route] = wrappers
+        return self._wrappers[route]
+
+    def wants(self, request: Request, method: str, path: str) -> bool:
+        if request.headers.get("x-profile") == "1" and self.authorize(request.headers.get("x-admin-token")):
+            return True
+        if not self.routes or not ({"*", path, f"{method} {path}"} & self.routes):
+            return False
+        return self.request_rate >= 1 or random.random() < self.request_rate
+
+    async def profile(self, route: str, handler: Callable[..., Any], *args: Any) -> Any:
+        run_async, run_sync = self.wrappers_for(route)
+        token = _current_wrapper.set(run_sync)
+        self._started()
+        try:
+            return await run_async(handler, *args)
+        finally:
+            self._finished()
+            _current_wrapper.reset(token)
+
+    def _started(self) -> None:
+        with self._lock:
+            self._in_flight += 1
+            self._wake.set()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._sample_forever, name="route-profiler", daemon=True)
+                self._thread.start()
+
+    def _finished(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            if not self._in_flight:
+                self._wake.clear()
+
+    def _sample_forever(self) -> None:
+        own = threading.get_ident()
+        while True:
+            self._wake.wait()
+            time.sleep(self.interval)
+            self.sample(exclude=own)
+            if time.monotonic() - self._flushed >= self.flush_seconds:
+                self.flush()
+
+    def sample(self, exclude: Optional[int] = None) -> None:
+        """Record the stacks of all threads running a profiled route, cut at the route's wrapper"""
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == exclude:
+                continue
+            stack: list[types.CodeType] = []
+            current: Optional[types.FrameType] = frame
+            while current is not None:
+                code = current.f_code
+                stack.append(code)
+                if code in self._codes:
+                    with self._lock:
+                        self.samples.setdefault(self._codes[code], Counter())[tuple(reversed(stack))] += 1
+                    break
+                current = current.f_back
+
+    def flush(self) -> None:
+        """Rewrite the profile file of every sampled route"""
+        self._flushed = time.monotonic()
+        with self._lock:
+            samples = {route: Counter(stacks) for route, stacks in self.samples.items()}
+        if not samples:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        for route, stacks in samples.items():
+            name = re.sub(r"[^A-Za-z0-9_.-]+", "_", route).strip("_")
+            path = os.path.join(self.directory, f"{name}.{'json' if self.format == 'speedscope' else 'collapsed'}")
+            content = self._speedscope(route, stacks) if self.format == "speedscope" else self._collapsed(stacks)
+            with open(f"{path}.tmp", "w", encoding="utf-8") as file:
+                file.write(content)
+            os.replace(f"{path}.tmp", path)
+        logger.info("Wrote profiles of %d routes to %s", len(samples), self.directory)
+
+    @staticmethod
+    def _frame_name(code: types.CodeType) -> str:
+        return f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def _collapsed(self, stacks: Counter[tuple[types.CodeType, ...]]) -> str:
+        return "".join(f"{';'.join(self._frame_name(code) for code in stack)} {count}\n"
+                       for stack, count in stacks.most_common())
+
+    def _speedscope(self, route: str, stacks: Counter[tuple[types.CodeType, ...]]) -> str:
+        frames: dict[types.CodeType, int] = {}
+        for stack in stacks:
+            for code in stack:
+                frames.setdefault(code, len(frames))
+        weights = [count * self.interval for count in stacks.values()]
+        return json.dumps({
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": route,
+            "exporter": "mood-diary",
+            "shared": {"frames": [{"name": code.co_qualname, "file": code.co_filename, "line": code.co_firstlineno}
+                                  for code in frames]},
+            "profiles": [{"type": "sampled", "name": route, "unit": "seconds", "startValue": 0,
+                          "endValue": sum(weights), "samples": [[frames[code] for code in stack] for stack in stacks],
+                          "weights": weights}],
+        })
+
+
+class ProfiledRoute(APIRoute):
+    """APIRoute whose requests go through the app's profiler when it wants them"""
+
+    def get_route_handler(self) -> Callable[[Request], Any]:
+        handler = super().get_route_handler()
+        methods = sorted(self.methods or ())
+
+        async def route_handler(request: Request) -> Any:
+            profiler: Optional[Profiler] = getattr(request.app.state, "profiler", None)
+            if profiler is None or not profiler.wants(request, request.method, self.path):
+                return await handler(request)
+            return await profiler.profile(f"{','.join(methods)} {self.path}", handler, request)
+
+        return route_handler
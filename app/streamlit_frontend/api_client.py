@@ -0,0 +1,78 @@
+# api_client.py — HTTP client shared by all Streamlit pages
+
+"""
+One requests.Session for the whole frontend, so calls reuse keep-alive
+connections instead of opening a TCP connection each. It advertises every
+content coding urllib3 can decode here (gzip, and br with brotli
+installed), so large entry lists come back compressed.
+
+Settings (environment):
+    API_URL              backend base URL (default http://localhost:8000)
+    API_CONNECT_TIMEOUT  seconds to establish a connection (default 3.05)
+    API_READ_TIMEOUT     seconds to wait for a response (default 10)
+    API_RETRIES          retries for GET requests and failed connects (default 3)
+"""
+import logging
+import os
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+API_URL = os.getenv("API_URL", "http://localhost:8000")
+
+
+class ApiClient:
+    def __init__(self, base_url=API_URL, connect_timeout=None, read_timeout=None, retries=None,
+                 backoff_factor=0.3, pool_maxsize=10):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (
+            float(connect_timeout or os.getenv("API_CONNECT_TIMEOUT", "3.05")),
+            float(read_timeout or os.getenv("API_READ_TIMEOUT", "10")),
+        )
+        retries = int(retries if retries is not None else os.getenv("API_RETRIES", "3"))
+        # Reads and status retries are limited to idempotent methods, so a
+        # POST is only re-sent when its connection was never established.
+        # 503 covers the backend's hashing-pool backpressure (Retry-After).
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({"GET", "HEAD", "OPTIONS"}),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, max_retries=retry)
+        self.session = requests.Session()
+        self.session.headers["Accept-Encoding"] = ACCEPT_ENCODING
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def url(self, path):
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def request(self, method, path, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        started = time.perf_counter()
+        status = "error"
+        try:
+            resp = self.session.request(method, self.url(path), **kwargs)
+            status = resp.status_code
+            return resp
+        finally:
+            logger.info("%s %s -> %s in %.1f ms", method, path, status, (time.perf_counter() - started) * 1000)
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+
+# Module-level so the pool survives Streamlit reruns, which re-execute the
+# page script but not imported modules
+client = ApiClient()
@@ -1,6 +1,6 @@
 import streamlit as st
-import requests
-from app.streamlit_frontend.utils import API_URL
+from app.streamlit_frontend.api_client import client
+from app.streamlit_frontend.utils import bump_write_generation
 import datetime
 
 def add_mood(user_id):
@@ -15,14 +15,15 @@ def add_mood(user_id):
     notes = st.text_area("Notes", key="mood_notes")
     activities = st.text_input("Activities (comma separated)", key="mood_activities")
     if st.button("Save Entry", key="save_mood"):
-        resp = requests.post(f"{API_URL}/mood-entry", json={
+        resp = client.post("/mood-entry", json={
             "date": str(today),
             "mood_score": mood_score,
             "emoji": emoji,
             "notes": notes,
             "activities": activities
-        }, params={"user_id": user_id})
+        }, params={"user_id": user_id, "upsert": True})  # saving again today replaces today's entry
         if resp.status_code == 200:
+            bump_write_generation(user_id)
             st.success("Entry saved!")
         else:
             st.error("Error saving entry") 
\ No newline at end of file
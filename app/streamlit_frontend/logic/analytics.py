@@ -0,0 +1,64 @@
+import streamlit as st
+import pandas as pd
+import altair as alt
+from app.streamlit_frontend.utils import fetch_json
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+def show_analytics(user_id):
+    st.subheader("📈 Mood Trends")
+    status_code, data = fetch_json(f"/analytics/{user_id}", user_id)
+    if status_code != 200:
+        st.error("Error loading analytics.")
+        return
+    if not data['total_entries']:
+        st.info("No entries yet.")
+        return
+
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Days Logged", data['days_logged'])
+    col2.metric("Longest Streak", f"{data['streaks']['longest']} days")
+    col3.metric("Latest Streak", f"{data['streaks']['latest']} days")
+    daily_std = data['volatility']['daily_std']
+    col4.metric("Volatility", f"{daily_std:.2f}" if daily_std is not None else "—")
+
+    series = pd.DataFrame(data['series'])
+    series['date'] = pd.to_datetime(series['date'])
+    lines = series.melt(id_vars='date', value_vars=['mood', 'avg_7d', 'avg_30d'], var_name='series', value_name='score')
+    chart = (
+        alt.Chart(lines)
+        .mark_line()
+        .encode(
+            x=alt.X('date:T', title='Date'),
+            y=alt.Y('score:Q', scale=alt.Scale(domain=[0, 10]), title='Mood Score'),
+            color=alt.Color('series:N', title=None),
+            tooltip=['date:T', 'series', 'score']
+        )
+        .properties(width='container', height=300)
+    )
+    st.altair_chart(chart, use_container_width=True)
+
+    st.markdown("---")
+    st.subheader("By Weekday")
+    weekday = pd.DataFrame(list(data['weekday_avg'].items()), columns=['weekday', 'mood'])
+    st.altair_chart(
+        alt.Chart(weekday)
+        .mark_bar()
+        .encode(
+            x=alt.X('weekday:N', sort=WEEKDAYS, title=None),
+            y=alt.Y('mood:Q', scale=alt.Scale(domain=[0, 10]), title='Average Mood'),
+        ),
+        use_container_width=True
+    )
+
+    st.markdown("---")
+    st.subheader("Activities and Mood")
+    if data['activity_lift']:
+        st.dataframe(
+            pd.DataFrame(data['activity_lift'])
+            .rename(columns={"activity": "Activity", "count": "Entries", "avg_with": "Average Mood",
+                             "lift": "Lift vs. Without"}),
+            use_container_width=True
+        )
+    else:
+        st.info("No activity data.")
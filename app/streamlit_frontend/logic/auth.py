@@ -1,6 +1,6 @@
 import streamlit as st
-import requests
-from app.streamlit_frontend.utils import API_URL, get_user_id_from_login_response, set_page
+from app.streamlit_frontend.api_client import client
+from app.streamlit_frontend.utils import get_user_id_from_login_response, set_page
 
 def register():
     st.subheader("Register")
@@ -9,7 +9,7 @@ def register():
     password = st.text_input("Password", type="password", key="reg_pass")
     error_box = st.empty()  # Контейнер для ошибок
     if st.button("Sign Up", key="reg_btn"):
-        resp = requests.post(f"{API_URL}/register", json={
+        resp = client.post("/register", json={
             "username": username,
             "email": email,
             "password": password
@@ -43,7 +43,7 @@ def login():
     password = st.text_input("Password", type="password", key="login_pass")
     error_box = st.empty()  # Контейнер для ошибок
     if st.button("Log In", key="login_btn"):
-        resp = requests.post(f"{API_URL}/login", json={
+        resp = client.post("/login", json={
             "username": username,
             "password": password
         })
@@ -1,43 +1,104 @@
 import streamlit as st
 import pandas as pd
-import requests
 import altair as alt
-from app.streamlit_frontend.utils import API_URL
+from app.streamlit_frontend.utils import fetch_json
+
+# Ranges up to this many days are drawn entry by entry, with each entry's time and emoji
+PER_ENTRY_MAX_DAYS = 31
+# Longer ranges are downsampled by the backend (LTTB) to this many points
+CHART_MAX_POINTS = 400
+BUCKETS = ["day", "week", "month"]
+
+def _months(start, end):
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        yield year, month
+        year, month = year + month // 12, month % 12 + 1
 
 def show_calendar(user_id):
     st.subheader("📅 Mood Calendar")
-    today = pd.Timestamp.today()
-    year = today.year
-    month = today.month
-    resp = requests.get(f"{API_URL}/mood-entries/{user_id}/{year}/{month}")
-    if resp.status_code == 200:
-        entries = resp.json()
-        if entries:
-            df = pd.DataFrame({
-                "created_at": [e.get('created_at', e['date']) for e in entries],
-                "mood": [e['mood_score'] for e in entries],
-                "emoji": [e['emoji'] for e in entries]
-            })
-            df['created_at'] = pd.to_datetime(df['created_at'])
-            # Format for display: 'Apr 27, 2024, 14:35'
-            df['created_at_display'] = df['created_at'].dt.strftime('%b %d, %Y, %H:%M')
-            chart = (
-                alt.Chart(df)
-                .mark_line(point=True)
-                .encode(
-                    x=alt.X('created_at:T', title='Date & Time'),
-                    y=alt.Y('mood:Q', scale=alt.Scale(domain=[0, 10]), title='Mood Score'),
-                    tooltip=['created_at_display', 'mood', 'emoji']
-                )
-                .properties(width='container', height=300)
+    today = pd.Timestamp.today().date()
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        selected = st.date_input("Range", value=(today.replace(day=1), today), max_value=today)
+    # While a range is being picked, the widget holds only its first date
+    if not isinstance(selected, (tuple, list)) or len(selected) != 2:
+        st.info("Select the end of the range.")
+        return
+    start, end = selected
+    if (end - start).days < PER_ENTRY_MAX_DAYS:
+        show_entries(user_id, start, end)
+        return
+    with col2:
+        bucket = st.selectbox("Group by", BUCKETS)
+    show_series(user_id, start, end, bucket)
+
+def show_entries(user_id, start, end):
+    """Every entry of a short range, read from the cached monthly listings"""
+    entries = []
+    for year, month in _months(start, end):
+        # The slim projection leaves out notes, which the calendar does not show
+        status_code, month_entries = fetch_json(f"/mood-entries/{user_id}/{year}/{month}?fields=slim", user_id)
+        if status_code != 200:
+            st.error("Error loading calendar.")
+            return
+        entries += [e for e in month_entries if str(start) <= e['date'] <= str(end)]
+    if not entries:
+        st.info("No entries in this range.")
+        return
+    df = pd.DataFrame({
+        "created_at": [e.get('created_at', e['date']) for e in entries],
+        "mood": [e['mood_score'] for e in entries],
+        "emoji": [e['emoji'] for e in entries]
+    })
+    df['created_at'] = pd.to_datetime(df['created_at'])
+    # Format for display: 'Apr 27, 2024, 14:35'
+    df['created_at_display'] = df['created_at'].dt.strftime('%b %d, %Y, %H:%M')
+    chart = (
+        alt.Chart(df)
+        .mark_line(point=True)
+        .encode(
+            x=alt.X('created_at:T', title='Date & Time'),
+            y=alt.Y('mood:Q', scale=alt.Scale(domain=[0, 10]), title='Mood Score'),
+            tooltip=['created_at_display', 'mood', 'emoji']
+        )
+        .properties(width='container', height=300)
+    )
+    st.altair_chart(chart, use_container_width=True)
+    st.dataframe(
+        df.sort_values('created_at', ascending=False)[['created_at_display', 'mood', 'emoji']]
+        .rename(columns={"created_at_display": "Date & Time"}),
+        use_container_width=True
+    )
+
+def show_series(user_id, start, end, bucket):
+    """Per-bucket averages with a min/max band, for ranges too long to draw entry by entry"""
+    path = f"/mood-series/{user_id}?from={start}&to={end}&bucket={bucket}&points={CHART_MAX_POINTS}"
+    status_code, series = fetch_json(path, user_id)
+    if status_code == 200:
+        if series:
+            df = pd.DataFrame(series)
+            df['period'] = pd.to_datetime(df['period'])
+            # Format for display: 'Apr 27, 2024'
+            df['period_display'] = df['period'].dt.strftime('%b %d, %Y')
+            base = alt.Chart(df).encode(x=alt.X('period:T', title='Date'))
+            band = base.mark_area(opacity=0.2).encode(
+                y=alt.Y('min_score:Q', scale=alt.Scale(domain=[0, 10]), title='Mood Score'),
+                y2='max_score:Q'
+            )
+            line = base.mark_line(point=True).encode(
+                y='avg_score:Q',
+                tooltip=['period_display', 'avg_score', 'min_score', 'max_score', 'count']
             )
-            st.altair_chart(chart, use_container_width=True)
+            st.altair_chart((band + line).properties(width='container', height=300), use_container_width=True)
             st.dataframe(
-                df.sort_values('created_at', ascending=False)[['created_at_display', 'mood', 'emoji']]
-                .rename(columns={"created_at_display": "Date & Time"}),
+                df.sort_values('period', ascending=False)[['period_display', 'avg_score', 'min_score', 'max_score',
+                                                          'count']]
+                .rename(columns={"period_display": "Period", "avg_score": "Average", "min_score": "Min",
+                                 "max_score": "Max", "count": "Entries"}),
                 use_container_width=True
             )
         else:
-            st.info("No entries for this month.")
+            st.info("No entries in this range.")
     else:
-        st.error("Error loading calendar.") 
\ No newline at end of file
+        st.error("Error loading calendar.")
@@ -1,14 +1,12 @@
 import streamlit as st
-import requests
-from app.streamlit_frontend.utils import API_URL
+from app.streamlit_frontend.utils import fetch_json
 
 def show_stats(user_id):
     st.markdown("""
         <h2 style='font-size:2rem; margin-bottom:1.5em;'>📊 Mood Statistics</h2>
     """, unsafe_allow_html=True)
-    resp = requests.get(f"{API_URL}/stats/{user_id}")
-    if resp.status_code == 200:
-        stats = resp.json()
+    status_code, stats = fetch_json(f"/stats/{user_id}", user_id)
+    if status_code == 200:
         col1, col2, col3, col4 = st.columns(4)
         col1.metric("Total Entries", stats['total_entries'])
         col2.metric("Average Mood", f"{stats['avg_score']:.2f}")
@@ -1,8 +1,19 @@
 # utils.py — вспомогательные функции для Streamlit frontend
 
+import os
+
 import streamlit as st
 
-API_URL = "http://localhost:8000"
+from app.streamlit_frontend.api_client import client
+
+# Limits of the cross-rerun cache behind fetch_json
+FETCH_CACHE_TTL = int(os.getenv("FRONTEND_CACHE_TTL", "300"))
+FETCH_CACHE_MAX_ENTRIES = int(os.getenv("FRONTEND_CACHE_MAX_ENTRIES", "256"))
+
+# user_id -> number of entries saved from this frontend process. Part of every
+# fetch_json cache key, so a save makes that user's cached reads unreachable.
+# Module-level rather than session_state so every open session sees the bump.
+_write_generations: dict[int, int] = {}
 
 def get_user_id_from_login_response(resp):
     # Ожидаем, что backend возвращает user_id в ответе на логин/регистрацию
@@ -12,6 +23,65 @@ def get_user_id_from_login_response(resp):
     except Exception:
         return None
 
+def _revalidate(path, cached):
+    """GET ``path``, sending the ETag of ``cached`` (etag, data) as If-None-Match.
+
+    Returns (status_code, etag, data); a 304 is answered with the cached data.
+    Touches no session state, so it is safe to call from cached functions.
+    """
+    headers = {"If-None-Match": cached[0]} if cached else {}
+    resp = client.get(path, headers=headers)
+    if resp.status_code == 304 and cached:
+        return 200, cached[0], cached[1]
+    if resp.status_code != 200:
+        return resp.status_code, None, None
+    etag = resp.headers.get("ETag")
+    return 200, etag if isinstance(etag, str) else None, resp.json()
+
+def _remember(path, etag, data):
+    if etag is not None:
+        st.session_state.setdefault('etag_cache', {})[path] = (etag, data)
+
+def write_generation(user_id):
+    return _write_generations.get(user_id, 0)
+
+def bump_write_generation(user_id):
+    """Call after a successful write so the user's next reads skip the cache"""
+    _write_generations[user_id] = write_generation(user_id) + 1
+
+class FetchError(Exception):
+    def __init__(self, status_code):
+        super().__init__(status_code)
+        self.status_code = status_code
+
+@st.cache_data(ttl=FETCH_CACHE_TTL, max_entries=FETCH_CACHE_MAX_ENTRIES, show_spinner=False)
+def _cached_fetch(path, user_id, generation, _cached=None):
+    # _cached is the caller's (etag, data) and, like any leading-underscore
+    # argument, not part of the cache key. Session state is only read and
+    # written by fetch_json: this body runs on misses alone, and its result
+    # is shared by every session.
+    status_code, etag, data = _revalidate(path, _cached)
+    if status_code != 200:
+        # Raising keeps failures out of the cache
+        raise FetchError(status_code)
+    return etag, data
+
+def fetch_json(path, user_id):
+    """GET a JSON resource from the API and return (status_code, data).
+
+    Served from cache across reruns until the user's next save or the TTL.
+    After that the ETag of the last 200 response for the path, kept in
+    session_state, is sent back as If-None-Match, so unchanged data comes
+    back as an empty 304 and the cached copy is reused.
+    """
+    cached = st.session_state.get('etag_cache', {}).get(path)
+    try:
+        etag, data = _cached_fetch(path, user_id, write_generation(user_id), cached)
+    except FetchError as exc:
+        return exc.status_code, None
+    _remember(path, etag, data)
+    return 200, data
+
 def set_page(page: str):
     st.session_state['page'] = page
     st.rerun() 
\ No newline at end of file
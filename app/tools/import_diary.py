@@ -0,0 +1,312 @@
+"""
+Bulk-load historical mood entries from a CSV or NDJSON file.
+
+The file is read as a stream and cut into batches of --batch-size records.
+Each batch is validated against MoodEntryCreate and written in one
+transaction: a multi-row INSERT, the activity links and the user_stats
+aggregates of the users it touches. With --workers N, batches are validated
+and written by N threads with their own sessions while the file is read. On
+SQLite, which allows one writer at a time and ignores row locks, the workers
+validate in parallel but take turns writing.
+
+Invalid rows, and rows for users that do not exist, are skipped and reported
+by record number (1 = first row after the CSV header). Rows take their user
+from a user_id column unless --user-id is given, which overrides it; files
+from GET /export/{user_id} can be loaded as they are.
+
+Committed batches are recorded in a checkpoint file (default
+<file>.checkpoint). Running the same import again resumes after the last
+committed batch, and does nothing once the file has been fully imported.
+Each batch is also recorded under the import's id in the imported_batches
+table, in the transaction that writes its rows, so a batch whose commit
+happened just before a crash is not written again when the checkpoint
+missed it. The id is saved to the checkpoint before the first batch.
+
+Usage:
+    python -m app.tools.import_diary entries.csv --user-id 7
+    python -m app.tools.import_diary export.ndjson --workers 4 --batch-size 5000
+    python -m app.tools.import_diary entries.csv --user-id 7 --restart   # ignore the checkpoint
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+from itertools import islice
+from typing import Any, Callable, ContextManager, Iterator, Optional
+
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.crud import bulk_insert_mood_entries
+from app.database import get_engine_and_session
+from app.fastapi_schemas import MoodEntryCreate
+from app.models import Base
+from app.models.import_batch import ImportedBatch
+from app.models.user import User
+
+FORMATS = ("csv", "ndjson")
+# Records are numbered from 1; an error is (record number, message)
+Record = tuple[int, dict[str, Any]]
+RowError = tuple[int, str]
+
+
+class ImportAborted(Exception):
+    """The import cannot continue; the checkpoint keeps everything committed so far"""
+
+
+def detect_format(path: str) -> str:
+    extension = os.path.splitext(path)[1].lower()
+    return "ndjson" if extension in (".ndjson", ".jsonl") else "csv"
+
+
+def read_records(path: str, fmt: str) -> Iterator[Record]:
+    with open(path, newline="", encoding="utf-8") as file:
+        if fmt == "csv":
+            for number, row in enumerate(csv.DictReader(file), start=1):
+                # CSV has no null; empty fields are read as missing values
+                yield number, {key: None if value == "" else value for key, value in row.items()}
+        else:
+            number = 0
+            for line in file:
+                if not line.strip():
+                    continue
+                number += 1
+                try:
+                    record = json.loads(line)
+                except ValueError as exc:
+                    record = {"__error__": f"invalid JSON: {exc}"}
+                yield number, record if isinstance(record, dict) else {"__error__": "not a JSON object"}
+
+
+def _validate(records: list[Record], user_id: Optional[int]) -> tuple[list[tuple[int, int, MoodEntryCreate]],
+                                                                       list[RowError]]:
+    valid, errors = [], []
+    for number, record in records:
+        if "__error__" in record:
+            errors.append((number, record["__error__"]))
+            continue
+        raw_owner: Any = user_id if user_id is not None else record.get("user_id")
+        try:
+            owner = int(raw_owner)
+        except (TypeError, ValueError):
+            errors.append((number, "user_id: missing or not an integer"))
+            continue
+        try:
+            valid.append((number, owner, MoodEntryCreate.model_validate(record)))
+        except ValidationError as exc:
+            errors.append((number, "; ".join(f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in exc.errors())))
+    return valid, errors
+
+
+def import_batch(db: Session, records: list[Record], user_id: Optional[int] = None,
+                 marker: Optional[ImportedBatch] = None) -> tuple[int, list[RowError]]:
+    """Validate and insert one batch in one transaction; return (rows inserted, rejected rows).
+
+    A ``marker`` is filled in with the counts and committed with the rows.
+    Raises IntegrityError, after rolling back, if a row conflicts with an
+    existing entry.
+    """
+    return _insert_valid(db, *_validate(records, user_id), marker)
+
+
+def _insert_valid(db: Session, valid: list[tuple[int, int, MoodEntryCreate]], errors: list[RowError],
+                  marker: Optional[ImportedBatch] = None) -> tuple[int, list[RowError]]:
+    known = set(db.scalars(select(User.id).where(User.id.in_({owner for _, owner, _ in valid}))))
+    errors += [(number, f"user_id: no user {owner}") for number, owner, _ in valid if owner not in known]
+    entries = [(owner, entry) for _, owner, entry in valid if owner in known]
+    try:
+        if entries:
+            bulk_insert_mood_entries(db, entries)
+        if marker is not None:
+            marker.imported, marker.invalid = len(entries), len(errors)
+            db.add(marker)
+            db.flush()
+    except IntegrityError:
+        db.rollback()
+        raise
+    db.commit()
+    return len(entries), sorted(errors)
+
+
+class Checkpoint:
+    """Committed batches of one import, saved as JSON after every batch.
+
+    Batches can commit out of order with several workers: ``done`` counts the
+    batches committed without gaps from the start, ``committed`` holds those
+    committed beyond it.
+    """
+
+    def __init__(self, path: str, source: str, batch_size: int) -> None:
+        self.path = path
+        self.state: dict[str, Any] = {"import_id": uuid.uuid4().hex, "source": os.path.abspath(source),
+                                      "source_size": os.path.getsize(source), "batch_size": batch_size, "done": 0,
+                                      "committed": [], "imported": 0, "invalid": 0, "finished": False}
+
+    def load(self) -> bool:
+        """Adopt a saved checkpoint for the same file; False if there is none"""
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, encoding="utf-8") as file:
+            saved = json.load(file)
+        if saved.get("source_size") != self.state["source_size"]:
+            raise ImportAborted(f"{self.path} belongs to a different version of the file; use --restart")
+        # Checkpoints written before import ids existed keep the fresh one
+        self.state = {"import_id": self.state["import_id"], **saved}
+        return True
+
+    @property
+    def import_id(self) -> str:
+        return self.state["import_id"]
+
+    @property
+    def batch_size(self) -> int:
+        return self.state["batch_size"]
+
+    def is_committed(self, batch: int) -> bool:
+        return batch < self.state["done"] or batch in self.state["committed"]
+
+    def commit(self, batch: int, imported: int, invalid: int) -> None:
+        committed = set(self.state["committed"]) | {batch}
+        while self.state["done"] in committed:
+            committed.remove(self.state["done"])
+            self.state["done"] += 1
+        self.state["committed"] = sorted(committed)
+        self.state["imported"] += imported
+        self.state["invalid"] += invalid
+        self.save()
+
+    def finish(self) -> None:
+        self.state["finished"] = True
+        self.save()
+
+    def save(self) -> None:
+        # Replace atomically, so an interruption never leaves a torn file
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as file:
+            json.dump(self.state, file)
+        os.replace(temporary, self.path)
+
+
+def import_file(SessionLocal: Callable[[], Session], path: str, checkpoint: Checkpoint, fmt: Optional[str] = None,
+                user_id: Optional[int] = None, workers: int = 1,
+                on_error: Callable[[RowError], None] = lambda error: None) -> dict[str, Any]:
+    """Import the batches of ``path`` the checkpoint has not seen and return totals for this run"""
+    fmt = fmt or detect_format(path)
+    started = time.perf_counter()
+    totals: dict[str, Any] = {"imported": 0, "invalid": 0, "batches": 0, "resumed_batches": 0}
+
+    with SessionLocal() as db:
+        serialize = db.get_bind().dialect.name == "sqlite"
+    write_lock: ContextManager[Any] = threading.Lock() if serialize else nullcontext()
+
+    def run(batch: int, records: list[Record]) -> tuple[int, int, list[RowError]]:
+        """Write one batch and return (rows inserted, rows rejected, errors to report)"""
+        valid, errors = _validate(records, user_id)
+        with write_lock, SessionLocal() as db:
+            marker = db.get(ImportedBatch, (checkpoint.import_id, batch))
+            if marker is not None:
+                # Committed by a run that stopped before saving the checkpoint;
+                # its rejected rows were reported then
+                return marker.imported, marker.invalid, []
+            imported, errors = _insert_valid(db, valid, errors,
+                                             ImportedBatch(import_id=checkpoint.import_id, batch=batch))
+            return imported, len(errors), errors
+
+    def collect(done: set[Future]) -> None:
+        for future in done:
+            batch, records = pending.pop(future)
+            try:
+                imported, invalid, errors = future.result()
+            except IntegrityError as exc:
+                raise ImportAborted(f"records {records[0][0]}-{records[-1][0]} were rolled back ({exc.orig})")
+            for error in errors:
+                on_error(error)
+            checkpoint.commit(batch, imported, invalid)
+            totals["imported"] += imported
+            totals["invalid"] += invalid
+            totals["batches"] += 1
+
+    # Batches are marked with the import id, so it is on disk before any commits
+    checkpoint.save()
+    pending: dict[Future, tuple[int, list[Record]]] = {}
+    records = read_records(path, fmt)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            batch = 0
+            while chunk := list(islice(records, checkpoint.batch_size)):
+                if checkpoint.is_committed(batch):
+                    totals["resumed_batches"] += 1
+                else:
+                    # Bound the batches held in memory while workers are busy
+                    while len(pending) >= 2 * workers:
+                        collect(wait(pending, return_when=FIRST_COMPLETED).done)
+                    pending[executor.submit(run, batch, chunk)] = (batch, chunk)
+                batch += 1
+            while pending:
+                collect(wait(pending, return_when=FIRST_COMPLETED).done)
+        except BaseException:
+            # Let batches already in flight commit and reach the checkpoint
+            for future in [future for future in pending if future.cancel()]:
+                del pending[future]
+            while pending:
+                try:
+                    collect(wait(pending).done)
+                except ImportAborted:
+                    pass
+            raise
+    checkpoint.finish()
+    totals["seconds"] = time.perf_counter() - started
+    return totals
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Bulk-import mood entries from a CSV or NDJSON file.")
+    parser.add_argument("path", help="file with one mood entry per row or line")
+    parser.add_argument("--format", choices=FORMATS, help="defaults to the file extension (.ndjson/.jsonl, else csv)")
+    parser.add_argument("--user-id", type=int, help="import every row for this user instead of its user_id column")
+    parser.add_argument("--batch-size", type=int, default=1000, help="rows per transaction")
+    parser.add_argument("--workers", type=int, default=1, help="batches written in parallel")
+    parser.add_argument("--checkpoint", help="progress file (default PATH.checkpoint)")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and import from the start")
+    parser.add_argument("--database-url", help="defaults to DATABASE_URL")
+    args = parser.parse_args(argv)
+
+    checkpoint = Checkpoint(args.checkpoint or f"{args.path}.checkpoint", args.path, args.batch_size)
+    try:
+        if not args.restart and checkpoint.load():
+            if checkpoint.state["finished"]:
+                print(f"Already imported: {checkpoint.state['imported']} rows (use --restart to import again)")
+                return 0
+            print(f"Resuming after {checkpoint.state['done']} batches of {checkpoint.batch_size} rows")
+    except ImportAborted as exc:
+        print(f"Error: {exc}", file=sys.stderr)
+        return 2
+
+    engine, SessionLocal = get_engine_and_session(args.database_url, use_async=False)
+    Base.metadata.create_all(bind=engine)
+
+    def report(error: RowError) -> None:
+        print(f"Skipped record {error[0]}: {error[1]}", file=sys.stderr)
+
+    try:
+        totals = import_file(SessionLocal, args.path, checkpoint, args.format, args.user_id, args.workers, report)
+    except ImportAborted as exc:
+        print(f"Error: {exc}. Fix the file or the database and run again to resume.", file=sys.stderr)
+        return 1
+    rate = totals["imported"] / totals["seconds"] if totals["seconds"] else 0.0
+    print(f"Imported rows: {totals['imported']} in {totals['seconds']:.1f}s ({rate:,.0f} rows/s), "
+          f"skipped invalid: {totals['invalid']}, batches: {totals['batches']}"
+          + (f" (+{totals['resumed_batches']} from the checkpoint)" if totals["resumed_batches"] else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
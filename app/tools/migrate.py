@@ -0,0 +1,164 @@
+"""
+Migrations for existing databases.
+
+New tables are created by Base.metadata.create_all on startup; the steps here
+cover what create_all cannot: new columns and indexes on existing tables and
+data backfills or cleanups. Every step is idempotent.
+
+Usage:
+    python -m app.tools.migrate add_columns [--database-url URL]
+    python -m app.tools.migrate create_indexes
+    python -m app.tools.migrate create_search_index
+    python -m app.tools.migrate backfill_activities
+    python -m app.tools.migrate dedupe_daily_entries
+"""
+import argparse
+import sys
+from typing import Callable
+
+from sqlalchemy import func, inspect, select, text
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateColumn
+
+from app.database import get_engine_and_session
+from app.models import Base
+from app.models.activity import link_activities, mood_entry_activities
+from app.models.mood_entry import UNIQUE_DAILY_ENTRY_INDEX, MoodEntry
+from app.models.search import install_search_index
+from app.models.user_stats import UserStats, create_missing_stats
+
+
+def add_columns(db: Session) -> list[str]:
+    """Add model-declared columns missing from tables created by older versions.
+
+    New non-nullable columns must declare a server_default for this to work.
+    """
+    connection = db.connection()
+    inspector = inspect(connection)
+    added = []
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                ddl = CreateColumn(column).compile(dialect=connection.dialect)
+                connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+                added.append(f"{table.name}.{column.name}")
+    db.commit()
+    return added
+
+
+def create_indexes(db: Session) -> list[str]:
+    """Create model-declared indexes missing from tables created by older versions"""
+    connection = db.connection()
+    inspector = inspect(connection)
+    created = []
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            # Unique indexes could fail on existing data; each has its own step
+            if index.name not in existing and not index.unique:
+                index.create(connection)
+                created.append(index.name)
+    db.commit()
+    return created
+
+
+def create_search_index(db: Session) -> bool:
+    """Create the full-text index over notes and fill it from existing entries; False if unsupported"""
+    installed = install_search_index(db.connection(), rebuild=True)
+    db.commit()
+    return installed
+
+
+def backfill_activities(db: Session, batch_size: int = 1000) -> int:
+    """Create activity links for entries that have an activities string but no links yet"""
+    links = mood_entry_activities.c
+    already_linked = select(links.mood_entry_id).where(links.mood_entry_id == MoodEntry.id).exists()
+    last_id = 0
+    total = 0
+    while True:
+        rows = db.execute(
+            select(MoodEntry.id, MoodEntry.user_id, MoodEntry.activities)
+            .where(MoodEntry.id > last_id, MoodEntry.activities.isnot(None), MoodEntry.activities != "",
+                   ~already_linked)
+            .order_by(MoodEntry.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return total
+        total += link_activities(db, [(row.id, row.user_id, row.activities) for row in rows])
+        # Analytics read the links, so the users' cached responses are stale now
+        user_ids = sorted({row.user_id for row in rows})
+        created = create_missing_stats(db, user_ids)
+        stats = {row.user_id: row for row in db.scalars(
+            select(UserStats).where(UserStats.user_id.in_(user_ids)).order_by(UserStats.user_id).with_for_update())}
+        for user_id in user_ids:
+            if user_id in created:
+                stats[user_id].copy_from(UserStats.compute(db, user_id))
+            stats[user_id].touch()
+        db.commit()
+        last_id = rows[-1].id
+
+
+def dedupe_daily_entries(db: Session, batch_size: int = 500) -> int:
+    """Collapse each user's same-day entries into the most recent one, then enforce one entry per day.
+
+    Removed entries go through the ORM so stats aggregates and activity links
+    follow. Returns the number of entries removed.
+    """
+    keep = (
+        select(MoodEntry.user_id, MoodEntry.date, func.max(MoodEntry.id).label("keep_id"))
+        .group_by(MoodEntry.user_id, MoodEntry.date)
+        .having(func.count() > 1)
+        .subquery()
+    )
+    removed = 0
+    while True:
+        ids = db.scalars(
+            select(MoodEntry.id)
+            .join(keep, (MoodEntry.user_id == keep.c.user_id) & (MoodEntry.date == keep.c.date))
+            .where(MoodEntry.id != keep.c.keep_id)
+            .limit(batch_size)
+        ).all()
+        if not ids:
+            break
+        for entry in db.query(MoodEntry).filter(MoodEntry.id.in_(ids)):
+            db.delete(entry)
+        db.commit()
+        removed += len(ids)
+    # New databases get the index from create_all; this adds it to older ones
+    index = next(index for index in MoodEntry.__table__.indexes if index.name == UNIQUE_DAILY_ENTRY_INDEX)
+    index.create(db.connection(), checkfirst=True)
+    db.commit()
+    return removed
+
+
+MIGRATIONS: dict[str, Callable[[Session], object]] = {
+    "add_columns": add_columns,
+    "create_indexes": create_indexes,
+    "create_search_index": create_search_index,
+    "backfill_activities": backfill_activities,
+    "dedupe_daily_entries": dedupe_daily_entries,
+}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run a data migration against the Mood Diary database.")
+    parser.add_argument("migration", choices=sorted(MIGRATIONS))
+    parser.add_argument("--database-url", help="defaults to DATABASE_URL")
+    args = parser.parse_args(argv)
+
+    engine, SessionLocal = get_engine_and_session(args.database_url, use_async=False)
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        result = MIGRATIONS[args.migration](db)
+    print(f"{args.migration}: {result}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
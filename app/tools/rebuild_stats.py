@@ -0,0 +1,62 @@
+"""
+Recompute the per-user stats aggregate from mood_entries and reconcile it
+with the live user_stats table.
+
+Usage:
+    python -m app.tools.rebuild_stats            # rewrite stale or missing rows
+    python -m app.tools.rebuild_stats --check    # only report, exit 1 on drift
+"""
+import argparse
+import sys
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.database import get_engine_and_session
+from app.models import Base
+from app.models.mood_entry import MoodEntry
+from app.models.user_stats import UserStats
+
+
+def rebuild_user_stats(db: Session, check: bool = False) -> list[int]:
+    """Recompute every user's aggregate and return the ids whose live row was stale or missing"""
+    user_ids = db.scalars(select(MoodEntry.user_id).union(select(UserStats.user_id))).all()
+    stale = []
+    for user_id in sorted(user_ids):
+        fresh = UserStats.compute(db, user_id)
+        live = db.get(UserStats, user_id)
+        if live is not None and live.matches(fresh):
+            continue
+        stale.append(user_id)
+        if check:
+            continue
+        if live is None:
+            live = fresh
+            db.add(live)
+        else:
+            live.copy_from(fresh)
+        live.touch()
+    if not check:
+        db.commit()
+    return stale
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Rebuild the user_stats aggregate table from mood_entries.")
+    parser.add_argument("--check", action="store_true",
+                        help="compare against the live table without writing; exit 1 if any row differs")
+    parser.add_argument("--database-url", help="defaults to DATABASE_URL")
+    args = parser.parse_args(argv)
+
+    engine, SessionLocal = get_engine_and_session(args.database_url, use_async=False)
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        stale = rebuild_user_stats(db, check=args.check)
+
+    verb = "Stale" if args.check else "Rebuilt"
+    print(f"{verb} aggregates: {len(stale)}" + (f" (user ids: {', '.join(map(str, stale))})" if stale else ""))
+    return 1 if args.check and stale else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
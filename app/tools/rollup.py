@@ -0,0 +1,135 @@
+"""
+Fold new mood entries into the population rollups (daily average mood,
+weekly emoji and activity distributions across all users).
+
+Entries are read in (created_at, id) order past the high-water mark kept in
+rollup_state, so a run only touches rows written since the previous one.
+Each batch updates the rollups and the mark in one transaction. Entries are
+counted as first written; run with --rebuild to pick up later edits and
+deletions.
+
+Usage:
+    python -m app.tools.rollup                  # process new entries
+    python -m app.tools.rollup --rebuild        # recompute from scratch
+    python -m app.tools.rollup --lag 0          # include entries written just now
+"""
+import argparse
+import sys
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import and_, delete, or_, select
+from sqlalchemy.orm import Session
+
+from app.database import get_engine_and_session
+from app.models import Base
+from app.models.mood_entry import MoodEntry, parse_activities
+from app.models.rollup import DailyMoodRollup, RollupState, WeeklyMoodRollup
+
+STATE_NAME = "mood_entries"
+# Entries younger than this are left for the next run: a transaction that is
+# still open may commit a row whose created_at is behind rows already visible
+DEFAULT_LAG = timedelta(seconds=60)
+
+
+def _week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+def _rollup_batch(db: Session, cutoff: datetime, batch_size: int) -> int:
+    # The row lock keeps concurrent runs from folding the same entries twice
+    state = db.scalars(select(RollupState).where(RollupState.name == STATE_NAME).with_for_update()).first()
+    if state is None:
+        state = RollupState(name=STATE_NAME, last_id=0, rows_processed=0)
+        db.add(state)
+    criteria = [MoodEntry.created_at.isnot(None), MoodEntry.created_at <= cutoff]
+    if state.last_created_at is not None:
+        criteria.append(or_(MoodEntry.created_at > state.last_created_at,
+                            and_(MoodEntry.created_at == state.last_created_at, MoodEntry.id > state.last_id)))
+    rows = db.execute(
+        select(MoodEntry.id, MoodEntry.created_at, MoodEntry.date, MoodEntry.mood_score, MoodEntry.emoji,
+               MoodEntry.activities)
+        .where(*criteria)
+        .order_by(MoodEntry.created_at, MoodEntry.id)
+        .limit(batch_size)
+    ).all()
+    if not rows:
+        db.commit()
+        return 0
+
+    daily: dict[date, list[int]] = {}
+    weekly: dict[date, tuple[list[int], Counter[str], Counter[str]]] = {}
+    for row in rows:
+        day_totals = daily.setdefault(row.date, [0, 0])
+        day_totals[0] += 1
+        day_totals[1] += int(row.mood_score)
+        totals, emojis, activities = weekly.setdefault(_week_start(row.date), ([0, 0], Counter(), Counter()))
+        totals[0] += 1
+        totals[1] += int(row.mood_score)
+        if row.emoji:
+            emojis[row.emoji] += 1
+        activities.update(parse_activities(row.activities))
+
+    existing_days = {r.day: r for r in db.scalars(select(DailyMoodRollup).where(DailyMoodRollup.day.in_(daily)))}
+    for day, (count, score_sum) in daily.items():
+        rollup = existing_days.get(day)
+        if rollup is None:
+            rollup = DailyMoodRollup(day=day)
+            db.add(rollup)
+        rollup.add(count, score_sum)
+    existing_weeks = {r.week_start: r for r in
+                      db.scalars(select(WeeklyMoodRollup).where(WeeklyMoodRollup.week_start.in_(weekly)))}
+    for week_start, ((count, score_sum), emojis, activities) in weekly.items():
+        week = existing_weeks.get(week_start)
+        if week is None:
+            week = WeeklyMoodRollup(week_start=week_start)
+            db.add(week)
+        week.add(count, score_sum, emojis, activities)
+
+    state.last_created_at, state.last_id = rows[-1].created_at, rows[-1].id
+    state.rows_processed += len(rows)
+    state.updated_at = datetime.now(timezone.utc)
+    db.commit()
+    return len(rows)
+
+
+def run_rollups(db: Session, batch_size: int = 1000, lag: timedelta = DEFAULT_LAG) -> int:
+    """Fold entries written since the last run into the rollups and return how many were processed"""
+    # created_at is stored as naive UTC
+    cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - lag
+    processed = 0
+    while batch := _rollup_batch(db, cutoff, batch_size):
+        processed += batch
+    return processed
+
+
+def reset_rollups(db: Session) -> None:
+    """Drop all rollup rows and the high-water mark, so the next run starts from the first entry"""
+    for model in (DailyMoodRollup, WeeklyMoodRollup, RollupState):
+        db.execute(delete(model))
+    db.commit()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Update the population mood rollups from new mood entries.")
+    parser.add_argument("--rebuild", action="store_true", help="discard the rollups and recompute them")
+    parser.add_argument("--batch-size", type=int, default=1000, help="entries per transaction")
+    parser.add_argument("--lag", type=float, default=DEFAULT_LAG.total_seconds(),
+                        help="skip entries younger than this many seconds (default %(default)s)")
+    parser.add_argument("--database-url", help="defaults to DATABASE_URL")
+    args = parser.parse_args(argv)
+
+    engine, SessionLocal = get_engine_and_session(args.database_url, use_async=False)
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        if args.rebuild:
+            reset_rollups(db)
+        processed = run_rollups(db, args.batch_size, timedelta(seconds=args.lag))
+        state = db.get(RollupState, STATE_NAME)
+        total = state.rows_processed if state else 0
+    print(f"Rolled up entries: {processed} (total {total})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+"""
+Compare /analytics/{user_id} computation strategies on a seeded database.
+
+    PYTHONPATH=. python tests/benchmarks/bench_analytics.py --years 1 5 20
+
+- python:     hydrate every MoodEntry and its activities, then loop in Python
+- vectorized: app.analytics, two narrow selects into pandas/NumPy frames
+
+Both results are checked against each other before timings are printed.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+from sqlalchemy import insert
+from sqlalchemy.orm import selectinload
+
+from app import analytics
+from app.database import get_engine_and_session
+from app.models import Base
+from app.models.activity import link_activities
+from app.models.mood_entry import MoodEntry
+from app.models.user import User
+
+EMOJIS = ["😀", "🙂", "😐", "🙁", "😢", "😡", "😴", "🤒", "🥰", "😎"]
+ACTIVITIES = ["work", "gym", "reading", "walking", "cooking", "gaming", "family", "friends", "music", "travel"]
+
+
+def _mean(values):
+    return round(sum(values) / len(values), 3) if values else None
+
+
+def python_analytics(db, user_id):
+    entries = (db.query(MoodEntry).options(selectinload(MoodEntry.linked_activities))
+               .filter(MoodEntry.user_id == user_id).order_by(MoodEntry.date, MoodEntry.id).all())
+    by_day = defaultdict(list)
+    by_weekday = defaultdict(list)
+    by_month = defaultdict(list)
+    by_activity = defaultdict(list)
+    for e in entries:
+        by_day[e.date].append(e.mood_score)
+        by_weekday[e.date.weekday()].append(e.mood_score)
+        by_month[e.date.month].append(e.mood_score)
+        for activity in e.linked_activities:
+            by_activity[activity.name].append(e.mood_score)
+    days = sorted(by_day)
+    daily = {day: sum(by_day[day]) / len(by_day[day]) for day in days}
+
+    series = []
+    for day in days:
+        point = {"date": day.isoformat(), "mood": round(daily[day], 3)}
+        for window in analytics.ROLLING_WINDOWS:
+            values = [daily[d] for d in (day - timedelta(days=k) for k in range(window)) if d in daily]
+            point[f"avg_{window}d"] = _mean(values)
+        series.append(point)
+
+    values = [daily[day] for day in days]
+    mean = sum(values) / len(values)
+    std = (sum((v - mean) ** 2 for v in values) / (len(values) - 1)) ** 0.5 if len(values) > 1 else None
+    changes = [abs(b - a) for a, b in zip(values, values[1:])]
+
+    runs = [1]
+    for previous, day in zip(days, days[1:]):
+        if (day - previous).days == 1:
+            runs[-1] += 1
+        else:
+            runs.append(1)
+
+    total = sum(e.mood_score for e in entries)
+    lift = []
+    for name, scores in by_activity.items():
+        without = len(entries) - len(scores)
+        avg_with = sum(scores) / len(scores)
+        avg_without = (total - sum(scores)) / without if without else None
+        raw = avg_with - avg_without if avg_without is not None else None
+        lift.append((raw is not None, raw or 0, len(scores), {
+            "activity": name, "count": len(scores), "avg_with": round(avg_with, 3),
+            "lift": round(raw, 3) if raw is not None else None}))
+    lift.sort(key=lambda item: item[:3], reverse=True)
+
+    return {
+        "total_entries": len(entries),
+        "days_logged": len(days),
+        "series": series,
+        "weekday_avg": {analytics.WEEKDAYS[d]: _mean(by_weekday[d]) for d in sorted(by_weekday)},
+        "month_avg": {str(m): _mean(by_month[m]) for m in sorted(by_month)},
+        "volatility": {"daily_std": round(std, 3) if std is not None else None, "mean_abs_change": _mean(changes)},
+        "streaks": {"longest": max(runs), "latest": runs[-1]},
+        "activity_lift": [item[3] for item in lift[:analytics.TOP_LIFT_ACTIVITIES]],
+    }
+
+
+def seed(SessionLocal, years, chunk=5000):
+    """One entry per day, with every tenth day skipped to break streaks"""
+    rnd = random.Random(years)
+    start = date(2000, 1, 1)
+    days = [start + timedelta(days=i) for i in range(years * 365) if i % 10 != 9]
+    with SessionLocal() as db:
+        user = User(username=f"bench{years}", email=f"bench{years}@example.com", password_hash="x")
+        db.add(user)
+        db.commit()
+        user_id = user.id
+        for offset in range(0, len(days), chunk):
+            rows = [{
+                "user_id": user_id,
+                "date": day,
+                "mood_score": rnd.randint(1, 10),
+                "emoji": rnd.choice(EMOJIS),
+                "notes": "Lorem ipsum dolor sit amet. " * rnd.randint(1, 20),
+                "activities": ", ".join(rnd.sample(ACTIVITIES, rnd.randint(0, 3))),
+            } for day in days[offset:offset + chunk]]
+            inserted = db.execute(
+                insert(MoodEntry).returning(MoodEntry.id, MoodEntry.user_id, MoodEntry.activities), rows
+            )
+            link_activities(db, inserted.all())
+            db.commit()
+    return user_id, len(days)
+
+
+def timed(SessionLocal, fn, user_id, repeat):
+    samples = []
+    for _ in range(repeat):
+        with SessionLocal() as db:
+            started = time.perf_counter()
+            result = fn(db, user_id)
+            samples.append(time.perf_counter() - started)
+    return statistics.median(samples), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--years", type=int, nargs="+", default=[1, 5, 20])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    tmp = tempfile.NamedTemporaryFile(suffix=".db", delete=False).name
+    engine, SessionLocal = get_engine_and_session(f"sqlite:///{tmp}", use_async=False)
+    Base.metadata.create_all(bind=engine)
+    try:
+        print(f"{'years':>5} {'entries':>8} {'python ms':>10} {'vectorized ms':>14} {'speedup':>8}")
+        for years in args.years:
+            user_id, n_entries = seed(SessionLocal, years)
+            python_time, expected = timed(SessionLocal, python_analytics, user_id, args.repeat)
+            vector_time, result = timed(SessionLocal, analytics.get_analytics, user_id, args.repeat)
+            assert result == expected
+            print(f"{years:>5} {n_entries:>8} {python_time * 1e3:>10.1f} {vector_time * 1e3:>14.1f} "
+                  f"{python_time / vector_time:>7.1f}x")
+    finally:
+        engine.dispose()
+        os.unlink(tmp)
+
+
+if __name__ == "__main__":
+    main()
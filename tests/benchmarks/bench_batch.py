@@ -0,0 +1,95 @@
+"""
+Compare mood-entry insert throughput through the API on a temporary database.
+
+    PYTHONPATH=. python tests/benchmarks/bench_batch.py --single 1000 --batch 20000
+
+- single: one POST /mood-entry per entry (commit + refresh each time)
+- batch:  POST /mood-entries/batch with NDJSON bodies of up to MAX_BATCH_ITEMS entries
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+from fastapi.testclient import TestClient
+
+import app.fastapi_app as fastapi_app
+from app.database import get_engine_and_session
+from app.models import Base
+from app.models.user import User
+
+EMOJIS = ["😀", "🙂", "😐", "🙁", "😢", "😡", "😴", "🤒", "🥰", "😎"]
+ACTIVITIES = ["work", "gym", "reading", "walking", "cooking", "gaming", "family", "friends", "music", "travel"]
+
+
+def make_entries(n, seed):
+    rnd = random.Random(seed)
+    start = date(2000, 1, 1)
+    return [{
+        "date": str(start + timedelta(days=i)),
+        "mood_score": rnd.randint(1, 10),
+        "emoji": rnd.choice(EMOJIS),
+        "notes": "Lorem ipsum dolor sit amet. " * rnd.randint(1, 5),
+        "activities": ", ".join(rnd.sample(ACTIVITIES, rnd.randint(0, 3))),
+    } for i in range(n)]
+
+
+def create_user(SessionLocal, name):
+    with SessionLocal() as db:
+        user = User(username=name, email=f"{name}@example.com", password_hash="x")
+        db.add(user)
+        db.commit()
+        return user.id
+
+
+def run_single(client, user_id, entries):
+    started = time.perf_counter()
+    for entry in entries:
+        resp = client.post("/mood-entry", params={"user_id": user_id}, json=entry)
+        assert resp.status_code == 200, resp.text
+    return time.perf_counter() - started
+
+
+def run_batch(client, user_id, entries):
+    size = fastapi_app.MAX_BATCH_ITEMS
+    bodies = ["\n".join(json.dumps(entry) for entry in entries[i:i + size]).encode()
+              for i in range(0, len(entries), size)]
+    started = time.perf_counter()
+    created = 0
+    for body in bodies:
+        resp = client.post("/mood-entries/batch", params={"user_id": user_id}, content=body,
+                           headers={"Content-Type": "application/x-ndjson"})
+        created += resp.json()["created"]
+    elapsed = time.perf_counter() - started
+    assert created == len(entries)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--single", type=int, default=1000, help="entries posted one by one")
+    parser.add_argument("--batch", type=int, default=10_000, help="entries posted through the batch endpoint")
+    args = parser.parse_args()
+
+    tmp = tempfile.NamedTemporaryFile(suffix=".db", delete=False).name
+    engine, SessionLocal = get_engine_and_session(f"sqlite:///{tmp}", use_async=False)
+    Base.metadata.create_all(bind=engine)
+    fastapi_app.engine, fastapi_app.SessionLocal = engine, SessionLocal
+    try:
+        client = TestClient(fastapi_app.create_app())
+        single = run_single(client, create_user(SessionLocal, "single"), make_entries(args.single, 1))
+        batch = run_batch(client, create_user(SessionLocal, "batch"), make_entries(args.batch, 2))
+        single_rate, batch_rate = args.single / single, args.batch / batch
+        print(f"{'path':>7} {'entries':>8} {'seconds':>8} {'rows/s':>9}")
+        print(f"{'single':>7} {args.single:>8} {single:>8.2f} {single_rate:>9.0f}")
+        print(f"{'batch':>7} {args.batch:>8} {batch:>8.2f} {batch_rate:>9.0f}  ({batch_rate / single_rate:.1f}x)")
+    finally:
+        engine.dispose()
+        os.unlink(tmp)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Bytes against latency for compressed entry-list responses on large histories.
+
+    PYTHONPATH=. python tests/benchmarks/bench_compression.py --entries 1000 10000 --mbit 10 100
+
+For each history size, the JSON body of GET /mood-entries/{user_id} with
+that many entries is encoded with every coding and level below. The table
+shows the size, the time to compress on the server and to decompress on the
+client, and the estimated time to deliver the body over links of --mbit
+megabits per second (compress + transfer + decompress).
+
+The API is then called in-process with Accept-Encoding identity, gzip and
+br at the default settings (app/compression.py): a 1000-entry page and the
+full-history NDJSON export, which is compressed as it streams.
+"""
+import argparse
+import gzip
+import os
+import statistics
+import tempfile
+import time
+from functools import partial
+
+from fastapi.testclient import TestClient
+
+import app.fastapi_app as fastapi_app
+from app import crud
+from app.compression import brotli_available, brotli_encoder, gzip_encoder
+from app.database import get_engine_and_session
+from app.models import Base
+from tests.benchmarks.conftest import seed
+
+LEVELS = [("gzip", 1), ("gzip", 6), ("gzip", 9), ("br", 1), ("br", 4), ("br", 11)]
+
+
+def median_time(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples), result
+
+
+def encoders():
+    yield "identity", lambda body: body, lambda data: data
+    for coding, level in LEVELS:
+        if coding == "gzip":
+            yield f"gzip-{level}", lambda body, level=level: gzip_encoder(level)(body, True), gzip.decompress
+        elif brotli_available():
+            import brotli
+            yield f"br-{level}", lambda body, level=level: brotli_encoder(level)(body, True), brotli.decompress
+
+
+def compare_encoders(SessionLocal, user_id, sizes, mbits, repeat):
+    header = f"{'entries':>8} {'coding':>9} {'KiB':>9} {'ratio':>6} {'encode ms':>10} {'decode ms':>10}"
+    print(header + "".join(f" {f'@{mbit:g} Mbit ms':>14}" for mbit in mbits))
+    for size in sizes:
+        with SessionLocal() as db:
+            entries, _ = crud.list_mood_entries(db, user_id, limit=size)
+        body = fastapi_app._encode_json(entries)
+        for name, encode, decode in encoders():
+            encode_time, data = median_time(partial(encode, body), repeat)
+            decode_time, decoded = median_time(partial(decode, data), repeat)
+            assert decoded == body
+            totals = [encode_time + len(data) * 8 / (mbit * 1e6) + decode_time for mbit in mbits]
+            print(f"{size:>8} {name:>9} {len(data) / 1024:>9.1f} {len(body) / len(data):>5.1f}x "
+                  f"{encode_time * 1e3:>10.2f} {decode_time * 1e3:>10.2f}"
+                  + "".join(f" {total * 1e3:>14.1f}" for total in totals))
+
+
+def fetch(client, path, params, coding):
+    """GET ``path`` with Accept-Encoding ``coding`` and return the bytes on the wire"""
+    resp = client.get(path, params=params, headers={"Accept-Encoding": coding})
+    assert resp.headers.get("Content-Encoding", "identity") == coding
+    return resp.num_bytes_downloaded
+
+
+def compare_routes(client, user_id, repeat):
+    codings = ["identity", "gzip"] + (["br"] if brotli_available() else [])
+    paths = [(f"/mood-entries/{user_id}", {"limit": 1000}), (f"/export/{user_id}", {"format": "ndjson"})]
+    print(f"\n{'route':>28} {'coding':>9} {'KiB on wire':>12} {'ms':>8}")
+    for path, params in paths:
+        for coding in codings:
+            elapsed, wire_bytes = median_time(partial(fetch, client, path, params, coding), repeat)
+            print(f"{path.split('/')[1] + '?' + '&'.join(f'{k}={v}' for k, v in params.items()):>28} {coding:>9} "
+                  f"{wire_bytes / 1024:>12.1f} {elapsed * 1e3:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, nargs="+", default=[1000, 10_000], help="history sizes")
+    parser.add_argument("--mbit", type=float, nargs="+", default=[10, 100], help="link speeds to estimate")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    tmp = tempfile.NamedTemporaryFile(suffix=".db", delete=False).name
+    engine, SessionLocal = get_engine_and_session(f"sqlite:///{tmp}", use_async=False)
+    Base.metadata.create_all(bind=engine)
+    fastapi_app.engine, fastapi_app.SessionLocal = engine, SessionLocal
+    try:
+        user_id = seed(SessionLocal, 1, max(args.entries))[0]
+        compare_encoders(SessionLocal, user_id, args.entries, args.mbit, args.repeat)
+        compare_routes(TestClient(fastapi_app.create_app()), user_id, args.repeat)
+    finally:
+        engine.dispose()
+        os.unlink(tmp)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Time GET /mood-entries/{user_id}/search against the LIKE scan it replaces.
+
+    PYTHONPATH=. python tests/benchmarks/bench_search.py --notes 50000
+
+One user gets --notes entries of generated prose and a second user as many
+again, so the index also holds rows that the user filter has to discard.
+
+- fts:  the full-text index (FTS5 on SQLite), bm25-ranked with snippets
+- like: the fallback used when the database has no index
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+
+import app.crud as crud
+import app.fastapi_app as fastapi_app
+from app.database import get_engine_and_session
+from app.models import Base
+from app.models.mood_entry import MoodEntry
+from app.models.user import User
+
+WORDS = ("morning evening walk run coffee meeting work deadline family dinner friends movie book rain sun tired "
+         "happy anxious calm stressed slept late early park dog cat garden music guitar call mother project "
+         "review gym yoga lunch traffic commute weekend travel train beach headache doctor cooking pasta").split()
+# Common, rare, prefix and unmatched queries
+QUERIES = ["work", "guitar review", "headache doctor", "comm", "beach weekend travel", "zebra"]
+
+
+def make_notes(rnd, n):
+    # A skewed vocabulary, so some words are in most notes and others in few
+    weights = [1 / (rank + 1) for rank in range(len(WORDS))]
+    return [" ".join(rnd.choices(WORDS, weights, k=rnd.randint(8, 40))).capitalize() + "." for _ in range(n)]
+
+
+def seed(SessionLocal, n_notes, chunk=5000):
+    rnd = random.Random(n_notes)
+    user_ids = []
+    with SessionLocal() as db:
+        for name in ("bench", "other"):
+            user = User(username=name, email=f"{name}@example.com", password_hash="x")
+            db.add(user)
+            db.commit()
+            user_ids.append(user.id)
+            notes = make_notes(rnd, n_notes)
+            for offset in range(0, n_notes, chunk):
+                db.execute(insert(MoodEntry), [{
+                    "user_id": user.id,
+                    "date": date(2000, 1, 1) + timedelta(days=i),
+                    "mood_score": rnd.randint(1, 10),
+                    "notes": notes[i],
+                } for i in range(offset, min(offset + chunk, n_notes))])
+                db.commit()
+    return user_ids[0]
+
+
+def timed(client, user_id, query, repeat):
+    samples, hits = [], 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        resp = client.get(f"/mood-entries/{user_id}/search", params={"q": query, "limit": 20})
+        samples.append(time.perf_counter() - started)
+        hits = len(resp.json())
+    return statistics.median(samples), hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--notes", type=int, default=50_000, help="entries per user")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    tmp = tempfile.NamedTemporaryFile(suffix=".db", delete=False).name
+    engine, SessionLocal = get_engine_and_session(f"sqlite:///{tmp}", use_async=False)
+    Base.metadata.create_all(bind=engine)
+    fastapi_app.engine, fastapi_app.SessionLocal = engine, SessionLocal
+    try:
+        user_id = seed(SessionLocal, args.notes)
+        client = TestClient(fastapi_app.create_app())
+        has_index = crud.has_search_index
+        print(f"{'query':>22} {'hits':>5} {'fts ms':>8} {'like ms':>8}")
+        for query in QUERIES:
+            crud.has_search_index = has_index
+            fts_time, hits = timed(client, user_id, query, args.repeat)
+            crud.has_search_index = lambda connection: False
+            like_time, _ = timed(client, user_id, query, args.repeat)
+            print(f"{query:>22} {hits:>5} {fts_time * 1e3:>8.1f} {like_time * 1e3:>8.1f}")
+    finally:
+        crud.has_search_index = has_index
+        engine.dispose()
+        os.unlink(tmp)
+
+
+if __name__ == "__main__":
+    main()
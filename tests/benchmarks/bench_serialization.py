@@ -0,0 +1,99 @@
+"""
+Compare the cost per entry of building an entry-list response body on a
+seeded database.
+
+    PYTHONPATH=. python tests/benchmarks/bench_serialization.py --sizes 100 1000 10000
+
+- orm:  the original path: ORM instances, MoodEntryOut.model_validate per
+        entry, FastAPI's response_model validation and serialization of the
+        list, then the stdlib json encoder
+- rows: crud.list_mood_entries (column tuples as dicts) encoded by orjson
+- slim: the same with fields=slim, which leaves out notes and activities
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+from typing import List
+
+from pydantic import TypeAdapter
+from sqlalchemy.orm import undefer
+
+import app.fastapi_app as fastapi_app
+from app import crud
+from app.database import get_engine_and_session
+from app.fastapi_schemas import MoodEntryOut
+from app.models import Base
+from app.models.mood_entry import MoodEntry
+from tests.benchmarks.conftest import seed
+
+RESPONSE_ADAPTER = TypeAdapter(List[MoodEntryOut])
+
+
+def orm_body(db, user_id, limit):
+    # notes is deferred now; the original path loaded it with the row
+    entries = (db.query(MoodEntry).options(undefer(MoodEntry.notes)).filter(MoodEntry.user_id == user_id)
+               .order_by(MoodEntry.date.asc(), MoodEntry.id.asc()).limit(limit + 1).all())
+    page = [MoodEntryOut.model_validate(e) for e in entries[:limit]]
+    # What FastAPI does with response_model=List[MoodEntryOut], then JSONResponse.render
+    content = RESPONSE_ADAPTER.dump_python(RESPONSE_ADAPTER.validate_python(page), mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+
+def rows_body(db, user_id, limit):
+    entries, _ = crud.list_mood_entries(db, user_id, limit=limit)
+    return fastapi_app._encode_json(entries)
+
+
+def slim_body(db, user_id, limit):
+    entries, _ = crud.list_mood_entries(db, user_id, limit=limit, fields=crud.SLIM_FIELDS)
+    return fastapi_app._encode_json(entries)
+
+
+def timed(SessionLocal, fn, user_id, limit, repeat):
+    samples = []
+    for _ in range(repeat):
+        with SessionLocal() as db:
+            started = time.perf_counter()
+            body = fn(db, user_id, limit)
+            samples.append(time.perf_counter() - started)
+    return statistics.median(samples), body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10_000])
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--database-url", help="defaults to a temporary SQLite file")
+    args = parser.parse_args()
+
+    tmp = None
+    url = args.database_url
+    if url is None:
+        tmp = tempfile.NamedTemporaryFile(suffix=".db", delete=False).name
+        url = f"sqlite:///{tmp}"
+    engine, SessionLocal = get_engine_and_session(url, use_async=False)
+    Base.metadata.create_all(bind=engine)
+    try:
+        print(f"{'entries':>8} {'orm ms':>9} {'rows ms':>9} {'slim ms':>9} {'orm us/entry':>13} "
+              f"{'rows us/entry':>14} {'speedup':>8} {'rows KiB':>9} {'slim KiB':>9}")
+        for size in args.sizes:
+            user_id = seed(SessionLocal, 1, size, prefix=f"bench{size}-")[0]
+            orm_time, expected = timed(SessionLocal, orm_body, user_id, size, args.repeat)
+            rows_time, body = timed(SessionLocal, rows_body, user_id, size, args.repeat)
+            slim_time, slim = timed(SessionLocal, slim_body, user_id, size, args.repeat)
+            assert json.loads(body) == json.loads(expected)
+            print(f"{size:>8} {orm_time * 1e3:>9.1f} {rows_time * 1e3:>9.1f} {slim_time * 1e3:>9.1f} "
+                  f"{orm_time / size * 1e6:>13.1f} {rows_time / size * 1e6:>14.1f} {orm_time / rows_time:>7.1f}x "
+                  f"{len(body) / 1024:>9.1f} {len(slim) / 1024:>9.1f}")
+    finally:
+        Base.metadata.drop_all(bind=engine)
+        engine.dispose()
+        if tmp:
+            os.unlink(tmp)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Compare /stats/{user_id} computation strategies on a seeded database.
+
+    PYTHONPATH=. python tests/benchmarks/bench_stats.py --sizes 10000 100000
+
+- orm:       the original path, hydrating every MoodEntry (notes included)
+- sql:       UserStats.compute, GROUP BY aggregation without loading notes
+- aggregate: primary-key read of the maintained user_stats row
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from collections import Counter
+from datetime import date, timedelta
+
+from sqlalchemy import insert
+
+from app.database import get_engine_and_session
+from app.models import Base
+from app.models.activity import link_activities
+from app.models.mood_entry import MoodEntry
+from app.models.user import User
+from app.models.user_stats import UserStats
+
+EMOJIS = ["😀", "🙂", "😐", "🙁", "😢", "😡", "😴", "🤒", "🥰", "😎"]
+ACTIVITIES = ["work", "gym", "reading", "walking", "cooking", "gaming", "family", "friends", "music", "travel"]
+
+
+def orm_stats(db, user_id):
+    entries = db.query(MoodEntry).filter(MoodEntry.user_id == user_id).all()
+    if not entries:
+        return {"total_entries": 0, "avg_score": 0, "max_score": 0, "min_score": 0, "emoji_counts": {},
+                "top_activities": []}
+    scores = [int(e.mood_score) for e in entries]
+    activity_counts: Counter[str] = Counter()
+    for e in entries:
+        if e.activities:
+            for act in e.activities.split(","):
+                act = act.strip()
+                if act:
+                    activity_counts[act] += 1
+    return {
+        "total_entries": len(entries),
+        "avg_score": sum(scores) / len(entries),
+        "max_score": max(scores),
+        "min_score": min(scores),
+        "emoji_counts": Counter(e.emoji for e in entries if e.emoji),
+        "top_activities": activity_counts.most_common(5),
+    }
+
+
+def sql_stats(db, user_id):
+    return UserStats.compute(db, user_id).to_dict()
+
+
+def aggregate_stats(db, user_id):
+    return db.get(UserStats, user_id).to_dict()
+
+
+def seed(SessionLocal, n_entries, chunk=5000):
+    rnd = random.Random(n_entries)
+    with SessionLocal() as db:
+        user = User(username=f"bench{n_entries}", email=f"bench{n_entries}@example.com", password_hash="x")
+        db.add(user)
+        db.commit()
+        user_id = user.id
+        start = date(2000, 1, 1)
+        for offset in range(0, n_entries, chunk):
+            rows = [{
+                "user_id": user_id,
+                "date": start + timedelta(days=i // 3),
+                "mood_score": rnd.randint(1, 10),
+                "emoji": rnd.choice(EMOJIS),
+                "notes": "Lorem ipsum dolor sit amet. " * rnd.randint(1, 20),
+                "activities": ", ".join(rnd.sample(ACTIVITIES, rnd.randint(0, 3))),
+            } for i in range(offset, min(offset + chunk, n_entries))]
+            inserted = db.execute(
+                insert(MoodEntry).returning(MoodEntry.id, MoodEntry.user_id, MoodEntry.activities), rows
+            )
+            link_activities(db, inserted.all())
+            db.commit()
+        db.add(UserStats.compute(db, user_id))
+        db.commit()
+    return user_id
+
+
+def timed(SessionLocal, fn, user_id, repeat):
+    samples = []
+    for _ in range(repeat):
+        with SessionLocal() as db:
+            started = time.perf_counter()
+            result = fn(db, user_id)
+            samples.append(time.perf_counter() - started)
+    return statistics.median(samples), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--database-url", help="defaults to a temporary SQLite file")
+    args = parser.parse_args()
+
+    tmp = None
+    url = args.database_url
+    if url is None:
+        tmp = tempfile.NamedTemporaryFile(suffix=".db", delete=False).name
+        url = f"sqlite:///{tmp}"
+    engine, SessionLocal = get_engine_and_session(url, use_async=False)
+    Base.metadata.create_all(bind=engine)
+    try:
+        print(f"{'entries':>8} {'orm ms':>10} {'sql ms':>10} {'aggregate ms':>13} {'speedup':>8}")
+        for size in args.sizes:
+            user_id = seed(SessionLocal, size)
+            orm_time, expected = timed(SessionLocal, orm_stats, user_id, args.repeat)
+            sql_time, result = timed(SessionLocal, sql_stats, user_id, args.repeat)
+            agg_time, _ = timed(SessionLocal, aggregate_stats, user_id, args.repeat)
+            assert result == {**expected, "emoji_counts": dict(expected["emoji_counts"])}
+            print(f"{size:>8} {orm_time * 1e3:>10.1f} {sql_time * 1e3:>10.1f} {agg_time * 1e3:>13.2f} "
+                  f"{orm_time / sql_time:>7.1f}x")
+    finally:
+        Base.metadata.drop_all(bind=engine)
+        engine.dispose()
+        if tmp:
+            os.unlink(tmp)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+Fixtures for the in-process benchmark suite (test_benchmarks.py).
+
+Tests that use the ``benchmark`` fixture are skipped unless BENCHMARK=1. Each
+one times a callable for a number of rounds after a warm-up and compares the
+median with the saved baseline; the test fails when it is more than
+BENCHMARK_THRESHOLD slower. BENCHMARK_SAVE=1 writes the measured medians as
+the new baseline instead of comparing.
+
+    BENCHMARK=1 BENCHMARK_SAVE=1 poetry run pytest tests/benchmarks   # record, e.g. on main
+    BENCHMARK=1 poetry run pytest tests/benchmarks                    # compare
+
+Settings (environment):
+- BENCHMARK_USERS, BENCHMARK_ENTRIES: seeded users and entries per user (20 x 1000)
+- BENCHMARK_ROUNDS: timed rounds per benchmark (20)
+- BENCHMARK_THRESHOLD: allowed slowdown of the median, as a fraction (0.25)
+- BENCHMARK_NOISE_MS: slowdowns smaller than this are never failures (0.5)
+- BENCHMARK_BASELINE: baseline file (tests/benchmarks/baseline.json)
+- BENCHMARK_DATABASE_URL: database to seed, e.g. a scratch PostgreSQL
+  database; defaults to a temporary SQLite file. Its tables are dropped first.
+
+A baseline only holds for the machine, database and data size it was
+recorded with; comparisons against one recorded with other settings are
+skipped.
+"""
+import json
+import os
+import platform
+import random
+import statistics
+import tempfile
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.crud import bulk_insert_mood_entries
+from app.fastapi_schemas import MoodEntryCreate
+from app.models import Base
+from app.models.user import User
+
+EMOJIS = ["😀", "🙂", "😐", "🙁", "😢", "😡", "😴", "🤒", "🥰", "😎"]
+ACTIVITIES = ["work", "gym", "reading", "walking", "cooking", "gaming", "family", "friends", "music", "travel"]
+WORDS = ["calm", "tired", "busy", "sunny", "rain", "family", "deadline", "walk", "coffee", "friends", "late", "gym"]
+FIRST_DAY = date(2020, 1, 1)
+
+ENABLED = bool(os.getenv("BENCHMARK"))
+SAVE = bool(os.getenv("BENCHMARK_SAVE"))
+USERS = int(os.getenv("BENCHMARK_USERS", "20"))
+ENTRIES = int(os.getenv("BENCHMARK_ENTRIES", "1000"))
+ROUNDS = int(os.getenv("BENCHMARK_ROUNDS", "20"))
+THRESHOLD = float(os.getenv("BENCHMARK_THRESHOLD", "0.25"))
+NOISE_MS = float(os.getenv("BENCHMARK_NOISE_MS", "0.5"))
+BASELINE = os.getenv("BENCHMARK_BASELINE", os.path.join(os.path.dirname(__file__), "baseline.json"))
+DATABASE_URL = os.getenv("BENCHMARK_DATABASE_URL")
+
+# name -> timings of this run, written to the baseline at the end with BENCHMARK_SAVE=1
+RESULTS: dict[str, dict[str, float]] = {}
+
+
+def pytest_collection_modifyitems(config, items):
+    if ENABLED:
+        return
+    skip = pytest.mark.skip(reason="benchmarks run with BENCHMARK=1")
+    for item in items:
+        if "benchmark" in getattr(item, "fixturenames", ()):
+            item.add_marker(skip)
+
+
+def _settings() -> dict[str, object]:
+    """What a baseline was recorded with; timings are only compared between equal settings"""
+    return {"users": USERS, "entries": ENTRIES, "database": (DATABASE_URL or "sqlite").split(":")[0],
+            "machine": f"{platform.machine()} x{os.cpu_count()}", "python": platform.python_version()}
+
+
+def _load_baseline() -> dict:
+    if not os.path.exists(BASELINE):
+        return {}
+    with open(BASELINE, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def seed(SessionLocal, users: int, entries: int, prefix: str = "bench") -> list[int]:
+    """Create users with a year-spanning diary each; stats and activity links are maintained.
+
+    Also used by the bench_*.py scripts, which seed several data sizes into
+    one database under different username prefixes.
+    """
+    rnd = random.Random(users * entries)
+    with SessionLocal() as db:
+        accounts = [User(username=f"{prefix}{i}", email=f"{prefix}{i}@example.com", password_hash="x")
+                    for i in range(users)]
+        db.add_all(accounts)
+        db.commit()
+        user_ids = [user.id for user in accounts]
+        for user_id in user_ids:
+            items = [(user_id, MoodEntryCreate(
+                date=FIRST_DAY + timedelta(days=i),
+                mood_score=rnd.randint(1, 10),
+                emoji=rnd.choice(EMOJIS),
+                notes=" ".join(rnd.choices(WORDS, k=rnd.randint(3, 30))),
+                activities=", ".join(rnd.sample(ACTIVITIES, rnd.randint(0, 3))),
+            )) for i in range(entries)]
+            for offset in range(0, entries, 5000):
+                bulk_insert_mood_entries(db, items[offset:offset + 5000])
+                db.commit()
+    return user_ids
+
+
+@pytest.fixture(scope="session")
+def bench_db():
+    """(engine, SessionLocal, user_ids) of the seeded database"""
+    directory = tempfile.TemporaryDirectory()
+    engine = create_engine(DATABASE_URL or f"sqlite:///{os.path.join(directory.name, 'bench.db')}")
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    user_ids = seed(SessionLocal, USERS, ENTRIES)
+    yield engine, SessionLocal, user_ids
+    engine.dispose()
+    directory.cleanup()
+
+
+@pytest.fixture(scope="session")
+def seeded_month():
+    """(year, month) of the middle day of every seeded diary, whatever BENCHMARK_ENTRIES is"""
+    middle = FIRST_DAY + timedelta(days=(ENTRIES - 1) // 2)
+    return middle.year, middle.month
+
+
+@pytest.fixture(scope="session")
+def baseline():
+    """Baseline medians comparable with this run, by benchmark name"""
+    saved = _load_baseline()
+    if saved.get("settings") != _settings():
+        return {}
+    return saved.get("results", {})
+
+
+@pytest.fixture
+def benchmark(baseline):
+    """Time ``fn(i)`` for i in 0..rounds, after two warm-up calls, and check the median against the baseline"""
+
+    def run(name: str, fn, rounds: Optional[int] = None) -> dict[str, float]:
+        rounds = rounds or ROUNDS
+        for i in range(2):
+            fn(-1 - i)
+        timings = []
+        for i in range(rounds):
+            started = time.perf_counter()
+            fn(i)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        result = {"median_ms": round(statistics.median(timings), 3),
+                  "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+                  "min_ms": round(timings[0], 3), "rounds": rounds}
+        RESULTS[name] = result
+        reference = baseline.get(name)
+        if not SAVE and reference:
+            limit = max(reference["median_ms"] * (1 + THRESHOLD), reference["median_ms"] + NOISE_MS)
+            if result["median_ms"] > limit:
+                pytest.fail(f"{name}: median {result['median_ms']:.2f} ms is more than {THRESHOLD:.0%} above "
+                            f"the baseline {reference['median_ms']:.2f} ms", pytrace=False)
+        return result
+
+    return run
+
+
+def pytest_sessionfinish(session, exitstatus):
+    if not (ENABLED and SAVE and RESULTS):
+        return
+    saved = _load_baseline()
+    settings = _settings()
+    # Keep entries of benchmarks not run this time if they were recorded with the same settings
+    results = saved.get("results", {}) if saved.get("settings") == settings else {}
+    results.update(RESULTS)
+    with open(BASELINE, "w", encoding="utf-8") as file:
+        json.dump({"settings": settings, "saved_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                   "results": dict(sorted(results.items()))}, file, indent=2)
+        file.write("\n")
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not RESULTS:
+        return
+    terminalreporter.section("benchmarks (ms)")
+    terminalreporter.write_line(f"{'name':<40} {'median':>9} {'p95':>9} {'min':>9}")
+    for name, result in sorted(RESULTS.items()):
+        terminalreporter.write_line(f"{name:<40} {result['median_ms']:>9.2f} {result['p95_ms']:>9.2f} "
+                                    f"{result['min_ms']:>9.2f}")
+    if SAVE:
+        terminalreporter.write_line(f"Baseline written to {BASELINE}")
+    elif _load_baseline().get("settings") != _settings():
+        terminalreporter.write_line(f"No baseline with these settings in {BASELINE}; nothing was compared. "
+                                    "Record one with BENCHMARK_SAVE=1.")
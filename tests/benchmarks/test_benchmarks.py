@@ -0,0 +1,123 @@
+"""
+In-process benchmarks of every API route and of the model queries behind
+them, against the seeded database from conftest.py. Skipped unless
+BENCHMARK=1; see conftest.py for baselines and settings.
+
+The response cache is disabled, so read routes are timed doing their work
+rather than answering from memory. Write routes use a user of their own,
+so the data the read routes see stays the same between runs.
+"""
+from datetime import date, timedelta
+from itertools import count
+from types import SimpleNamespace
+
+import pytest
+from fastapi.routing import APIRoute
+from fastapi.testclient import TestClient
+
+import app.fastapi_app as fastapi_app
+from app.cache import ResponseCache
+from app.models.mood_entry import MoodEntry
+from app.models.user_stats import UserStats
+
+ADMIN_TOKEN = "benchmark"
+ADMIN = {"X-Admin-Token": ADMIN_TOKEN}
+WRITES_FROM = date(2100, 1, 1)
+
+
+def _entry(day: date) -> dict:
+    return {"date": str(day), "mood_score": 7, "emoji": "🙂", "notes": "Benchmark entry", "activities": "work, gym"}
+
+
+def _account(n: int) -> dict:
+    return {"username": f"newuser{n}", "email": f"newuser{n}@example.com", "password": "benchmarkpassword"}
+
+
+def _batch(ctx, _):
+    first = WRITES_FROM + timedelta(days=100_000 + 100 * next(ctx.counter))
+    return ctx.client.post("/mood-entries/batch", params={"user_id": ctx.writer},
+                           json=[_entry(first + timedelta(days=i)) for i in range(100)])
+
+
+# (method, path) of each route -> request made in one round, and rounds if not the default
+ROUTES = {
+    ("GET", "/health"): (lambda ctx, _: ctx.client.get("/health"), None),
+    ("GET", "/metrics"): (lambda ctx, _: ctx.client.get("/metrics"), None),
+    ("POST", "/register"): (lambda ctx, _: ctx.client.post("/register", json=_account(next(ctx.counter))), 5),
+    ("POST", "/login"): (lambda ctx, _: ctx.client.post("/login", json={
+        "username": "benchwriter", "password": "benchmarkpassword"}), 5),
+    ("POST", "/mood-entry"): (lambda ctx, _: ctx.client.post("/mood-entry", params={"user_id": ctx.writer},
+                                                             json=_entry(WRITES_FROM + timedelta(
+                                                                 days=next(ctx.counter)))), None),
+    ("POST", "/mood-entries/batch"): (_batch, None),
+    ("GET", "/mood-entries/{user_id}"): (lambda ctx, _: ctx.client.get(f"/mood-entries/{ctx.reader}",
+                                                                       params={"limit": 100}), None),
+    ("GET", "/mood-entries/{user_id}/stream"): (lambda ctx, _: ctx.client.get(
+        f"/mood-entries/{ctx.reader}/stream"), None),
+    ("GET", "/export/{user_id}"): (lambda ctx, _: ctx.client.get(f"/export/{ctx.reader}"), None),
+    ("GET", "/mood-entries/{user_id}/search"): (lambda ctx, _: ctx.client.get(
+        f"/mood-entries/{ctx.reader}/search", params={"q": "coffee dead"}), None),
+    ("GET", "/mood-entries/{user_id}/{year}/{month}"): (lambda ctx, _: ctx.client.get(
+        f"/mood-entries/{ctx.reader}/{ctx.year}/{ctx.month}"), None),
+    ("GET", "/mood-series/{user_id}"): (lambda ctx, _: ctx.client.get(
+        f"/mood-series/{ctx.reader}", params={"bucket": "week"}), None),
+    ("GET", "/stats/{user_id}"): (lambda ctx, _: ctx.client.get(f"/stats/{ctx.reader}"), None),
+    ("GET", "/analytics/{user_id}"): (lambda ctx, _: ctx.client.get(f"/analytics/{ctx.reader}"), None),
+    ("GET", "/admin/rollups/daily"): (lambda ctx, _: ctx.client.get("/admin/rollups/daily", headers=ADMIN), None),
+    ("GET", "/admin/rollups/weekly"): (lambda ctx, _: ctx.client.get("/admin/rollups/weekly", headers=ADMIN), None),
+    ("POST", "/admin/rollups/run"): (lambda ctx, _: ctx.client.post("/admin/rollups/run", params={"lag": 0},
+                                                                   headers=ADMIN), None),
+}
+
+
+@pytest.fixture(scope="module")
+def api(bench_db, seeded_month):
+    engine, SessionLocal, user_ids = bench_db
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(fastapi_app, "engine", engine)
+        mp.setattr(fastapi_app, "SessionLocal", SessionLocal)
+        mp.setattr(fastapi_app, "response_cache", ResponseCache(None))
+        mp.setattr(fastapi_app, "ADMIN_TOKEN", ADMIN_TOKEN)
+        with TestClient(fastapi_app.create_app()) as client:
+            writer = client.post("/register", json={"username": "benchwriter", "email": "benchwriter@example.com",
+                                                    "password": "benchmarkpassword"}).json()["user_id"]
+            year, month = seeded_month
+            yield SimpleNamespace(client=client, reader=user_ids[0], writer=writer, counter=count(), year=year,
+                                  month=month)
+
+
+def test_every_route_has_a_benchmark():
+    routes = {(method, route.path) for route in fastapi_app.create_app().routes if isinstance(route, APIRoute)
+              for method in route.methods}
+    assert routes == set(ROUTES)
+
+
+@pytest.mark.parametrize("route", list(ROUTES), ids=[f"{method} {path}" for method, path in ROUTES])
+def test_route(benchmark, api, route):
+    request, rounds = ROUTES[route]
+
+    def call(i):
+        response = request(api, i)
+        assert response.status_code < 300, response.text
+
+    benchmark(" ".join(route), call, rounds)
+
+
+def test_get_monthly_entries(benchmark, bench_db, seeded_month):
+    _, SessionLocal, user_ids = bench_db
+
+    def call(i):
+        with SessionLocal() as db:
+            assert MoodEntry.get_monthly_entries(db, user_ids[0], *seeded_month)
+
+    benchmark("MoodEntry.get_monthly_entries", call)
+
+
+def test_stats_compute(benchmark, bench_db):
+    _, SessionLocal, user_ids = bench_db
+
+    def call(i):
+        with SessionLocal() as db:
+            assert UserStats.compute(db, user_ids[0]).entry_count
+
+    benchmark("UserStats.compute", call)
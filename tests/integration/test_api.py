@@ -1,8 +1,19 @@
+import asyncio
+import csv
+import io
+import json
+import os
+import re
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import sessionmaker
 import app.fastapi_app as fastapi_app
+from app import crud
+from app.cache import MemoryBackend, ResponseCache
+from app.fastapi_schemas import MoodEntryCreate
+from app.hashing import PasswordHasher, PoolSaturated
 from app.models import Base
 
 TEST_DATABASE_URL = "sqlite:///:memory:"
@@ -20,6 +31,8 @@ def setup_and_teardown_db(monkeypatch):
     # Monkeypatch engine and SessionLocal
     monkeypatch.setattr(fastapi_app, "engine", test_engine)
     monkeypatch.setattr(fastapi_app, "SessionLocal", TestingSessionLocal)
+    # Ids restart with every database, so cached responses must not leak
+    monkeypatch.setattr(fastapi_app, "response_cache", ResponseCache(MemoryBackend()))
     yield
     Base.metadata.drop_all(bind=connection)
     connection.close()
@@ -119,3 +132,607 @@ def test_mood_entry_flow():
     assert resp.status_code == 200
     stats = resp.json()
     assert stats["total_entries"] >= 1
+    assert stats["avg_score"] == 8
+    assert stats["emoji_counts"] == {"😀": 1}
+    assert stats["top_activities"] == [["work", 1], ["gym", 1]]
+
+    # Entries can be filtered by a single activity
+    resp = client.get(f"/mood-entries/{user_id}", params={"activity": "gym"})
+    assert [e["mood_score"] for e in resp.json()] == [8]
+    assert client.get(f"/mood-entries/{user_id}", params={"activity": "swimming"}).json() == []
+
+    # A second entry updates the aggregate behind /stats
+    client.post("/mood-entry", params={"user_id": user_id}, json={
+        "date": "2025-05-06",
+        "mood_score": 4,
+        "emoji": "😢",
+        "notes": None,
+        "activities": "gym"
+    })
+    stats = client.get(f"/stats/{user_id}").json()
+    assert stats["total_entries"] == 2
+    assert stats["avg_score"] == 6
+    assert (stats["min_score"], stats["max_score"]) == (4, 8)
+    assert stats["top_activities"][0] == ["gym", 2]
+
+
+def test_mood_entry_upsert():
+    user_id = client.post("/register", json={
+        "username": "upsertuser",
+        "email": "upsertuser@example.com",
+        "password": "upsertpass"
+    }).json()["user_id"]
+    entry = {"date": "2025-05-05", "mood_score": 3, "emoji": "😢", "notes": "Rough start", "activities": "work"}
+
+    first = client.post("/mood-entry", params={"user_id": user_id}, json=entry).json()
+    resp = client.post("/mood-entry", params={"user_id": user_id, "upsert": True},
+                       json={**entry, "mood_score": 7, "notes": None})
+    assert resp.status_code == 200
+    assert resp.json()["id"] == first["id"]
+    assert resp.json()["notes"] is None
+
+    entries = client.get(f"/mood-entries/{user_id}").json()
+    assert [(e["id"], e["mood_score"]) for e in entries] == [(first["id"], 7)]
+    stats = client.get(f"/stats/{user_id}").json()
+    assert (stats["total_entries"], stats["avg_score"]) == (1, 7)
+
+    # Without upsert a second entry for the same day is refused. Sessions join
+    # the fixture connection's transaction; end it so the rollback keeps the entry
+    fastapi_app.SessionLocal.kw["bind"].commit()
+    resp = client.post("/mood-entry", params={"user_id": user_id}, json=entry)
+    assert resp.status_code == 409
+    assert len(client.get(f"/mood-entries/{user_id}").json()) == 1
+
+
+def test_mood_entry_conflict_only_for_daily_index():
+    user_id = client.post("/register", json={
+        "username": "conflictuser",
+        "email": "conflictuser@example.com",
+        "password": "testpassword"
+    }).json()["user_id"]
+    # Any other unique violation is an error, not "this date already exists"
+    connection = fastapi_app.SessionLocal.kw["bind"]
+    connection.execute(text("CREATE UNIQUE INDEX uq_test_user_score ON mood_entries (user_id, mood_score)"))
+    entry = {"date": "2025-04-01", "mood_score": 5, "emoji": None, "notes": None, "activities": None}
+    assert client.post("/mood-entry", params={"user_id": user_id}, json=entry).status_code == 200
+    with pytest.raises(IntegrityError):
+        client.post("/mood-entry", params={"user_id": user_id}, json={**entry, "date": "2025-04-02"})
+
+
+def test_register_rejected_when_hashing_pool_saturated(monkeypatch):
+    # A pool with no room for jobs sheds load instead of queueing
+    monkeypatch.setattr(fastapi_app, "password_hasher", PasswordHasher(workers=1, max_pending=0))
+    resp = client.post("/register", json={
+        "username": "busyuser",
+        "email": "busyuser@example.com",
+        "password": "testpassword"
+    })
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"] == "1"
+
+    health = client.get("/health").json()
+    assert health["password_hashing"]["rejected"] == 1
+    assert health["password_hashing"]["queue_depth"] == 0
+
+
+def test_password_hasher_replaces_broken_pool():
+    hasher = PasswordHasher(workers=1, max_pending=4, rounds=4)
+    try:
+        # A job whose worker dies breaks the pool; the retry on a fresh pool dies too
+        with pytest.raises(PoolSaturated):
+            asyncio.run(hasher._run(os._exit, 1))
+        assert hasher.stats()["restarts"] == 2
+        # Later jobs run on a new pool instead of failing for good
+        assert asyncio.run(hasher.verify("secret", asyncio.run(hasher.hash("secret"))))
+    finally:
+        hasher.shutdown()
+
+    # Without a pool of its own nothing is queued, whatever is in flight
+    threadpool = PasswordHasher(workers=0, max_pending=4)
+    threadpool.in_flight = 3
+    assert threadpool.queue_depth == 0
+
+
+def test_mood_entries_pagination_and_stream(monkeypatch):
+    user_id = client.post("/register", json={
+        "username": "pageuser",
+        "email": "pageuser@example.com",
+        "password": "testpassword"
+    }).json()["user_id"]
+    for day, score in (("2025-05-03", 3), ("2025-05-01", 1), ("2025-05-02", 2), ("2025-05-06", 9), ("2025-05-04", 4)):
+        client.post("/mood-entry", params={"user_id": user_id}, json={
+            "date": day, "mood_score": score, "emoji": None, "notes": None, "activities": None
+        })
+
+    scores, after = [], None
+    while True:
+        resp = client.get(f"/mood-entries/{user_id}", params={"limit": 2, **({"after": after} if after else {})})
+        assert resp.status_code == 200
+        scores += [e["mood_score"] for e in resp.json()]
+        after = resp.headers.get("X-Next-Cursor")
+        if not after:
+            break
+        assert 'rel="next"' in resp.headers["Link"]
+    assert scores == [1, 2, 3, 4, 9]
+    assert client.get(f"/mood-entries/{user_id}", params={"after": "not-a-cursor"}).status_code == 400
+
+    # Without limit or after the listing is not paginated
+    monkeypatch.setattr(fastapi_app, "DEFAULT_PAGE_SIZE", 2)
+    resp = client.get(f"/mood-entries/{user_id}")
+    assert [e["mood_score"] for e in resp.json()] == [1, 2, 3, 4, 9]
+    assert "X-Next-Cursor" not in resp.headers
+    first = client.get(f"/mood-entries/{user_id}", params={"limit": 1}).headers["X-Next-Cursor"]
+    resp = client.get(f"/mood-entries/{user_id}", params={"after": first})
+    assert [e["mood_score"] for e in resp.json()] == [2, 3]
+    assert "X-Next-Cursor" in resp.headers
+
+    resp = client.get(f"/mood-entries/{user_id}/stream")
+    assert resp.headers["content-type"] == "application/x-ndjson"
+    streamed = [json.loads(line) for line in resp.text.splitlines()]
+    assert [e["mood_score"] for e in streamed] == [1, 2, 3, 4, 9]
+    assert streamed[0]["user_id"] == user_id
+
+
+def test_mood_entries_fields():
+    user_id = client.post("/register", json={
+        "username": "fieldsuser",
+        "email": "fieldsuser@example.com",
+        "password": "testpassword"
+    }).json()["user_id"]
+    for day, score in (("2025-05-01", 1), ("2025-05-02", 2), ("2025-05-03", 3)):
+        client.post("/mood-entry", params={"user_id": user_id}, json={
+            "date": day, "mood_score": score, "emoji": "🙂", "notes": "A long note", "activities": "work"
+        })
+
+    resp = client.get(f"/mood-entries/{user_id}", params={"fields": "slim", "limit": 2})
+    assert list(resp.json()[0]) == ["id", "date", "mood_score", "emoji", "created_at"]
+    resp = client.get(f"/mood-entries/{user_id}", params={"fields": "slim", "after": resp.headers["X-Next-Cursor"]})
+    assert [e["mood_score"] for e in resp.json()] == [3]
+    # id and date come with any projection, in schema order
+    resp = client.get(f"/mood-entries/{user_id}", params={"fields": "notes, mood_score"})
+    assert resp.json()[0] == {"id": resp.json()[0]["id"], "date": "2025-05-01", "mood_score": 1, "notes": "A long note"}
+    resp = client.get(f"/mood-entries/{user_id}", params={"fields": "mood_score,password_hash"})
+    assert resp.status_code == 400
+    assert "password_hash" in resp.json()["detail"]
+
+    slim = client.get(f"/mood-entries/{user_id}/2025/5", params={"fields": "slim"}).json()
+    assert [e["mood_score"] for e in slim] == [1, 2, 3]
+    assert "notes" not in slim[0]
+    assert "notes" in client.get(f"/mood-entries/{user_id}/2025/5").json()[0]
+    # A write drops the cached slim month too
+    client.post("/mood-entry", params={"user_id": user_id}, json={
+        "date": "2025-05-04", "mood_score": 4, "emoji": None, "notes": None, "activities": None
+    })
+    assert len(client.get(f"/mood-entries/{user_id}/2025/5", params={"fields": "slim"}).json()) == 4
+    assert client.get(f"/mood-entries/{user_id}/2025/5", params={"fields": "emoji"}).json()[3] == {
+        "id": slim[2]["id"] + 1, "date": "2025-05-04", "emoji": None}
+
+
+def test_mood_entries_batch():
+    user_id = client.post("/register", json={
+        "username": "batchuser",
+        "email": "batchuser@example.com",
+        "password": "testpassword"
+    }).json()["user_id"]
+    items = [
+        {"date": "2025-04-01", "mood_score": 6, "emoji": "🙂", "notes": None, "activities": "work, gym"},
+        {"date": "2025-04-02", "mood_score": 11, "emoji": None, "notes": None, "activities": None},
+        {"date": "2025-04-03", "mood_score": 2, "emoji": "😢", "notes": "Rough", "activities": "work"},
+    ]
+    resp = client.post("/mood-entries/batch", params={"user_id": user_id}, json=items)
+    assert resp.status_code == 200
+    body = resp.json()
+    assert (body["created"], body["failed"]) == (2, 1)
+    assert [r["status"] for r in body["results"]] == ["created", "invalid", "created"]
+    assert body["results"][1]["errors"][0]["loc"] == ["mood_score"]
+
+    # NDJSON bodies are accepted too, with malformed lines reported per item
+    ndjson = "\n".join([json.dumps(items[0] | {"date": "2025-04-04"}), "{not json", ""])
+    resp = client.post("/mood-entries/batch", params={"user_id": user_id}, content=ndjson.encode(),
+                       headers={"Content-Type": "application/x-ndjson"})
+    assert [r["status"] for r in resp.json()["results"]] == ["created", "invalid"]
+
+    entries = client.get(f"/mood-entries/{user_id}").json()
+    assert [e["mood_score"] for e in entries] == [6, 2, 6]
+    assert [e["mood_score"] for e in client.get(f"/mood-entries/{user_id}", params={"activity": "gym"}).json()] == [6, 6]
+    stats = client.get(f"/stats/{user_id}").json()
+    assert stats["total_entries"] == 3
+    assert stats["min_score"] == 2
+    assert stats["top_activities"] == [["work", 3], ["gym", 2]]
+
+    assert client.post("/mood-entries/batch", params={"user_id": user_id}, json={"a": 1}).status_code == 400
+
+
+def test_mood_entries_batch_limits_and_conflicts(monkeypatch):
+    user_id = client.post("/register", json={
+        "username": "batchlimits",
+        "email": "batchlimits@example.com",
+        "password": "testpassword"
+    }).json()["user_id"]
+    items = [{"date": f"2025-04-0{day}", "mood_score": day, "emoji": None, "notes": None, "activities": None}
+             for day in range(1, 6)]
+
+    # An oversized batch is refused before anything is written
+    monkeypatch.setattr(fastapi_app, "MAX_BATCH_ITEMS", 4)
+    monkeypatch.setattr(fastapi_app, "BATCH_CHUNK_SIZE", 2)
+    ndjson = "\n".join(json.dumps(item) for item in items)
+    resp = client.post("/mood-entries/batch", params={"user_id": user_id}, content=ndjson.encode(),
+                       headers={"Content-Type": "application/x-ndjson"})
+    assert resp.status_code == 413
+    assert client.get(f"/mood-entries/{user_id}").json() == []
+
+    # Only the item of a chunk that repeats an existing day fails
+    connection = fastapi_app.SessionLocal.kw["bind"]
+    client.post("/mood-entry", params={"user_id": user_id}, json=items[1])
+    # Sessions join the fixture connection's transaction; end it so the chunk's
+    # rollback does not take the earlier rows with it
+    connection.commit()
+    body = client.post("/mood-entries/batch", params={"user_id": user_id}, json=items[:4]).json()
+    assert [r["status"] for r in body["results"]] == ["created", "conflict", "created", "created"]
+    assert (body["created"], body["failed"]) == (3, 1)
+    assert [e["mood_score"] for e in client.get(f"/mood-entries/{user_id}").json()] == [1, 2, 3, 4]
+    assert client.get(f"/stats/{user_id}").json()["total_entries"] == 4
+
+
+def test_response_cache_versions():
+    user_id = client.post("/register", json={
+        "username": "cacheuser",
+        "email": "cacheuser@example.com",
+        "password": "testpassword"
+    }).json()["user_id"]
+
+    def post(day, score):
+        client.post("/mood-entry", params={"user_id": user_id}, json={
+            "date": day, "mood_score": score, "emoji": None, "notes": None, "activities": None
+        })
+
+    post("2025-05-05", 8)
+    post("2025-06-01", 2)
+    assert [e["mood_score"] for e in client.get(f"/mood-entries/{user_id}/2025/5").json()] == [8]
+    assert client.get(f"/mood-entries/{user_id}/2025/5").json()[0]["mood_score"] == 8
+    assert client.get(f"/mood-entries/{user_id}/2025/6").status_code == 200
+    assert client.get(f"/stats/{user_id}").json()["total_entries"] == 2
+    cache = client.get("/health").json()["cache"]
+    assert (cache["hits"], cache["misses"]) == (1, 3)
+
+    # A write moves the user to a new stats version, which every cached read is keyed by
+    post("2025-06-02", 4)
+    assert [e["mood_score"] for e in client.get(f"/mood-entries/{user_id}/2025/6").json()] == [2, 4]
+    assert client.get(f"/stats/{user_id}").json()["total_entries"] == 3
+    client.get(f"/mood-entries/{user_id}/2025/5")
+    client.get(f"/mood-entries/{user_id}/2025/5")
+    cache = client.get("/health").json()["cache"]
+    assert (cache["hits"], cache["misses"]) == (2, 6)
+
+
+def test_cached_reads_follow_out_of_band_writes():
+    user_id = client.post("/register", json={
+        "username": "bulkcacheuser",
+        "email": "bulkcacheuser@example.com",
+        "password": "testpassword"
+    }).json()["user_id"]
+    entry = {"date": "2025-05-05", "mood_score": 8, "emoji": None, "notes": None, "activities": None}
+    client.post("/mood-entry", params={"user_id": user_id}, json=entry)
+    before = client.get(f"/stats/{user_id}")
+    assert before.json()["total_entries"] == 1
+
+    # Written like the import tool does, without going through the API
+    with fastapi_app.SessionLocal() as db:
+        crud.bulk_insert_mood_entries(db, [(user_id, MoodEntryCreate.model_validate(entry | {"date": "2025-05-06",
+                                                                                               "mood_score": 2}))])
+        db.commit()
+
+    resp = client.get(f"/stats/{user_id}", headers={"If-None-Match": before.headers["ETag"]})
+    assert resp.status_code == 200
+    assert resp.json()["total_entries"] == 2
+    assert resp.headers["ETag"] != before.headers["ETag"]
+    assert client.get(f"/stats/{user_id}", headers={"If-None-Match": resp.headers["ETag"]}).status_code == 304
+    assert [e["mood_score"] for e in client.get(f"/mood-entries/{user_id}/2025/5").json()] == [8, 2]
+
+
+def test_memory_backend_lru_and_ttl(monkeypatch):
+    backend = MemoryBackend(max_entries=2)
+    backend.set("a", 1, ttl=60)
+    backend.set("b", 2, ttl=60)
+    assert backend.get("a") == 1  # "b" becomes least recently used
+    backend.set("c", 3, ttl=60)
+    assert (backend.get("b"), backend.evictions) == (None, 1)
+
+    # Entries expire once their TTL has passed
+    monkeypatch.setattr("app.cache.time.monotonic", lambda: 10 ** 9)
+    assert backend.get("a") is None
+
+
+def test_conditional_get():
+    user_id = client.post("/register", json={
+        "username": "etaguser",
+        "email": "etaguser@example.com",
+        "password": "testpassword"
+    }).json()["user_id"]
+    client.post("/mood-entry", params={"user_id": user_id}, json={
+        "date": "2025-05-05", "mood_score": 7, "emoji": None, "notes": None, "activities": None
+    })
+
+    paths = [f"/mood-entries/{user_id}", f"/mood-entries/{user_id}/2025/5", f"/stats/{user_id}"]
+    validators = {}
+    for path in paths:
+        resp = client.get(path)
+        assert resp.status_code == 200
+        validators[path] = resp.headers["ETag"]
+        assert resp.headers["Last-Modified"].endswith("GMT")
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)  # noqa: E731
+    event.listen(fastapi_app.engine, "before_cursor_execute", listener)
+    try:
+        for path in paths:
+            resp = client.get(path, headers={"If-None-Match": validators[path]})
+            assert resp.status_code == 304
+            assert resp.content == b""
+            assert resp.headers["ETag"] == validators[path]
+    finally:
+        event.remove(fastapi_app.engine, "before_cursor_execute", listener)
+    assert not any("FROM mood_entries" in statement for statement in statements)
+
+    resp = client.get(paths[2], headers={"If-Modified-Since": resp.headers["Last-Modified"]})
+    assert resp.status_code == 304
+
+    # Any write moves the version on
+    client.post("/mood-entry", params={"user_id": user_id}, json={
+        "date": "2025-07-01", "mood_score": 3, "emoji": None, "notes": None, "activities": None
+    })
+    for path in paths:
+        resp = client.get(path, headers={"If-None-Match": validators[path]})
+        assert resp.status_code == 200
+        assert resp.headers["ETag"] != validators[path]
+
+
+def test_response_compression():
+    user_id = client.post("/register", json={
+        "username": "gzipuser",
+        "email": "gzipuser@example.com",
+        "password": "testpassword"
+    }).json()["user_id"]
+    client.post("/mood-entries/batch", params={"user_id": user_id}, json=[
+        {"date": f"2025-03-{day:02d}", "mood_score": 5, "emoji": "🙂", "notes": "Same as ever", "activities": "work"}
+        for day in range(1, 31)
+    ])
+
+    resp = client.get(f"/mood-entries/{user_id}", headers={"Accept-Encoding": "gzip"})
+    assert resp.headers["Content-Encoding"] == "gzip"
+    assert resp.headers["Vary"] == "Accept-Encoding"
+    assert int(resp.headers["Content-Length"]) < len(resp.content) / 4
+    assert len(resp.json()) == 30
+    # The weakened ETag still revalidates
+    assert resp.headers["ETag"].startswith('W/"')
+    resp = client.get(f"/mood-entries/{user_id}", headers={"Accept-Encoding": "gzip",
+                                                           "If-None-Match": resp.headers["ETag"]})
+    assert resp.status_code == 304
+
+    resp = client.get(f"/export/{user_id}", headers={"Accept-Encoding": "gzip"})
+    assert resp.headers["Content-Encoding"] == "gzip"
+    assert len(resp.text.splitlines()) == 31
+    assert "Content-Encoding" not in client.get(f"/mood-entries/{user_id}",
+                                                headers={"Accept-Encoding": "identity"}).headers
+    assert "Content-Encoding" not in client.get("/metrics", headers={"Accept-Encoding": "gzip"}).headers
+
+
+def test_analytics():
+    user_id = client.post("/register", json={
+        "username": "trenduser",
+        "email": "trenduser@example.com",
+        "password": "testpassword"
+    }).json()["user_id"]
+    assert client.get(f"/analytics/{user_id}").json()["streaks"] == {"longest": 0, "latest": 0}
+
+    # 2025-05-01 is a Thursday; 05-04 is left out to break the streak
+    items = [{"date": day, "mood_score": score, "emoji": None, "notes": None, "activities": activities}
+             for day, score, activities in (("2025-05-01", 4, "gym"), ("2025-05-02", 8, "gym, work"),
+                                            ("2025-05-03", 6, "work"), ("2025-05-05", 2, None),
+                                            ("2025-05-06", 10, "gym"))]
+    client.post("/mood-entries/batch", params={"user_id": user_id}, json=items)
+
+    data = client.get(f"/analytics/{user_id}").json()
+    assert (data["total_entries"], data["days_logged"]) == (5, 5)
+    assert [point["date"] for point in data["series"]][-2:] == ["2025-05-05", "2025-05-06"]
+    assert data["series"][1] == {"date": "2025-05-02", "mood": 8.0, "avg_7d": 6.0, "avg_30d": 6.0}
+    assert data["series"][-1]["avg_7d"] == 6.0
+    assert data["weekday_avg"] == {"Monday": 2.0, "Tuesday": 10.0, "Thursday": 4.0, "Friday": 8.0, "Saturday": 6.0}
+    assert data["month_avg"] == {"5": 6.0}
+    assert data["volatility"] == {"daily_std": 3.162, "mean_abs_change": 4.5}
+    assert data["streaks"] == {"longest": 3, "latest": 2}
+    assert data["activity_lift"] == [
+        {"activity": "gym", "count": 3, "avg_with": 7.333, "lift": 3.333},
+        {"activity": "work", "count": 2, "avg_with": 7.0, "lift": 1.667},
+    ]
+
+    # Writes invalidate the cached analytics
+    client.post("/mood-entry", params={"user_id": user_id}, json={
+        "date": "2025-05-07", "mood_score": 6, "emoji": None, "notes": None, "activities": None
+    })
+    assert client.get(f"/analytics/{user_id}").json()["streaks"] == {"longest": 3, "latest": 3}
+
+
+def test_mood_series():
+    user_id = client.post("/register", json={
+        "username": "seriesuser",
+        "email": "seriesuser@example.com",
+        "password": "testpassword"
+    }).json()["user_id"]
+    items = [{"date": day, "mood_score": score, "emoji": None, "notes": None, "activities": None}
+             for day, score in (("2025-05-01", 4), ("2025-05-02", 8), ("2025-05-05", 2), ("2025-05-06", 10),
+                                ("2025-06-10", 6))]
+    client.post("/mood-entries/batch", params={"user_id": user_id}, json=items)
+
+    def series(**params):
+        resp = client.get(f"/mood-series/{user_id}", params=params)
+        assert resp.status_code == 200, resp.text
+        return [(p["period"], p["avg_score"], p["min_score"], p["max_score"], p["count"]) for p in resp.json()]
+
+    assert len(series()) == 5
+    assert series(**{"from": "2025-05-02", "to": "2025-05-05"}) == [
+        ("2025-05-02", 8.0, 8, 8, 1), ("2025-05-05", 2.0, 2, 2, 1)]
+    # Weeks start on Monday: 2025-05-01 is a Thursday
+    assert series(bucket="week") == [
+        ("2025-04-28", 6.0, 4, 8, 2), ("2025-05-05", 6.0, 2, 10, 2), ("2025-06-09", 6.0, 6, 6, 1)]
+    assert series(bucket="month") == [("2025-05-01", 6.0, 2, 10, 4), ("2025-06-01", 6.0, 6, 6, 1)]
+
+    # LTTB keeps the end points and the extremes between them
+    downsampled = series(points=3)
+    assert [p[0] for p in downsampled] == ["2025-05-01", "2025-05-06", "2025-06-10"]
+
+    assert client.get(f"/mood-series/{user_id}", params={"from": "2025-06-01", "to": "2025-05-01"}).status_code == 400
+    assert client.get(f"/mood-series/{user_id}", params={"bucket": "year"}).status_code == 422
+    assert client.get(f"/mood-series/{user_id}", params={"points": 2}).status_code == 422
+
+
+def test_admin_rollups(monkeypatch):
+    user_id = client.post("/register", json={
+        "username": "rollupuser",
+        "email": "rollupuser@example.com",
+        "password": "testpassword"
+    }).json()["user_id"]
+    for day, score in (("2025-05-05", 4), ("2025-05-06", 8), ("2025-05-12", 6)):
+        client.post("/mood-entry", params={"user_id": user_id}, json={
+            "date": day, "mood_score": score, "emoji": "🙂", "notes": None, "activities": "work"
+        })
+
+    assert client.get("/admin/rollups/daily").status_code == 403
+    monkeypatch.setattr(fastapi_app, "ADMIN_TOKEN", "secret")
+    assert client.get("/admin/rollups/daily").status_code == 401
+    assert client.get("/admin/rollups/daily", headers={"X-Admin-Token": "wrong"}).status_code == 401
+
+    headers = {"X-Admin-Token": "secret"}
+    resp = client.post("/admin/rollups/run", params={"lag": 0}, headers=headers)
+    assert resp.json()["processed"] == 3
+    assert resp.json()["state"]["rows_processed"] == 3
+    assert client.post("/admin/rollups/run", params={"lag": 0}, headers=headers).json()["processed"] == 0
+
+    daily = client.get("/admin/rollups/daily", params={"from": "2025-05-06"}, headers=headers).json()
+    assert [(d["day"], d["avg_score"]) for d in daily] == [("2025-05-06", 8.0), ("2025-05-12", 6.0)]
+    weekly = client.get("/admin/rollups/weekly", headers=headers).json()
+    assert [(w["week_start"], w["entry_count"], w["avg_score"]) for w in weekly] == [
+        ("2025-05-05", 2, 6.0), ("2025-05-12", 1, 6.0)]
+    assert weekly[0]["emoji_counts"] == {"🙂": 2}
+    assert weekly[0]["top_activities"] == [["work", 2]]
+
+
+def test_search_mood_entries(monkeypatch):
+    user_ids = [client.post("/register", json={
+        "username": f"searchuser{i}",
+        "email": f"searchuser{i}@example.com",
+        "password": "testpassword"
+    }).json()["user_id"] for i in range(2)]
+    for user_id, day, notes in ((user_ids[0], "2025-05-01", "Long walk in the park with friends"),
+                                (user_ids[0], "2025-05-02", "Stressful meeting at work"),
+                                (user_ids[0], "2025-05-03", "Walked the dog, then work, work, work"),
+                                (user_ids[1], "2025-05-01", "A walk nobody else should see")):
+        client.post("/mood-entry", params={"user_id": user_id}, json={
+            "date": day, "mood_score": 5, "emoji": None, "notes": notes, "activities": None
+        })
+
+    def search(**params):
+        resp = client.get(f"/mood-entries/{user_ids[0]}/search", params=params)
+        assert resp.status_code == 200, resp.text
+        return resp.json()
+
+    # The last term also matches as a prefix
+    hits = search(q="walk")
+    assert sorted(hit["date"] for hit in hits) == ["2025-05-01", "2025-05-03"]
+    assert {hit["snippet"] for hit in hits} == {"Long [walk] in the park with friends",
+                                                "[Walked] the dog, then work, work, work"}
+    # Every term has to match; the note mentioning work most often ranks first
+    assert [hit["date"] for hit in search(q="work")] == ["2025-05-03", "2025-05-02"]
+    assert [hit["date"] for hit in search(q="walked, work!")] == ["2025-05-03"]
+    assert [hit["date"] for hit in search(q="work", limit=1, offset=1)] == ["2025-05-02"]
+    assert search(q='"(*') == []
+    assert client.get(f"/mood-entries/{user_ids[0]}/search").status_code == 422
+
+    # The index follows edits made through MoodEntry.update
+    client.post("/mood-entry", params={"user_id": user_ids[0], "upsert": True}, json={
+        "date": "2025-05-02", "mood_score": 5, "emoji": None, "notes": "Relaxing evening", "activities": None
+    })
+    assert search(q="meeting") == []
+    assert [hit["date"] for hit in search(q="relax")] == ["2025-05-02"]
+
+    # Without a full-text index, search falls back to LIKE
+    monkeypatch.setattr("app.crud.has_search_index", lambda connection: False)
+    hits = search(q="walk")
+    assert [hit["snippet"] for hit in hits] == ["[Walk]ed the dog, then work, work, work",
+                                                "Long [walk] in the park with friends"]
+
+
+def test_export(monkeypatch):
+    user_id = client.post("/register", json={
+        "username": "exportuser",
+        "email": "exportuser@example.com",
+        "password": "testpassword"
+    }).json()["user_id"]
+    items = [{"date": day, "mood_score": score, "emoji": "🙂", "notes": notes, "activities": "work"}
+             for day, score, notes in (("2025-05-01", 4, 'Said "no", then left'), ("2025-05-02", 8, None),
+                                       ("2025-05-03", 6, "Line one\nline two"))]
+    client.post("/mood-entries/batch", params={"user_id": user_id}, json=items)
+
+    resp = client.get(f"/export/{user_id}")
+    assert resp.headers["content-type"].startswith("text/csv")
+    assert resp.headers["content-disposition"] == f'attachment; filename="mood-diary-{user_id}.csv"'
+    rows = list(csv.DictReader(io.StringIO(resp.text)))
+    assert [(r["date"], r["mood_score"], r["notes"]) for r in rows] == [
+        ("2025-05-01", "4", 'Said "no", then left'), ("2025-05-02", "8", ""), ("2025-05-03", "6", "Line one\nline two")]
+
+    resp = client.get(f"/export/{user_id}", params={"format": "ndjson", "from": "2025-05-02", "to": "2025-05-02"})
+    assert [json.loads(line)["mood_score"] for line in resp.text.splitlines()] == [8]
+    assert client.get(f"/export/{user_id}", params={"from": "2025-06-01"}).text.splitlines() == [
+        "id,date,mood_score,emoji,notes,activities,user_id,created_at"]
+    assert client.get(f"/export/{user_id}", params={"from": "2025-06-01", "to": "2025-05-01"}).status_code == 400
+    assert client.get(f"/export/{user_id}", params={"format": "xml"}).status_code == 422
+
+    monkeypatch.setattr("app.export.parquet_available", lambda: False)
+    assert client.get(f"/export/{user_id}", params={"format": "parquet"}).status_code == 501
+
+
+def test_export_parquet(monkeypatch):
+    pq = pytest.importorskip("pyarrow.parquet")
+    user_id = client.post("/register", json={
+        "username": "parquetuser",
+        "email": "parquetuser@example.com",
+        "password": "testpassword"
+    }).json()["user_id"]
+    items = [{"date": f"2025-05-{day:02d}", "mood_score": day % 10 + 1, "emoji": None, "notes": f"Day {day}",
+              "activities": None} for day in range(1, 26)]
+    client.post("/mood-entries/batch", params={"user_id": user_id}, json=items)
+    # Five rows per row group
+    monkeypatch.setitem(fastapi_app.export.BATCH_SIZE, "parquet", 5)
+
+    resp = client.get(f"/export/{user_id}", params={"format": "parquet", "to": "2025-05-22"})
+    assert resp.status_code == 200
+    parquet = pq.ParquetFile(io.BytesIO(resp.content))
+    assert parquet.metadata.num_row_groups == 5
+    table = parquet.read()
+    assert table.num_rows == 22
+    assert table.column("notes").to_pylist()[-1] == "Day 22"
+    assert str(table.column("date").to_pylist()[0]) == "2025-05-01"
+
+
+def test_metrics_and_server_timing():
+    # An app of its own, so the counters start at zero
+    client = TestClient(fastapi_app.create_app())
+    user_id = client.post("/register", json={
+        "username": "metricsuser",
+        "email": "metricsuser@example.com",
+        "password": "testpassword"
+    }).json()["user_id"]
+    resp = client.get(f"/stats/{user_id}")
+    assert re.fullmatch(r'db;dur=[\d.]+;desc="\d+ queries", app;dur=[\d.]+, total;dur=[\d.]+',
+                        resp.headers["server-timing"])
+    client.get("/no-such-route")
+
+    resp = client.get("/metrics")
+    assert resp.headers["content-type"].startswith("text/plain; version=0.0.4")
+    lines = resp.text.splitlines()
+    assert 'mood_diary_http_requests_total{method="GET",route="/stats/{user_id}",status="200"} 1' in lines
+    assert 'mood_diary_http_requests_total{method="GET",route="unmatched",status="404"} 1' in lines
+    queries = [line for line in lines if line.startswith('mood_diary_db_queries_total{method="GET",route="/stats')]
+    assert queries and int(queries[0].split()[-1]) > 0
+    assert any(line.startswith("mood_diary_password_hash_workers ") for line in lines)
+    assert any(line.startswith("mood_diary_cache_misses_total ") for line in lines)
@@ -0,0 +1,79 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+import app.fastapi_app as fastapi_app
+from app.cache import MemoryBackend, ResponseCache
+from app.database import get_engine_and_session, resolve_database_url
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    # aiosqlite connections are bound to an event loop, so the whole test runs
+    # inside one TestClient context (which also runs the lifespan create_all)
+    test_engine, TestingSessionLocal = get_engine_and_session(f"sqlite+aiosqlite:///{tmp_path / 'async.db'}")
+    assert isinstance(test_engine, AsyncEngine)
+    monkeypatch.setattr(fastapi_app, "engine", test_engine)
+    monkeypatch.setattr(fastapi_app, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(fastapi_app, "response_cache", ResponseCache(MemoryBackend()))
+    with TestClient(fastapi_app.create_app()) as test_client:
+        yield test_client
+        test_client.portal.call(test_engine.dispose)
+
+
+def test_mood_entry_flow_async(client):
+    resp = client.post("/register", json={
+        "username": "asyncuser",
+        "email": "asyncuser@example.com",
+        "password": "asyncpass"
+    })
+    assert resp.status_code == 201
+    user_id = resp.json()["user_id"]
+
+    resp = client.post("/login", json={"username": "asyncuser", "password": "asyncpass"})
+    assert resp.json()["user_id"] == user_id
+    assert client.post("/login", json={"username": "asyncuser", "password": "wrongpass"}).status_code == 401
+
+    for day, score in (("2025-05-05", 8), ("2025-05-06", 4), ("2025-06-01", 6)):
+        resp = client.post("/mood-entry", params={"user_id": user_id}, json={
+            "date": day,
+            "mood_score": score,
+            "emoji": "😀",
+            "notes": "Async day",
+            "activities": "work, gym"
+        })
+        assert resp.status_code == 200
+
+    assert len(client.get(f"/mood-entries/{user_id}").json()) == 3
+    assert len(client.get(f"/mood-entries/{user_id}/stream").text.splitlines()) == 3
+    assert [e["mood_score"] for e in client.get(f"/mood-entries/{user_id}/2025/5").json()] == [8, 4]
+    stats = client.get(f"/stats/{user_id}").json()
+    assert (stats["total_entries"], stats["avg_score"]) == (3, 6)
+    assert stats["top_activities"] == [["work", 3], ["gym", 3]]
+
+
+def test_database_async_flag(monkeypatch):
+    monkeypatch.setenv("DATABASE_ASYNC", "1")
+    assert resolve_database_url("sqlite:///./x.db").drivername == "sqlite+aiosqlite"
+    assert resolve_database_url("postgresql://u@h/db").drivername == "postgresql+asyncpg"
+    assert resolve_database_url("sqlite+aiosqlite:///./x.db", use_async=False).drivername == "sqlite"
+
+
+def test_sqlite_engine_settings(monkeypatch, tmp_path):
+    monkeypatch.setenv("DB_POOL_SIZE", "3")
+    monkeypatch.setenv("SQLITE_BUSY_TIMEOUT_MS", "2500")
+    engine, _ = get_engine_and_session(f"sqlite:///{tmp_path / 'wal.db'}")
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 1  # NORMAL
+        assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == 2500
+        assert conn.exec_driver_sql("PRAGMA cache_size").scalar() == -64000
+    assert engine.pool.size() == 3
+    engine.dispose()
+
+    # In-memory databases keep their default journal and pool
+    engine, _ = get_engine_and_session("sqlite:///:memory:", use_async=False)
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "memory"
+        assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == 2500
+    engine.dispose()
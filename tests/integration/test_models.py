@@ -1,13 +1,25 @@
-from datetime import date, timezone
+import json
+from datetime import date, datetime, timedelta, timezone
 
 import pytest
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, insert, inspect, select, text
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import sessionmaker
 
 from app.models import Base
-from app.models.mood_entry import MoodEntry
+from app.models.activity import Activity, mood_entry_activities
+from app.models.import_batch import ImportedBatch
+from app.models.mood_entry import UNIQUE_DAILY_ENTRY_INDEX, MoodEntry
+from app.models.rollup import DailyMoodRollup, RollupState, WeeklyMoodRollup
+from app.models.search import FTS_TABLE
 from app.models.user import User
+from app.models.user_stats import UserStats
+from app.tools.import_diary import Checkpoint, import_batch, import_file, read_records
+from app.tools.import_diary import main as import_main
+from app.tools.migrate import (add_columns, backfill_activities, create_indexes, create_search_index,
+                               dedupe_daily_entries)
+from app.tools.rebuild_stats import rebuild_user_stats
+from app.tools.rollup import reset_rollups, run_rollups
 
 TEST_DATABASE_URL = "sqlite:///:memory:"
 
@@ -69,7 +81,7 @@ def test_mood_entry_creation(db_session):
     # Test with all fields
     mood_entry_full = MoodEntry(
         user_id=user.id,
-        date=date(2024, 3, 15),
+        date=date(2024, 3, 16),
         mood_score=8,
         emoji="😊",
         notes="Great day!",
@@ -85,7 +97,7 @@ def test_mood_entry_creation(db_session):
     assert retrieved_entry.emoji == "😊"
     assert retrieved_entry.notes == "Great day!"
     assert retrieved_entry.activities == "work, gym"
-    assert retrieved_entry.date == date(2024, 3, 15)
+    assert retrieved_entry.date == date(2024, 3, 16)
     
     # Test string representation
     assert str(retrieved_entry) == f'<MoodEntry {retrieved_entry.date} score:8>'
@@ -103,7 +115,7 @@ def test_mood_entry_validation(db_session):
     for score in valid_scores:
         mood_entry = MoodEntry(
             user_id=user.id,
-            date=date(2024, 3, 15),
+            date=date(2024, 3, score),
             mood_score=score
         )
         db_session.add(mood_entry)
@@ -113,7 +125,7 @@ def test_mood_entry_validation(db_session):
     # Test update method
     mood_entry = MoodEntry(
         user_id=user.id,
-        date=date(2024, 3, 15),
+        date=date(2024, 3, 16),
         mood_score=5
     )
     db_session.add(mood_entry)
@@ -201,6 +213,8 @@ def test_mood_entry_methods(db_session):
     ).first()
     assert specific_entry is not None
     assert specific_entry.mood_score == 8
+    # notes is deferred: not loaded with the row, but on first access
+    assert "notes" in inspect(specific_entry).unloaded
     assert specific_entry.notes == "First entry"
     
     # Test entry not found
@@ -249,4 +263,350 @@ def test_mood_entry_date_handling(db_session):
     
     # Test date comparison
     assert retrieved_entry.date < date(2024, 3, 16)
-    assert retrieved_entry.date > date(2024, 3, 14) 
\ No newline at end of file
+    assert retrieved_entry.date > date(2024, 3, 14)
+
+
+def test_user_stats_maintained_on_write(db_session):
+    user = User(username="statsuser", email="stats@example.com")
+    user.set_password("password123")
+    db_session.add(user)
+    db_session.commit()
+
+    db_session.add_all([
+        MoodEntry(user_id=user.id, date=date(2024, 3, 1), mood_score=8, emoji="😊", activities="work, gym"),
+        MoodEntry(user_id=user.id, date=date(2024, 3, 2), mood_score=4, emoji="😢", activities="work"),
+    ])
+    db_session.commit()
+
+    stats = db_session.get(UserStats, user.id)
+    assert stats.entry_count == 2
+    assert stats.score_sum == 12
+    assert (stats.min_score, stats.max_score) == (4, 8)
+    assert stats.emoji_counts == {"😊": 1, "😢": 1}
+    assert stats.activity_counts == {"work": 2, "gym": 1}
+
+    # Updating an entry replaces its contribution, including min/max
+    entry = db_session.query(MoodEntry).filter_by(user_id=user.id, mood_score=4).first()
+    entry.update(mood_score=9, emoji="😊", activities="reading")
+    db_session.commit()
+
+    stats = db_session.get(UserStats, user.id)
+    assert stats.entry_count == 2
+    assert stats.score_sum == 17
+    assert (stats.min_score, stats.max_score) == (8, 9)
+    assert stats.emoji_counts == {"😊": 2}
+    assert stats.activity_counts == {"work": 1, "gym": 1, "reading": 1}
+    assert stats.matches(UserStats.compute(db_session, user.id))
+    # One version per committed change set
+    assert stats.version == 2
+    assert stats.updated_at is not None
+
+def test_rebuild_user_stats(db_session):
+    user = User(username="rebuilduser", email="rebuild@example.com")
+    user.set_password("password123")
+    db_session.add(user)
+    db_session.commit()
+    db_session.add(MoodEntry(user_id=user.id, date=date(2024, 3, 1), mood_score=6, activities="yoga"))
+    db_session.commit()
+
+    # Simulate drift in the live table
+    stats = db_session.get(UserStats, user.id)
+    stats.entry_count = 5
+    db_session.commit()
+
+    assert rebuild_user_stats(db_session, check=True) == [user.id]
+    assert db_session.get(UserStats, user.id).entry_count == 5
+
+    assert rebuild_user_stats(db_session) == [user.id]
+    assert db_session.get(UserStats, user.id).entry_count == 1
+    assert rebuild_user_stats(db_session, check=True) == []
+
+def test_activities_normalized(db_session):
+    user = User(username="activityuser", email="activity@example.com")
+    user.set_password("password123")
+    db_session.add(user)
+    db_session.commit()
+
+    entry = MoodEntry(user_id=user.id, date=date(2024, 3, 1), mood_score=7, activities="work, gym, work")
+    other = MoodEntry(user_id=user.id, date=date(2024, 3, 2), mood_score=5, activities="gym")
+    db_session.add_all([entry, other])
+    db_session.commit()
+
+    # Activities are per user and shared between entries
+    assert [a.name for a in entry.linked_activities] == ["work", "gym"]
+    assert other.linked_activities[0] is entry.linked_activities[1]
+    assert db_session.query(Activity).filter_by(user_id=user.id).count() == 2
+
+    entry.update(activities="reading")
+    db_session.commit()
+    assert [a.name for a in entry.linked_activities] == ["reading"]
+    assert db_session.get(UserStats, user.id).activity_counts == {"gym": 1, "reading": 1}
+    assert entry.activities == "reading"
+
+def test_backfill_activities(db_session):
+    user = User(username="legacyuser", email="legacy@example.com")
+    user.set_password("password123")
+    db_session.add(user)
+    db_session.commit()
+
+    # Rows written before the normalized tables existed have no links
+    db_session.execute(insert(MoodEntry), [
+        {"user_id": user.id, "date": date(2024, 3, 1), "mood_score": 6, "activities": "walking, music"},
+        {"user_id": user.id, "date": date(2024, 3, 2), "mood_score": 8, "activities": "music"},
+        {"user_id": user.id, "date": date(2024, 3, 3), "mood_score": 4, "activities": None},
+    ])
+    db_session.commit()
+    assert db_session.execute(select(mood_entry_activities)).all() == []
+
+    assert backfill_activities(db_session, batch_size=2) == 3
+    assert backfill_activities(db_session) == 0
+    assert UserStats.compute(db_session, user.id).activity_counts == {"walking": 1, "music": 2}
+    # Cached reads are keyed by the stats version, so the backfill moves it on
+    assert db_session.get(UserStats, user.id).version > 0
+
+
+def test_dedupe_daily_entries(db_session):
+    user = User(username="dupeuser", email="dupe@example.com")
+    user.set_password("password123")
+    db_session.add(user)
+    db_session.commit()
+    # A database from before the unique index, which create_indexes leaves alone
+    db_session.execute(text(f"DROP INDEX {UNIQUE_DAILY_ENTRY_INDEX}"))
+    assert create_indexes(db_session) == []
+    db_session.add_all([
+        MoodEntry(user_id=user.id, date=date(2024, 3, 1), mood_score=3, activities="work"),
+        MoodEntry(user_id=user.id, date=date(2024, 3, 1), mood_score=9, activities="gym"),
+        MoodEntry(user_id=user.id, date=date(2024, 3, 2), mood_score=5),
+    ])
+    db_session.commit()
+
+    assert dedupe_daily_entries(db_session) == 1
+    assert MoodEntry.get_entry_by_date(db_session, user.id, date(2024, 3, 1)).mood_score == 9
+    assert len(MoodEntry.get_monthly_entries(db_session, user.id, 2024, 3)) == 2
+    stats = db_session.get(UserStats, user.id)
+    assert stats.matches(UserStats.compute(db_session, user.id))
+    assert stats.activity_counts == {"gym": 1}
+
+    # The unique index now rejects a second entry for the same day
+    db_session.add(MoodEntry(user_id=user.id, date=date(2024, 3, 2), mood_score=1))
+    with pytest.raises(IntegrityError):
+        db_session.commit()
+    db_session.rollback()
+    assert dedupe_daily_entries(db_session) == 0
+
+
+def test_add_columns(db_session):
+    user = User(username="columnuser", email="column@example.com")
+    user.set_password("password123")
+    db_session.add(user)
+    db_session.commit()
+    db_session.add(MoodEntry(user_id=user.id, date=date(2024, 3, 1), mood_score=6))
+    db_session.commit()
+    # A user_stats table from before the version columns existed
+    db_session.execute(text("ALTER TABLE user_stats DROP COLUMN version"))
+    db_session.execute(text("ALTER TABLE user_stats DROP COLUMN updated_at"))
+    db_session.commit()
+
+    assert add_columns(db_session) == ["user_stats.version", "user_stats.updated_at"]
+    assert {"version", "updated_at"} <= {c["name"] for c in inspect(db_session.connection()).get_columns("user_stats")}
+    db_session.expire_all()
+    assert db_session.get(UserStats, user.id).version == 0
+    assert add_columns(db_session) == []
+
+
+def test_rollups_incremental(db_session):
+    users = [User(username=f"rollup{i}", email=f"rollup{i}@example.com") for i in range(2)]
+    for user in users:
+        user.set_password("password123")
+    db_session.add_all(users)
+    db_session.commit()
+    # Entries sharing a created_at straddle a batch boundary, so the id has to break the tie
+    written = datetime(2024, 3, 6, 12, 0)
+    db_session.execute(insert(MoodEntry), [
+        {"user_id": users[0].id, "date": date(2024, 3, 4), "mood_score": 6, "emoji": "😀", "activities": "work, gym",
+         "created_at": written},
+        {"user_id": users[1].id, "date": date(2024, 3, 4), "mood_score": 8, "emoji": "😀", "activities": "gym",
+         "created_at": written},
+        {"user_id": users[0].id, "date": date(2024, 3, 6), "mood_score": 4, "emoji": "😢", "activities": None,
+         "created_at": written},
+    ])
+    db_session.commit()
+
+    assert run_rollups(db_session, batch_size=2, lag=timedelta(0)) == 3
+    assert run_rollups(db_session, lag=timedelta(0)) == 0
+    assert [r.to_dict() for r in db_session.query(DailyMoodRollup).order_by(DailyMoodRollup.day)] == [
+        {"day": "2024-03-04", "entry_count": 2, "avg_score": 7.0},
+        {"day": "2024-03-06", "entry_count": 1, "avg_score": 4.0},
+    ]
+    week = db_session.get(WeeklyMoodRollup, date(2024, 3, 4))
+    assert (week.entry_count, week.emoji_counts, week.activity_counts) == (3, {"😀": 2, "😢": 1}, {"work": 1, "gym": 2})
+
+    # The default lag holds back the entry just written; without it only that entry is read
+    db_session.add(MoodEntry(user_id=users[1].id, date=date(2024, 3, 10), mood_score=10, emoji="😀"))
+    db_session.commit()
+    assert run_rollups(db_session) == 0
+    assert run_rollups(db_session, lag=timedelta(0)) == 1
+    db_session.expire_all()
+    assert db_session.get(WeeklyMoodRollup, date(2024, 3, 4)).to_dict()["avg_score"] == 7.0
+    assert db_session.get(RollupState, "mood_entries").rows_processed == 4
+
+    reset_rollups(db_session)
+    assert run_rollups(db_session, lag=timedelta(0)) == 4
+    assert db_session.get(WeeklyMoodRollup, date(2024, 3, 4)).to_dict() == {
+        "week_start": "2024-03-04", "entry_count": 4, "avg_score": 7.0, "emoji_counts": {"😀": 3, "😢": 1},
+        "top_activities": [("gym", 2), ("work", 1)],
+    }
+
+
+def test_create_search_index(db_session):
+    user = User(username="searchuser", email="search@example.com")
+    user.set_password("password123")
+    db_session.add(user)
+    db_session.commit()
+    # Entries written before the index existed
+    db_session.execute(text(f"DROP TABLE {FTS_TABLE}"))
+    db_session.execute(text(f"DROP TRIGGER {FTS_TABLE}_ai"))
+    db_session.add(MoodEntry(user_id=user.id, date=date(2024, 3, 1), mood_score=6, notes="Quiet morning"))
+    db_session.commit()
+
+    assert create_search_index(db_session) is True
+    match = text(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH 'quiet'")
+    assert db_session.execute(match).scalars().all() == [1]
+    db_session.add(MoodEntry(user_id=user.id, date=date(2024, 3, 2), mood_score=6, notes="Quiet evening"))
+    db_session.commit()
+    assert db_session.execute(match).scalars().all() == [1, 2]
+
+
+def test_import_diary(tmp_path, capsys):
+    # Workers use their own sessions, so the database has to be a file
+    database_url = f"sqlite:///{tmp_path / 'import.db'}"
+    engine = create_engine(database_url)
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(bind=engine)
+    with SessionLocal() as db:
+        users = [User(username=f"importer{i}", email=f"importer{i}@example.com") for i in range(2)]
+        for user in users:
+            user.set_password("password123")
+        db.add_all(users)
+        db.commit()
+        user_ids = [user.id for user in users]
+
+    source = tmp_path / "diary.csv"
+    rows = ["date,mood_score,emoji,notes,activities,user_id"]
+    rows += [f"2024-01-{day:02d},{day % 10 + 1},🙂,\"Day {day}, fine\",work,{user_ids[day % 2]}" for day in range(1, 21)]
+    rows[5] = "2024-01-05,11,🙂,,,1"  # score out of range
+    rows[7] = "2024-01-07,5,,,,999"  # unknown user
+    source.write_text("\n".join(rows) + "\n", encoding="utf-8")
+
+    # An interrupted run: the first two batches of four are already committed
+    checkpoint = Checkpoint(f"{source}.checkpoint", str(source), batch_size=4)
+    with SessionLocal() as db:
+        for batch in (0, 1):
+            records = list(read_records(str(source), "csv"))[batch * 4:(batch + 1) * 4]
+            imported, errors = import_batch(db, records)
+            checkpoint.commit(batch, imported, len(errors))
+
+    argv = [str(source), "--batch-size", "100", "--workers", "2", "--database-url", database_url]
+    assert import_main(argv) == 0
+    out, err = capsys.readouterr()
+    assert "Resuming after 2 batches of 4 rows" in out
+    assert "Imported rows: 12 in" in out and "(+2 from the checkpoint)" in out
+    assert err == ""  # both bad rows were in the resumed batches
+    state = json.loads((tmp_path / "diary.csv.checkpoint").read_text())
+    assert (state["done"], state["imported"], state["invalid"], state["finished"]) == (5, 18, 2, True)
+
+    with SessionLocal() as db:
+        assert db.query(MoodEntry).count() == 18
+        assert db.get(UserStats, user_ids[0]).entry_count == 10
+        assert db.query(mood_entry_activities).count() == 18
+        assert db.query(MoodEntry).filter_by(date=date(2024, 1, 2)).one().notes == "Day 2, fine"
+    assert import_main(argv) == 0
+    assert "Already imported: 18 rows" in capsys.readouterr().out
+
+    # --user-id overrides the column; rejected rows are reported by record number
+    with SessionLocal() as db:
+        db.execute(text("DELETE FROM mood_entry_activities"))
+        db.execute(text("DELETE FROM mood_entries"))
+        db.commit()
+    assert import_main(argv + ["--restart", "--user-id", str(user_ids[1])]) == 0
+    out, err = capsys.readouterr()
+    assert "Imported rows: 19 in" in out
+    assert err.splitlines() == ["Skipped record 5: mood_score: Input should be less than or equal to 10"]
+    engine.dispose()
+
+
+def test_import_diary_batch_committed_before_checkpoint(tmp_path, capsys):
+    database_url = f"sqlite:///{tmp_path / 'import.db'}"
+    engine = create_engine(database_url)
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(bind=engine)
+    with SessionLocal() as db:
+        user = User(username="crashimporter", email="crashimporter@example.com")
+        user.set_password("password123")
+        db.add(user)
+        db.commit()
+        user_id = user.id
+        # Written before user_stats existed, so the import creates the user's row
+        db.execute(insert(MoodEntry), [{"user_id": user_id, "date": date(2024, 1, 31), "mood_score": 9}])
+        db.commit()
+    source = tmp_path / "diary.ndjson"
+    source.write_text("".join(json.dumps({"date": f"2024-02-{day:02d}", "mood_score": 5, "emoji": None, "notes": None,
+                                          "activities": None, "user_id": user_id}) + "\n"
+                              for day in range(1, 7)), encoding="utf-8")
+
+    # The first batch committed, but the run died before the checkpoint was saved
+    checkpoint = Checkpoint(f"{source}.checkpoint", str(source), batch_size=3)
+    checkpoint.save()
+    with SessionLocal() as db:
+        records = list(read_records(str(source), "ndjson"))[:3]
+        assert import_batch(db, records, marker=ImportedBatch(import_id=checkpoint.import_id, batch=0))[0] == 3
+
+    assert import_main([str(source), "--database-url", database_url]) == 0
+    assert "Imported rows: 6 in" in capsys.readouterr().out
+    with SessionLocal() as db:
+        assert db.query(MoodEntry).count() == 7
+        assert db.get(UserStats, user_id).to_dict()["total_entries"] == 7
+        assert db.get(UserStats, user_id).max_score == 9
+
+    # --restart is a new import, which writes every batch again
+    with SessionLocal() as db:
+        db.query(MoodEntry).filter(MoodEntry.date >= date(2024, 2, 1)).delete()
+        db.commit()
+    assert import_main([str(source), "--restart", "--database-url", database_url]) == 0
+    with SessionLocal() as db:
+        assert db.query(MoodEntry).count() == 7
+    engine.dispose()
+
+
+def test_import_diary_crash_before_first_checkpoint(tmp_path, monkeypatch):
+    database_url = f"sqlite:///{tmp_path / 'import.db'}"
+    engine = create_engine(database_url)
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(bind=engine)
+    with SessionLocal() as db:
+        user = User(username="earlycrash", email="earlycrash@example.com")
+        user.set_password("password123")
+        db.add(user)
+        db.commit()
+        user_id = user.id
+    source = tmp_path / "diary.ndjson"
+    source.write_text("".join(json.dumps({"date": f"2024-02-{day:02d}", "mood_score": 5, "emoji": None, "notes": None,
+                                          "activities": None, "user_id": user_id}) + "\n"
+                              for day in range(1, 7)), encoding="utf-8")
+
+    # The batch commits, then the run dies before its first checkpoint update
+    def crash(self, batch, imported, invalid):
+        raise KeyboardInterrupt
+    monkeypatch.setattr(Checkpoint, "commit", crash)
+    with pytest.raises(KeyboardInterrupt):
+        import_file(SessionLocal, str(source), Checkpoint(f"{source}.checkpoint", str(source), batch_size=6))
+    monkeypatch.undo()
+    with SessionLocal() as db:
+        assert db.query(MoodEntry).count() == 6
+
+    # The import id was saved up front, so the rerun finds the batch's marker
+    assert import_main([str(source), "--batch-size", "6", "--database-url", database_url]) == 0
+    with SessionLocal() as db:
+        assert db.query(MoodEntry).count() == 6
+        assert db.get(UserStats, user_id).entry_count == 6
+    engine.dispose()
@@ -55,16 +55,26 @@ class MoodDiaryUser(HttpUser):
                 "notes": notes,
                 "activities": activities
             },
-            params={"user_id": self.user_id}
+            # One entry per day: later posts today replace the first
+            params={"user_id": self.user_id, "upsert": True}
         )
 
     @task(2)
     def get_mood_entries(self):
-        # get all mood entries for the user
+        # page through the user's entries, then stream them all as NDJSON
         if not self.user_id:
             return
 
-        self.client.get(f"/mood-entries/{self.user_id}")
+        params = {"limit": 20}
+        for _ in range(5):
+            response = self.client.get(f"/mood-entries/{self.user_id}", params=params,
+                                       name="/mood-entries/[user_id]")
+            next_cursor = response.headers.get("X-Next-Cursor")
+            if not next_cursor:
+                break
+            params["after"] = next_cursor
+
+        self.client.get(f"/mood-entries/{self.user_id}/stream", name="/mood-entries/[user_id]/stream")
 
     @task(1)
     def get_monthly_entries(self):
@@ -1,11 +1,23 @@
 import pytest
+import streamlit as st
+
+
+@pytest.fixture(autouse=True)
+def clear_fetch_cache():
+    # fetch_json results are memoised across tests just like across reruns
+    st.cache_data.clear()
 
 
 @pytest.fixture
 def mock_requests(mocker):
-    return mocker.patch('requests.post')
+    return mocker.patch('app.streamlit_frontend.api_client.client.post')
 
 
 @pytest.fixture
 def mock_post(mocker):
-    return mocker.patch('requests.post')
+    return mocker.patch('app.streamlit_frontend.api_client.client.post')
+
+
+@pytest.fixture
+def mock_get(mocker):
+    return mocker.patch('app.streamlit_frontend.api_client.client.get')
@@ -0,0 +1,43 @@
+from app.streamlit_frontend.logic.analytics import show_analytics
+
+
+def test_analytics_rendering(mocker, mock_get):
+    mock_response = mocker.Mock()
+    mock_response.status_code = 200
+    mock_response.json.return_value = {
+        "total_entries": 3,
+        "days_logged": 3,
+        "series": [
+            {"date": "2025-05-01", "mood": 4.0, "avg_7d": 4.0, "avg_30d": 4.0},
+            {"date": "2025-05-02", "mood": 8.0, "avg_7d": 6.0, "avg_30d": 6.0},
+            {"date": "2025-05-03", "mood": 6.0, "avg_7d": 6.0, "avg_30d": 6.0},
+        ],
+        "weekday_avg": {"Thursday": 4.0, "Friday": 8.0, "Saturday": 6.0},
+        "month_avg": {"5": 6.0},
+        "volatility": {"daily_std": 2.0, "mean_abs_change": 3.0},
+        "streaks": {"longest": 3, "latest": 3},
+        "activity_lift": [{"activity": "gym", "count": 2, "avg_with": 6.0, "lift": 0.0}]
+    }
+    mock_get.return_value = mock_response
+
+    mock_cols = [mocker.MagicMock() for _ in range(4)]
+    mocker.patch('streamlit.columns', return_value=mock_cols)
+    mock_chart = mocker.patch('streamlit.altair_chart')
+    mock_table = mocker.patch('streamlit.dataframe')
+
+    show_analytics(user_id=1)
+
+    mock_cols[0].metric.assert_called_once_with("Days Logged", 3)
+    mock_cols[1].metric.assert_called_once_with("Longest Streak", "3 days")
+    mock_cols[3].metric.assert_called_once_with("Volatility", "2.00")
+    assert mock_chart.call_count == 2
+    assert list(mock_table.call_args.args[0]["Activity"]) == ["gym"]
+
+
+def test_analytics_error(mocker, mock_get):
+    mock_get.return_value = mocker.Mock(status_code=500)
+    mock_error = mocker.patch('streamlit.error')
+
+    show_analytics(user_id=1)
+
+    mock_error.assert_called_once_with("Error loading analytics.")
@@ -1,21 +1,59 @@
+from datetime import date
 from unittest.mock import Mock
 
-from app.streamlit_frontend.logic.calendar import show_calendar
+from app.streamlit_frontend.logic.calendar import CHART_MAX_POINTS, show_calendar
 
 
-def test_calendar_data_processing(mocker):
+def test_calendar_data_processing(mocker, mock_get):
     mock_response = Mock(
         status_code=200,
         json=lambda: [{
-            "date": "2024-01-01",
-            "mood_score": 8,
-            "emoji": "😀",
-            "created_at": "2024-01-01T12:00:00"
+            "period": "2024-01-01",
+            "avg_score": 7.5,
+            "min_score": 6,
+            "max_score": 9,
+            "count": 2
         }]
     )
-    mocker.patch('requests.get', return_value=mock_response)
+    mock_get.return_value = mock_response
+    mocker.patch('streamlit.date_input', return_value=(date(2023, 1, 1), date(2024, 1, 31)))
     mock_st = mocker.patch('streamlit.altair_chart')
 
     show_calendar(user_id=1)
 
     assert mock_st.call_count == 1
+    path = mock_get.call_args.args[0]
+    assert path == f"/mood-series/1?from=2023-01-01&to=2024-01-31&bucket=day&points={CHART_MAX_POINTS}"
+
+
+def test_calendar_short_range_shows_entries(mocker, mock_get):
+    def month(path, headers):
+        days = {"/mood-entries/1/2024/4?fields=slim": [("2024-04-27", 7, "😀"), ("2024-04-28", 4, "😢")],
+                "/mood-entries/1/2024/5?fields=slim": [("2024-05-02", 8, "🙂"), ("2024-05-20", 5, None)]}[path]
+        return Mock(status_code=200, headers={}, json=lambda: [
+            {"date": day, "mood_score": score, "emoji": emoji, "created_at": f"{day}T14:35:00"}
+            for day, score, emoji in days])
+
+    mock_get.side_effect = month
+    mocker.patch('streamlit.date_input', return_value=(date(2024, 4, 28), date(2024, 5, 10)))
+    mock_chart = mocker.patch('streamlit.altair_chart')
+    mock_table = mocker.patch('streamlit.dataframe')
+
+    show_calendar(user_id=1)
+
+    assert [c.args[0] for c in mock_get.call_args_list] == ["/mood-entries/1/2024/4?fields=slim",
+                                                            "/mood-entries/1/2024/5?fields=slim"]
+    assert mock_chart.call_count == 1
+    table = mock_table.call_args.args[0]
+    assert list(table["emoji"]) == ["🙂", "😢"]
+    assert list(table["Date & Time"]) == ["May 02, 2024, 14:35", "Apr 28, 2024, 14:35"]
+
+
+def test_calendar_waits_for_range_end(mocker, mock_get):
+    mocker.patch('streamlit.date_input', return_value=(Mock(),))
+    mock_info = mocker.patch('streamlit.info')
+
+    show_calendar(user_id=1)
+
+    mock_get.assert_not_called()
+    mock_info.assert_called_once_with("Select the end of the range.")
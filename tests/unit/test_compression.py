@@ -0,0 +1,97 @@
+import gzip
+import zlib
+
+import pytest
+from fastapi import FastAPI, Response
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.compression import CompressionMiddleware, brotli_available, gzip_encoder, negotiate, no_compression
+
+BODY = b'{"mood_score":7,"emoji":"\\ud83d\\ude42"}' * 100
+
+
+def make_client(**options):
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, min_size=100, **options)
+
+    @app.get("/big")
+    async def big():
+        return Response(BODY, media_type="application/json", headers={"ETag": '"1-2"'})
+
+    @app.get("/small")
+    async def small():
+        return {"ok": True}
+
+    @app.get("/stream")
+    async def stream():
+        async def chunks():
+            for _ in range(3):
+                yield BODY
+        return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
+    @app.get("/binary")
+    async def binary():
+        return Response(BODY, media_type="application/vnd.apache.parquet")
+
+    @app.get("/opted-out")
+    @no_compression
+    async def opted_out():
+        return Response(BODY, media_type="application/json")
+
+    return TestClient(app)
+
+
+def test_negotiate():
+    assert negotiate("gzip, deflate, br", ["br", "gzip"]) == "br"
+    assert negotiate("br;q=0.5, gzip", ["br", "gzip"]) == "gzip"
+    assert negotiate("*", ["br", "gzip"]) == "br"
+    assert negotiate("gzip;q=0, *;q=0.1", ["gzip"]) is None
+    assert negotiate("identity", ["br", "gzip"]) is None
+    assert negotiate("", ["gzip"]) is None
+    with pytest.raises(ValueError):
+        CompressionMiddleware(None, encodings=("zstd",))
+
+
+def test_gzip_compression():
+    client = make_client(encodings=("gzip",))
+    resp = client.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert resp.headers["Content-Encoding"] == "gzip"
+    assert resp.headers["Vary"] == "Accept-Encoding"
+    assert resp.headers["ETag"] == 'W/"1-2"'
+    assert int(resp.headers["Content-Length"]) < len(BODY) / 10
+    assert resp.content == BODY
+
+    # Below the threshold, not accepted, not textual or opted out: sent as is
+    resp = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in resp.headers
+    assert resp.headers["Vary"] == "Accept-Encoding"
+    assert "Content-Encoding" not in client.get("/big", headers={"Accept-Encoding": "identity"}).headers
+    for path in ("/binary", "/opted-out"):
+        resp = client.get(path, headers={"Accept-Encoding": "gzip"})
+        assert "Content-Encoding" not in resp.headers
+        assert resp.content == BODY
+
+
+def test_streaming_compression():
+    client = make_client(encodings=("gzip",))
+    resp = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert resp.headers["Content-Encoding"] == "gzip"
+    assert "Content-Length" not in resp.headers
+    assert resp.content == BODY * 3
+
+    # Each chunk is flushed, so what was sent so far decodes on its own
+    encode = gzip_encoder(6)
+    decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    first = encode(b"first line\n", False)
+    assert decoder.decompress(first) == b"first line\n"
+    assert gzip.decompress(first + encode(b"last line\n", True)) == b"first line\nlast line\n"
+
+
+@pytest.mark.skipif(not brotli_available(), reason="brotli is not installed")
+def test_brotli_preferred():
+    client = make_client()
+    resp = client.get("/big", headers={"Accept-Encoding": "gzip, br"})
+    assert resp.headers["Content-Encoding"] == "br"
+    assert resp.content == BODY
+    assert client.get("/big", headers={"Accept-Encoding": "gzip"}).headers["Content-Encoding"] == "gzip"
@@ -11,6 +11,7 @@ def mock_dependencies(mocker):
         'add_mood': mocker.patch('app.streamlit_frontend.components.mood_entry_form.add_mood'),
         'show_calendar': mocker.patch('app.streamlit_frontend.logic.calendar.show_calendar'),
         'show_stats': mocker.patch('app.streamlit_frontend.logic.stats.show_stats'),
+        'show_analytics': mocker.patch('app.streamlit_frontend.logic.analytics.show_analytics'),
     }
 
 
@@ -0,0 +1,44 @@
+import logging
+
+from sqlalchemy import create_engine, text
+
+from app.instrumentation import Metrics, RequestMetrics, current_request
+
+
+def test_queries_counted_per_request(caplog):
+    engine = create_engine("sqlite:///:memory:")
+    request = RequestMetrics()
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 0"))  # outside any request
+        token = current_request.set(request)
+        try:
+            for i in range(10):
+                conn.execute(text("SELECT :i"), {"i": i})
+            conn.execute(text("SELECT 1 + 1"))
+        finally:
+            current_request.reset(token)
+    engine.dispose()
+    assert request.queries == 11
+    assert request.db_seconds > 0
+    assert request.repeated_statements() == [("SELECT ?", 10)]
+    assert request.server_timing().startswith('db;dur=')
+    assert 'desc="11 queries"' in request.server_timing()
+
+    metrics = Metrics(buckets=(0.1, 1.0))
+    with caplog.at_level(logging.WARNING, logger="app.instrumentation"):
+        metrics.observe("GET", "/stats/{user_id}", 200, 0.5, request)
+        metrics.observe("GET", "/stats/{user_id}", 200, 0.05, RequestMetrics())
+    assert "Possible N+1 in GET /stats/{user_id}: statement ran 10 times: SELECT ?" in caplog.text
+    rendered = metrics.render([("mood_diary_cache_hits_total", "counter", "Response cache hits.", 3)])
+    for line in (
+        'mood_diary_http_request_duration_seconds_bucket{method="GET",route="/stats/{user_id}",le="0.1"} 1',
+        'mood_diary_http_request_duration_seconds_bucket{method="GET",route="/stats/{user_id}",le="1.0"} 2',
+        'mood_diary_http_request_duration_seconds_bucket{method="GET",route="/stats/{user_id}",le="+Inf"} 2',
+        'mood_diary_http_request_duration_seconds_count{method="GET",route="/stats/{user_id}"} 2',
+        'mood_diary_http_requests_total{method="GET",route="/stats/{user_id}",status="200"} 2',
+        'mood_diary_db_queries_total{method="GET",route="/stats/{user_id}"} 11',
+        'mood_diary_n_plus_one_total{method="GET",route="/stats/{user_id}"} 1',
+        "# TYPE mood_diary_cache_hits_total counter",
+        "mood_diary_cache_hits_total 3",
+    ):
+        assert line in rendered.splitlines()
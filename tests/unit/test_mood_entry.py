@@ -1,6 +1,7 @@
 from datetime import date
 
 from app.streamlit_frontend.components.mood_entry_form import add_mood
+from app.streamlit_frontend.utils import write_generation
 
 
 def test_mood_entry_submission(mocker, mock_requests):
@@ -17,10 +18,11 @@ def test_mood_entry_submission(mocker, mock_requests):
     mock_response.status_code = 200
     mock_requests.return_value = mock_response
 
+    generation = write_generation(1)
     add_mood(user_id=1)
 
     mock_requests.assert_called_once_with(
-        "http://localhost:8000/mood-entry",
+        "/mood-entry",
         json={
             "date": "2025-05-05",
             "mood_score": 7,
@@ -28,5 +30,7 @@ def test_mood_entry_submission(mocker, mock_requests):
             "notes": "Test notes",
             "activities": "running,swimming"
         },
-        params={"user_id": 1}
+        params={"user_id": 1, "upsert": True}
     )
+    # A successful save invalidates the user's cached reads
+    assert write_generation(1) == generation + 1
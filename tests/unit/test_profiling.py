@@ -0,0 +1,68 @@
+import json
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.concurrency import run_in_threadpool
+
+from app.profiling import Profiler, ProfiledRoute, in_profiled_route
+
+
+def make_app(profiler):
+    app = FastAPI()
+    app.router.route_class = ProfiledRoute
+    app.state.profiler = profiler
+
+    def take_sample():
+        # Stands in for the sampler thread catching this worker mid-query
+        profiler.sample()
+
+    @app.get("/busy/{n}")
+    async def busy(n: int):
+        await run_in_threadpool(in_profiled_route(take_sample))
+        return {"n": n}
+
+    @app.get("/idle")
+    async def idle():
+        await run_in_threadpool(in_profiled_route(take_sample))
+        return {}
+
+    return app
+
+
+def test_profiled_routes_write_collapsed_stacks(tmp_path):
+    profiler = Profiler(routes="GET /busy/{n}", directory=str(tmp_path))
+    profiler.authorize = lambda token: token == "secret"
+    client = TestClient(make_app(profiler))
+    assert client.get("/busy/1").json() == {"n": 1}
+    client.get("/idle")
+    assert set(profiler.samples) == {"GET /busy/{n}"}
+    # An admin can profile any single request
+    client.get("/idle", headers={"X-Profile": "1", "X-Admin-Token": "wrong"})
+    assert "GET /idle" not in profiler.samples
+    client.get("/idle", headers={"X-Profile": "1", "X-Admin-Token": "secret"})
+    assert "GET /idle" in profiler.samples
+
+    profiler.flush()
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["GET_busy_n.collapsed", "GET_idle.collapsed"]
+    stack, count = (tmp_path / "GET_busy_n.collapsed").read_text().strip().rsplit(" ", 1)
+    frames = stack.split(";")
+    assert count == "1"
+    assert frames[0].startswith("[GET /busy/{n}] (profiling.py:")
+    assert frames[-1].startswith("Profiler.sample (profiling.py:")
+    assert any(frame.startswith("make_app.<locals>.take_sample (") for frame in frames)
+
+
+def test_speedscope_output_and_request_rate(tmp_path):
+    profiler = Profiler(routes="*", request_rate=0.0, directory=str(tmp_path), fmt="speedscope", interval=0.005)
+    client = TestClient(make_app(profiler))
+    client.get("/busy/1")
+    assert profiler.samples == {}
+    profiler.request_rate = 1.0
+    client.get("/busy/1")
+    client.get("/busy/2")
+    profiler.flush()
+    document = json.loads((tmp_path / "GET_busy_n.json").read_text())
+    profile = document["profiles"][0]
+    assert (profile["type"], profile["name"], profile["weights"]) == ("sampled", "GET /busy/{n}", [0.01])
+    names = [document["shared"]["frames"][i]["name"] for i in profile["samples"][0]]
+    assert names[0] == "[GET /busy/{n}]" and names[-1] == "Profiler.sample"
@@ -1,7 +1,7 @@
 from app.streamlit_frontend.logic.stats import show_stats
 
 
-def test_stats_rendering(mocker):
+def test_stats_rendering(mocker, mock_get):
     mock_response = mocker.Mock()
     mock_response.status_code = 200
     mock_response.json.return_value = {
@@ -12,7 +12,7 @@ def test_stats_rendering(mocker):
         "emoji_counts": {"😀": 5},
         "top_activities": [["running", 3]]
     }
-    mocker.patch('requests.get', return_value=mock_response)
+    mock_get.return_value = mock_response
 
     mock_col1 = mocker.MagicMock()
     mock_col2 = mocker.MagicMock()
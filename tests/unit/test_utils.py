@@ -1,6 +1,9 @@
 from unittest.mock import Mock
 
-from app.streamlit_frontend.utils import get_user_id_from_login_response
+import streamlit
+
+from app.streamlit_frontend.api_client import ApiClient
+from app.streamlit_frontend.utils import bump_write_generation, fetch_json, get_user_id_from_login_response
 
 
 def test_get_user_id_from_login_response_success():
@@ -13,3 +16,54 @@ def test_get_user_id_from_login_response_failure():
     mock_response = Mock()
     mock_response.json.side_effect = ValueError
     assert get_user_id_from_login_response(mock_response) is None
+
+
+def test_api_client_pooling_and_timeouts(mocker):
+    api = ApiClient("http://backend:8000/", connect_timeout=1, read_timeout=5, retries=2)
+    adapter = api.session.get_adapter("http://backend:8000")
+    assert adapter.max_retries.total == 2
+    assert "POST" not in adapter.max_retries.allowed_methods
+    assert "gzip" in api.session.headers["Accept-Encoding"]
+
+    request = mocker.patch.object(api.session, "request", return_value=Mock(status_code=200))
+    api.get("/health")
+    request.assert_called_once_with("GET", "http://backend:8000/health", timeout=(1.0, 5.0))
+
+
+def test_fetch_json_cached_until_write(mocker, mock_get):
+    mocker.patch('streamlit.session_state', {})
+    mock_get.side_effect = lambda path, headers: Mock(status_code=200, headers={}, json=lambda: {"path": path})
+
+    assert fetch_json("/stats/7", 7) == (200, {"path": "/stats/7"})
+    assert fetch_json("/stats/7", 7) == (200, {"path": "/stats/7"})
+    assert mock_get.call_count == 1
+
+    bump_write_generation(7)
+    fetch_json("/stats/7", 7)
+    assert mock_get.call_count == 2
+
+
+def test_fetch_json_revalidates_after_expiry(mocker, mock_get):
+    mocker.patch('streamlit.session_state', {})
+    fresh = Mock(status_code=200, headers={"ETag": '"7-1"'}, json=lambda: {"total_entries": 1})
+    mock_get.side_effect = [fresh, Mock(status_code=304, headers={"ETag": '"7-1"'})]
+
+    assert fetch_json("/stats/7", 7) == (200, {"total_entries": 1})
+    # A cache hit in another session still records the ETag in that session's
+    # state, which the cached function itself never touches
+    mocker.patch('streamlit.session_state', {})
+    assert fetch_json("/stats/7", 7) == (200, {"total_entries": 1})
+    assert streamlit.session_state['etag_cache']["/stats/7"] == ('"7-1"', {"total_entries": 1})
+    assert mock_get.call_count == 1
+
+    streamlit.cache_data.clear()
+    assert fetch_json("/stats/7", 7) == (200, {"total_entries": 1})
+    assert mock_get.call_args_list[1].kwargs["headers"] == {"If-None-Match": '"7-1"'}
+
+
+def test_fetch_json_does_not_cache_errors(mocker, mock_get):
+    mocker.patch('streamlit.session_state', {})
+    mock_get.return_value = Mock(status_code=500, headers={})
+    assert fetch_json("/stats/8", 8) == (500, None)
+    assert fetch_json("/stats/8", 8) == (500, None)
+    assert mock_get.call_count == 2